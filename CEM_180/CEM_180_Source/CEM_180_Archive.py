@@ -0,0 +1,285 @@
+"""
+Store topological diagrams and structural models in a binary archive
+    Remarks:
+        WriteArchive() writes the compiled topology of Build_Topology (node order, sparse matrix of
+        the structural behaviour, indirect deviations, origin nodes, constraint planes and the IDs
+        of the edges) and optionally a solved structural model (model.ToBytes()) into one file:
+            magic "CEMA", version and length of the header (little endian uint32)
+            header (JSON): dtype, shape and offset of every array, the ID lists of the topology
+                and offset and length of the model buffer
+            arrays in little endian order, each aligned to 8 bytes, then the model buffer
+        ReadArchive() maps the file into memory and only reads the header. An array is read when
+        it is first requested, so the forces or node positions of a model can be inspected
+        without reading the whole file. The arrays can also be opened with
+        numpy.memmap(path, dtype, "r", offset, shape).
+        Topology() returns a topological diagram for Calculate_Structure, ModelBytes() the buffer
+        that model.FromBytes() (a static method of the model class) turns back into a
+        structural model.
+"""
+
+__author__    = ['Patrick Ole Ohlbrock','Pierluigi D''Acunto' ]
+__copyright__ = 'Copyright 2019 - Chair of Structural Design, ETH Zurich'
+__license__   = 'MIT License'
+__email__     = 'ohlbrock@arch.ethz.ch'
+__version__   = "1.80"
+
+"""
+If you use the CEM library in a project, please refer to the GitHub repository:
+
+@Misc{cem2019,
+author = {Ohlbrock, Patrick Ole and D'Acunto, Pierluigi},
+title = {{CEM: Combinatorial Equilibrium Modeling}},
+year = {2019},
+note = {Release 1.80},
+url = { http://github.com/OleOhlbrock/CEM },
+}
+
+"""
+
+import array
+import json
+import os
+import struct
+import sys
+
+try:
+    import mmap
+except ImportError:
+    mmap = None
+
+try:
+    import Rhino.Geometry as rh
+except ImportError:
+    # headless: plain Python without Rhino
+    import CEM_180_Headless as rh
+
+str0_ArchiveMagic = b"CEMA"
+str0_ModelMagic = b"CEMM"
+int0_ArchiveVersion = 2
+dc1_Type = {"d": "<f8", "i": "<i4", "b": "|i1"}
+dc1_TypeCode = {"<f8": "d", "<i4": "i", "|i1": "b"}
+
+
+### ARRAYS
+def ArrayBytes(xx1_Array):
+    if sys.byteorder == "big":
+        xx1_Array = array.array(xx1_Array.typecode, xx1_Array)
+        xx1_Array.byteswap()
+    return xx1_Array.tobytes() if hasattr(xx1_Array, "tobytes") else xx1_Array.tostring()
+
+def ArrayFromBytes(str0_Type, xx0_Bytes):
+    xx1_Array = array.array(dc1_TypeCode[str0_Type])
+    if hasattr(xx1_Array, "frombytes"):
+        xx1_Array.frombytes(xx0_Bytes)
+    else:
+        xx1_Array.fromstring(xx0_Bytes)
+    if sys.byteorder == "big":
+        xx1_Array.byteswap()
+    return xx1_Array
+
+def ArrayCount(int1_Shape):
+    int0_Count = 1
+    for int0_Size in int1_Shape:
+        int0_Count *= int0_Size
+    return int0_Count
+
+# Offsets of the arrays after a header of the given length, and the end of the last array
+def ArrayOffsets(xx2_Array, int0_Header):
+    int0_Offset = (12 + int0_Header + 7) // 8 * 8
+    for xx1_Array in xx2_Array:
+        xx1_Array[3] = int0_Offset
+        int0_Offset += (ArrayCount(xx1_Array[2])*array.array(dc1_TypeCode[xx1_Array[1]]).itemsize + 7) // 8 * 8
+    return int0_Offset
+
+
+### TOPOLOGY
+# Arrays and values of the compiled topology, points and planes are stored as coordinates
+class archiveTopology(object):
+    __slots__ = ("db1_LoadOut", "db1_TrailLengthOut", "db1_DevValueOut", "db1_DeviationIndirectOut", "int1_DevRowPtrOut", "int1_DevColOut",
+                 "str1_NodeOrderOut", "int1_NodeOrderOut", "bl1_NodePaddingOut", "str1_EdgeOut", "dc2_TrailEndsOut", "dc2_Deviation1EndsOut", "dc2_Deviation2EndsOut",
+                 "int1_Deviation1ID", "int1_Deviation2ID", "str1_ConstraintPlaneOut", "pl1_ConstraintPlaneOut",
+                 "str1_OriginNodeOut", "pt1_OriginNodeOut")
+
+    def __repr__(self):
+        return self.ToString()
+
+    def __str__(self):
+        return self.ToString()
+
+    def ToString(self):
+        return "Topological Diagram (archive)\n\nvertices: " + str(len(self.str1_NodeOrderOut)) + "\ntrails: " + str(len(self.str1_OriginNodeOut))
+
+str1_TopologyValue = ["str1_NodeOrderOut", "str1_EdgeOut", "int1_Deviation1ID", "int1_Deviation2ID", "str1_ConstraintPlaneOut", "str1_OriginNodeOut"]
+str1_TopologyDict = ["dc2_TrailEndsOut", "dc2_Deviation1EndsOut", "dc2_Deviation2EndsOut"]
+
+def TopologyArrays(TPC):
+    int0_Trail = len(TPC.str1_OriginNodeOut)
+    db1_OriginNode = []
+    for pt0_Node in TPC.pt1_OriginNodeOut:
+        db1_OriginNode.extend([pt0_Node.X, pt0_Node.Y, pt0_Node.Z])
+    db1_ConstraintPlane = []
+    for pl0_Plane in TPC.pl1_ConstraintPlaneOut:
+        db1_ConstraintPlane.extend([pl0_Plane.Origin.X, pl0_Plane.Origin.Y, pl0_Plane.Origin.Z, pl0_Plane.Normal.X, pl0_Plane.Normal.Y, pl0_Plane.Normal.Z])
+    return [["db1_LoadOut", [len(TPC.str1_NodeOrderOut), 3], array.array("d", TPC.db1_LoadOut)],
+            ["db1_TrailLengthOut", [len(TPC.str1_NodeOrderOut)], array.array("d", TPC.db1_TrailLengthOut)],
+            ["db1_DevValueOut", [len(TPC.db1_DevValueOut)], array.array("d", TPC.db1_DevValueOut)],
+            ["db1_DeviationIndirectOut", [len(TPC.db1_DeviationIndirectOut) // 3, 3], array.array("d", TPC.db1_DeviationIndirectOut)],
+            ["int1_DevRowPtrOut", [len(TPC.int1_DevRowPtrOut)], array.array("i", TPC.int1_DevRowPtrOut)],
+            ["int1_DevColOut", [len(TPC.int1_DevColOut)], array.array("i", TPC.int1_DevColOut)],
+            ["int1_NodeOrderOut", [len(TPC.int1_NodeOrderOut)], array.array("i", TPC.int1_NodeOrderOut)],
+            ["bl1_NodePaddingOut", [len(TPC.bl1_NodePaddingOut)], array.array("b", [1 if bl0_Padding else 0 for bl0_Padding in TPC.bl1_NodePaddingOut])],
+            ["db1_OriginNodeOut", [int0_Trail, 3], array.array("d", db1_OriginNode)],
+            ["db1_ConstraintPlaneOut", [len(TPC.pl1_ConstraintPlaneOut), 6], array.array("d", db1_ConstraintPlane)]]
+
+def TopologyValues(TPC):
+    dc1_Value = {}
+    for str0_Name in str1_TopologyValue:
+        dc1_Value[str0_Name] = list(getattr(TPC, str0_Name))
+    # Keys of the edges may be numbers or strings, the dictionaries are stored as pairs
+    for str0_Name in str1_TopologyDict:
+        dc2_Ends = getattr(TPC, str0_Name)
+        dc1_Value[str0_Name] = [[key, list(dc2_Ends[key])] for key in sorted(dc2_Ends)]
+    return dc1_Value
+
+
+### WRITE
+def WriteArchive(str0_Path, TP, M = None):
+    TPC = getattr(TP, "compiled", TP)
+    if not hasattr(TPC, "db1_DevValueOut"):
+        raise ValueError("The topological diagram is empty")
+    xx2_Data = TopologyArrays(TPC)
+    xx0_Model = b""
+    if M is not None and hasattr(M, "FD"):
+        xx0_Model = M.ToBytes()
+
+    # The offsets depend on the length of the header, which contains them
+    xx2_Array = [[xx1_Data[0], dc1_Type[xx1_Data[2].typecode], xx1_Data[1], 0] for xx1_Data in xx2_Data]
+    dc1_Header = {"topology": {"arrays": xx2_Array, "values": TopologyValues(TPC)}, "model": None}
+    str0_Header = ""
+    int0_Start = -1
+    while int0_Start != len(str0_Header):
+        int0_Start = len(str0_Header)
+        int0_End = ArrayOffsets(xx2_Array, int0_Start)
+        if xx0_Model:
+            dc1_Header["model"] = [int0_End, len(xx0_Model)]
+        str0_Header = json.dumps(dc1_Header, sort_keys = True)
+
+    # Write to a temporary file first, an interrupted write keeps the previous archive
+    with open(str0_Path + ".tmp", "wb") as f0_Archive:
+        f0_Archive.write(str0_ArchiveMagic + struct.pack("<II", int0_ArchiveVersion, len(str0_Header)) + str0_Header.encode("utf-8"))
+        int0_Length = 12 + len(str0_Header)
+        for i in range(len(xx2_Data)):
+            xx0_Bytes = ArrayBytes(xx2_Data[i][2])
+            f0_Archive.write(b"\x00"*(xx2_Array[i][3] - int0_Length) + xx0_Bytes)
+            int0_Length = xx2_Array[i][3] + len(xx0_Bytes)
+        if xx0_Model:
+            f0_Archive.write(b"\x00"*(dc1_Header["model"][0] - int0_Length) + xx0_Model)
+    if hasattr(os, "replace"):
+        os.replace(str0_Path + ".tmp", str0_Path)
+    else:
+        if os.path.exists(str0_Path):
+            os.remove(str0_Path)
+        os.rename(str0_Path + ".tmp", str0_Path)
+    return str0_Path
+
+
+### READ
+class archive(object):
+    def __repr__(self):
+        return self.ToString()
+
+    def __str__(self):
+        return self.ToString()
+
+    def ToString(self):
+        str0_Description = "CEM Archive\n\nversion: " + str(self.int0_Version) + "\nvertices: " + str(len(self.dc1_Header["topology"]["values"]["str1_NodeOrderOut"]))
+        str0_Description += "\nstructural model: " + ("yes" if self.dc1_Header["model"] else "no")
+        return str0_Description
+
+    # Bytes of the file, from the memory map or read from the file without a map
+    def Read(self, int0_Offset, int0_Length):
+        if self.xx0_Map is not None:
+            return self.xx0_Map[int0_Offset:int0_Offset + int0_Length]
+        self.f0_Archive.seek(int0_Offset)
+        return self.f0_Archive.read(int0_Length)
+
+    # Array of the topology, read on first access
+    def Array(self, str0_Name):
+        if str0_Name not in self.dc1_Array:
+            for str0_Array, str0_Type, int1_Shape, int0_Offset in self.dc1_Header["topology"]["arrays"]:
+                if str0_Array == str0_Name:
+                    int0_Count = ArrayCount(int1_Shape)
+                    self.dc1_Array[str0_Name] = ArrayFromBytes(str0_Type, self.Read(int0_Offset, int0_Count*array.array(dc1_TypeCode[str0_Type]).itemsize))
+            if str0_Name not in self.dc1_Array:
+                raise KeyError(str0_Name)
+        return self.dc1_Array[str0_Name]
+
+    def Topology(self):
+        dc1_Value = self.dc1_Header["topology"]["values"]
+        TPA = archiveTopology()
+        for str0_Name in str1_TopologyValue:
+            setattr(TPA, str0_Name, tuple(dc1_Value[str0_Name]))
+        for str0_Name in str1_TopologyDict:
+            setattr(TPA, str0_Name, dict([(xx1_Pair[0], tuple(xx1_Pair[1])) for xx1_Pair in dc1_Value[str0_Name]]))
+        for str0_Name in ["db1_LoadOut", "db1_TrailLengthOut", "db1_DevValueOut", "db1_DeviationIndirectOut", "int1_DevRowPtrOut", "int1_DevColOut", "int1_NodeOrderOut"]:
+            setattr(TPA, str0_Name, tuple(self.Array(str0_Name)))
+        TPA.bl1_NodePaddingOut = tuple([bool(int0_Padding) for int0_Padding in self.Array("bl1_NodePaddingOut")])
+        db1_Node = self.Array("db1_OriginNodeOut")
+        TPA.pt1_OriginNodeOut = tuple([rh.Point3d(db1_Node[i], db1_Node[i+1], db1_Node[i+2]) for i in range(0, len(db1_Node), 3)])
+        db1_Plane = self.Array("db1_ConstraintPlaneOut")
+        TPA.pl1_ConstraintPlaneOut = tuple([rh.Plane(rh.Point3d(db1_Plane[i], db1_Plane[i+1], db1_Plane[i+2]), rh.Vector3d(db1_Plane[i+3], db1_Plane[i+4], db1_Plane[i+5])) for i in range(0, len(db1_Plane), 6)])
+        return TPA
+
+    # Buffer of the structural model (model.FromBytes), None without a model
+    def ModelBytes(self):
+        if not self.dc1_Header["model"]:
+            return None
+        return self.Read(self.dc1_Header["model"][0], self.dc1_Header["model"][1])
+
+    # Header of the model buffer: arrays of the form diagram and the IDs and variables of the model
+    def ModelHeader(self):
+        if self.dc1_Model is None and self.dc1_Header["model"]:
+            int0_Start = self.dc1_Header["model"][0]
+            if self.Read(int0_Start, 4) != str0_ModelMagic:
+                raise ValueError("The archive does not contain a structural model")
+            int0_Version, int0_Header = struct.unpack("<II", self.Read(int0_Start + 4, 8))
+            self.dc1_Model = json.loads(self.Read(int0_Start + 12, int0_Header).decode("utf-8"))
+        return self.dc1_Model
+
+    # Array of the form diagram of the model (e.g. db1_Force, db1_Position), read on first access
+    def ModelArray(self, str0_Name):
+        str0_Key = "model." + str0_Name
+        if str0_Key not in self.dc1_Array:
+            dc1_Model = self.ModelHeader()
+            if not dc1_Model:
+                raise ValueError("The archive does not contain a structural model")
+            for str0_Array, str0_Type, int0_Count, int0_Offset in dc1_Model["arrays"]:
+                if str0_Array == str0_Name:
+                    self.dc1_Array[str0_Key] = ArrayFromBytes(str0_Type, self.Read(self.dc1_Header["model"][0] + int0_Offset, int0_Count*array.array(dc1_TypeCode[str0_Type]).itemsize))
+            if str0_Key not in self.dc1_Array:
+                raise KeyError(str0_Name)
+        return self.dc1_Array[str0_Key]
+
+    def Close(self):
+        if self.xx0_Map is not None:
+            self.xx0_Map.close()
+            self.xx0_Map = None
+        self.f0_Archive.close()
+
+def ReadArchive(str0_Path, bl0_Map = True):
+    A = archive()
+    A.f0_Archive = open(str0_Path, "rb")
+    A.xx0_Map = None
+    if bl0_Map and mmap:
+        A.xx0_Map = mmap.mmap(A.f0_Archive.fileno(), 0, access = mmap.ACCESS_READ)
+    A.dc1_Array = {}
+    A.dc1_Model = None
+    if A.Read(0, 4) != str0_ArchiveMagic:
+        A.Close()
+        raise ValueError(str0_Path + " is not a CEM archive")
+    A.int0_Version, int0_Header = struct.unpack("<II", A.Read(4, 8))
+    if A.int0_Version != int0_ArchiveVersion:
+        A.Close()
+        raise ValueError(str0_Path + " was written by version " + str(A.int0_Version) + " of the archive, version " + str(int0_ArchiveVersion) + " is read")
+    A.dc1_Header = json.loads(A.Read(12, int0_Header).decode("utf-8"))
+    return A
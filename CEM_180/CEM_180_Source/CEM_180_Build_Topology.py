@@ -33,12 +33,30 @@ url = { http://github.com/OleOhlbrock/CEM },
 
 
 
-import System.Drawing.Color
-import System.Guid
-import Rhino
+import math
+
+try:
+    import System.Drawing.Color
+    import System.Guid
+    import Rhino
+except ImportError:
+    # headless: plain Python without Rhino
+    from CEM_180_Headless import System, Rhino
+
+try:
+    xrange
+except NameError:
+    xrange = range
 db0_T = 0.001
 
 class topology(object):
+    # Dense matrix of the structural behaviour, see StructuralBehaviour()
+    @property
+    def db1_StructuralBehaviourOut(self):
+        if not hasattr(self, "compiled"):
+            raise AttributeError("db1_StructuralBehaviourOut")
+        return self.compiled.db1_StructuralBehaviourOut
+
     def __repr__(self):
         return self.ToString()
         
@@ -49,7 +67,7 @@ class topology(object):
         if trailMembers and trailMembersID:
             if len(trailMembers) == len(trailMembersID):
                 str0_Description = ""
-                if hasattr(self, "str1_StructuralBehaviourOut") or hasattr(self, "db1_StructuralBehaviourOut")  and pt1_NodeOut and int2_Trail:
+                if hasattr(self, "str1_DevValueOut") or hasattr(self, "db1_DevValueOut")  and pt1_NodeOut and int2_Trail:
                     str0_Description += "Topological Diagram\n\nvertices: " + str(len(pt1_NodeOut)) + "\ntrail members: " + str(len(int2_Trail)) 
                     if int2_Deviation1:
                         str0_Description += "\ndirect deviation members: " + str(len(int2_Deviation1))
@@ -71,6 +89,160 @@ def ListListToList(xx2_Data):
     return xx1_DataOut
 
 
+### SPATIAL HASH (cells of size db0_T, a point within tolerance lies in one of the 27 neighbouring cells)
+def GridKey(pt0_Point):
+    return (int(math.floor(pt0_Point.X/db0_T)), int(math.floor(pt0_Point.Y/db0_T)), int(math.floor(pt0_Point.Z/db0_T)))
+
+def GridAdd(dc2_Grid, pt0_Point, int0_Index):
+    tp0_Key = GridKey(pt0_Point)
+    if tp0_Key in dc2_Grid:
+        dc2_Grid[tp0_Key].append(int0_Index)
+    else:
+        dc2_Grid[tp0_Key] = [int0_Index]
+
+def GridBuild(pt1_Point):
+    dc2_Grid = {}
+    for i in xrange(len(pt1_Point)):
+        GridAdd(dc2_Grid, pt1_Point[i], i)
+    return dc2_Grid
+
+def GridFindAll(dc2_Grid, pt1_Point, pt0_Point):
+    # All indices of pt1_Point within tolerance of pt0_Point (ascending)
+    int1_Found = []
+    x, y, z = GridKey(pt0_Point)
+    for a in (x-1, x, x+1):
+        for b in (y-1, y, y+1):
+            for c in (z-1, z, z+1):
+                tp0_Key = (a, b, c)
+                if tp0_Key in dc2_Grid:
+                    for i in dc2_Grid[tp0_Key]:
+                        if abs(pt0_Point.X - pt1_Point[i].X) < db0_T and abs(pt0_Point.Y - pt1_Point[i].Y) < db0_T and abs(pt0_Point.Z - pt1_Point[i].Z) < db0_T:
+                            int1_Found.append(i)
+    int1_Found.sort()
+    return int1_Found
+
+def GridFind(dc2_Grid, pt1_Point, pt0_Point, int0_From = 0):
+    # Lowest index >= int0_From within tolerance (same result as a linear scan), -1 if none
+    for i in GridFindAll(dc2_Grid, pt1_Point, pt0_Point):
+        if i >= int0_From:
+            return i
+    return -1
+
+
+### TRAIL CHAINS
+# Trails as node lists starting at the support, walked on the trail members instead of joining
+# curves. The support is the end node matching a support point, the one matching the higher
+# support index if both ends do. Without a support the chain runs against its first member,
+# as a joined curve keeps the direction of its first curve.
+def TrailChains(int0_NodeCount, int2_Trail, int1_SupportIndex):
+    xx2_Adjacent = [[] for i in xrange(int0_NodeCount)]
+    for e in xrange(len(int2_Trail)):
+        if int2_Trail[e][0] != int2_Trail[e][1]:
+            xx2_Adjacent[int2_Trail[e][0]].append((int2_Trail[e][1], e))
+            xx2_Adjacent[int2_Trail[e][1]].append((int2_Trail[e][0], e))
+    bl1_Visited = [False]*int0_NodeCount
+    int2_Chain = []
+    
+    def Walk(int0_Node):
+        int1_Chain = [int0_Node]
+        bl1_Visited[int0_Node] = True
+        int0_First = len(int2_Trail)
+        bl0_Along = False
+        bl0_Next = True
+        while bl0_Next:
+            bl0_Next = False
+            for int0_Next, e in xx2_Adjacent[int0_Node]:
+                if not bl1_Visited[int0_Next]:
+                    if e < int0_First:
+                        int0_First = e
+                        bl0_Along = int2_Trail[e][0] == int0_Node
+                    int0_Node = int0_Next
+                    bl1_Visited[int0_Node] = True
+                    int1_Chain.append(int0_Node)
+                    bl0_Next = True
+                    break
+        int0_Start = int1_SupportIndex[int1_Chain[0]]
+        int0_End = int1_SupportIndex[int1_Chain[-1]]
+        if int0_End > int0_Start or (int0_End == int0_Start and bl0_Along):
+            int1_Chain.reverse()
+        return int1_Chain
+    
+    # Open chains from their ends first, closed ones from their lowest node
+    for i in xrange(int0_NodeCount):
+        if not bl1_Visited[i] and len(set([v for v, e in xx2_Adjacent[i]])) == 1:
+            int2_Chain.append(Walk(i))
+    for i in xrange(int0_NodeCount):
+        if not bl1_Visited[i] and xx2_Adjacent[i]:
+            int2_Chain.append(Walk(i))
+    return int2_Chain
+
+
+### COMPILED TOPOLOGY
+# The part of the topological diagram read by Calculate_Structure, as tuples and without
+# curves. It cannot be changed, so it is shared instead of copied (also by copy.deepcopy).
+# The ends of the edges are read-only dictionaries {key: (start, end)}.
+class endsMapping(dict):
+    def ReadOnly(self, *args, **kwargs):
+        raise TypeError("The ends of the compiled topology cannot be changed")
+
+    __setitem__ = __delitem__ = clear = pop = popitem = setdefault = update = ReadOnly
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, dc1_Memo):
+        return self
+
+class compiledTopology(object):
+    __slots__ = ("db1_LoadOut", "db1_TrailLengthOut", "db1_DevValueOut", "db1_DeviationIndirectOut", "int1_DevRowPtrOut", "int1_DevColOut",
+                 "str1_NodeOrderOut", "int1_NodeOrderOut", "bl1_NodePaddingOut", "str1_EdgeOut", "dc2_TrailEndsOut", "dc2_Deviation1EndsOut", "dc2_Deviation2EndsOut",
+                 "int1_Deviation1ID", "int1_Deviation2ID", "str1_ConstraintPlaneOut", "pl1_ConstraintPlaneOut",
+                 "str1_OriginNodeOut", "pt1_OriginNodeOut")
+
+    def __init__(self, TP):
+        for str0_Name in self.__slots__:
+            xx0_Value = getattr(TP, str0_Name)
+            if isinstance(xx0_Value, dict):
+                xx0_Value = endsMapping([(key, tuple(xx0_Value[key])) for key in xx0_Value])
+            else:
+                xx0_Value = tuple(xx0_Value)
+            object.__setattr__(self, str0_Name, xx0_Value)
+
+    def __setattr__(self, str0_Name, xx0_Value):
+        raise AttributeError("The compiled topology cannot be changed")
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, dc1_Memo):
+        return self
+
+    # Dense matrix of the structural behaviour for components that read it, built on each access
+    @property
+    def db1_StructuralBehaviourOut(self):
+        return StructuralBehaviour(self)
+
+
+### STRUCTURAL MATRIX
+# The matrix of the structural behaviour has a row per node (layer by layer from the origin
+# nodes) with the load (3), the deviation magnitudes to the nodes of the layer (one column per
+# trail) and the length of the trail out of the node. Build_Topology only stores it sparse:
+#   db1_LoadOut          loads of the rows (rows,3)
+#   db1_TrailLengthOut   trail length of the rows (rows)
+#   int1_DevRowPtrOut    start of the deviations of every row in the two arrays below (rows+1)
+#   int1_DevColOut       trail column of the deviations
+#   db1_DevValueOut      magnitude of the deviations
+def StructuralBehaviour(TPC):
+    int0_Trail = len(TPC.str1_OriginNodeOut)
+    db1_StructuralBehaviour = []
+    for i in xrange(len(TPC.db1_TrailLengthOut)):
+        db1_Row = list(TPC.db1_LoadOut[3*i:3*i+3]) + [0.0]*int0_Trail + [TPC.db1_TrailLengthOut[i]]
+        for p in xrange(TPC.int1_DevRowPtrOut[i], TPC.int1_DevRowPtrOut[i+1]):
+            db1_Row[3 + TPC.int1_DevColOut[p]] = TPC.db1_DevValueOut[p]
+        db1_StructuralBehaviour.extend(db1_Row)
+    return db1_StructuralBehaviour
+
+
 TP = topology()
 
 
@@ -118,30 +290,18 @@ if trailMembers and trailMembersID:
         int2_ExtForce = []
         
         pt1_Node.append(trailMembers[0].PointAtStart)
+        dc2_NodeGrid = GridBuild(pt1_Node)
         
         # Nodes and Egdes from trailMembers
         for crv0_Trail in trailMembers:
             int1_Trail = []
-            pt0_Start = crv0_Trail.PointAtStart
-            bl0_Check = False
-            for i in xrange(len(pt1_Node)):
-                if abs(pt0_Start.X - pt1_Node[i].X) < db0_T and abs(pt0_Start.Y - pt1_Node[i].Y) < db0_T and abs(pt0_Start.Z - pt1_Node[i].Z) < db0_T:
-                    int1_Trail.append(i)
-                    bl0_Check = True
-                    break
-            if bl0_Check == False:
-                pt1_Node.append(pt0_Start)
-                int1_Trail.append(len(pt1_Node)-1)
-            pt0_End = crv0_Trail.PointAtEnd
-            bl0_Check = False
-            for i in xrange(len(pt1_Node)):
-                if abs(pt0_End.X - pt1_Node[i].X) < db0_T and abs(pt0_End.Y - pt1_Node[i].Y) < db0_T and abs(pt0_End.Z - pt1_Node[i].Z) < db0_T:
-                    int1_Trail.append(i)
-                    bl0_Check = True
-                    break
-            if bl0_Check == False:
-                pt1_Node.append(pt0_End)
-                int1_Trail.append(len(pt1_Node)-1)
+            for pt0_End in [crv0_Trail.PointAtStart, crv0_Trail.PointAtEnd]:
+                int0_Node = GridFind(dc2_NodeGrid, pt1_Node, pt0_End)
+                if int0_Node < 0:
+                    pt1_Node.append(pt0_End)
+                    int0_Node = len(pt1_Node)-1
+                    GridAdd(dc2_NodeGrid, pt0_End, int0_Node)
+                int1_Trail.append(int0_Node)
             int2_Trail.append(int1_Trail)
         
 
@@ -149,20 +309,16 @@ if trailMembers and trailMembersID:
         crv1_DeviationClean = []
         id1_DeviationClean = []
         for k in xrange(len(deviationMembers)):
-            pt0_StartDeviation = deviationMembers[k].PointAtStart
-            pt0_EndDeviation = deviationMembers[k].PointAtEnd
-            for i in xrange(len(pt1_Node)):
-                if abs(pt0_StartDeviation.X - pt1_Node[i].X) < db0_T and abs(pt0_StartDeviation.Y - pt1_Node[i].Y) < db0_T and abs(pt0_StartDeviation.Z - pt1_Node[i].Z) < db0_T:
-                    for j in xrange(len(pt1_Node)):
-                        if abs(pt0_EndDeviation.X - pt1_Node[j].X) < db0_T and abs(pt0_EndDeviation.Y - pt1_Node[j].Y) < db0_T and abs(pt0_EndDeviation.Z - pt1_Node[j].Z) < db0_T:
-                            crv1_DeviationClean.append(deviationMembers[k])
-                            id1_DeviationClean.append(deviationMembersID[k])
-                            int1_Deviation = []
-                            int1_Deviation.append(i)
-                            int1_Deviation.append(j)
-                            int2_Deviation.append(int1_Deviation)
-                            break
-                    break
+            i = GridFind(dc2_NodeGrid, pt1_Node, deviationMembers[k].PointAtStart)
+            if i < 0: continue
+            j = GridFind(dc2_NodeGrid, pt1_Node, deviationMembers[k].PointAtEnd)
+            if j < 0: continue
+            crv1_DeviationClean.append(deviationMembers[k])
+            id1_DeviationClean.append(deviationMembersID[k])
+            int1_Deviation = []
+            int1_Deviation.append(i)
+            int1_Deviation.append(j)
+            int2_Deviation.append(int1_Deviation)
         deviationMembers = crv1_DeviationClean
         deviationMembersID = id1_DeviationClean
         
@@ -170,14 +326,13 @@ if trailMembers and trailMembersID:
         pt1_ExtForceClean = []
         External_Forces_IDClean = []
         for k in xrange(len(externalForces)):
-            for i in xrange(len(pt1_Node)):
+            i = GridFind(dc2_NodeGrid, pt1_Node, externalForces[k])
+            if i >= 0:
+                pt1_ExtForceClean.append(externalForces[k])
+                External_Forces_IDClean.append(externalForcesID[k])
                 int1_ExtForce = []
-                if abs(externalForces[k].X - pt1_Node[i].X) < db0_T and abs(externalForces[k].Y - pt1_Node[i].Y) < db0_T and abs(externalForces[k].Z - pt1_Node[i].Z) < db0_T:
-                    pt1_ExtForceClean.append(externalForces[k])
-                    External_Forces_IDClean.append(externalForcesID[k])
-                    int1_ExtForce.append(i)
-                    int2_ExtForce.append(int1_ExtForce)
-                    break
+                int1_ExtForce.append(i)
+                int2_ExtForce.append(int1_ExtForce)
         
         externalForces = pt1_ExtForceClean
         externalForcesID = External_Forces_IDClean
@@ -238,7 +393,7 @@ if trailMembers and trailMembersID:
             str2_Deviation.append( [str(item) for item in int2_Deviation[i] ] )
             str2_Deviation[i].extend([str1_DeviationAtt[i]])
         
-        # Convert Trail Input into Polylines
+        # Convert Trail Input into Line Curves (edge output)
         ln1_Trail = []
         for crv0_Trail in trailMembers:
             if crv0_Trail is Rhino.Geometry.Line:
@@ -250,69 +405,39 @@ if trailMembers and trailMembersID:
         for ln0_Trail in ln1_Trail:
             trailMembers.append(ln0_Trail.ToNurbsCurve())
         
-        plc1_Trail = Rhino.Geometry.Curve.JoinCurves(trailMembers)
-        
-        pln1_Trail = []
-        for plc0_Trail in plc1_Trail:
-            pln1_Trail.append(plc0_Trail.TryGetPolyline()[1])
-        
-        
         # Check supports
-        pt1_SupportClean = []
-        for j in xrange(len(pln1_Trail)):
-            if supports:
-                pt1_SupportClean.append(pln1_Trail[j][len(pln1_Trail[j])-1])
-                for i in xrange(len(supports)):
-                    if abs(pln1_Trail[j][0].X - supports[i].X) < db0_T and abs(pln1_Trail[j][0].Y - supports[i].Y) < db0_T and abs(pln1_Trail[j][0].Z - supports[i].Z) < db0_T:
-                        pt1_SupportClean[j] = pln1_Trail[j][0]
-                        pln1_Trail[j].Reverse()
-            else:
-                pt1_SupportClean.append(pln1_Trail[j][len(pln1_Trail[j])-1])
-        supports = pt1_SupportClean
+        dc2_SupportGrid = GridBuild(supports)
+        int1_SupportIndex = []
+        for pt0_Node in pt1_Node:
+            int1_SupportIndex.append(GridFind(dc2_SupportGrid, supports, pt0_Node))
         
+        # Trail Chains, one support each
+        int2_TrailChain = TrailChains(len(pt1_Node), int2_Trail, int1_SupportIndex)
+        supports = [pt1_Node[int1_TrailChain[0]] for int1_TrailChain in int2_TrailChain]
         
         # Find Node Indexes of supports
-        int1_Support = []
-        for pt0_Support in supports:
-            for i in xrange(len(pt1_Node)):
-                if abs(pt0_Support.X - pt1_Node[i].X) < db0_T and abs(pt0_Support.Y - pt1_Node[i].Y) < db0_T and abs(pt0_Support.Z - pt1_Node[i].Z) < db0_T:
-                    int1_Support.append(i)
-                    break
+        int1_Support = [int1_TrailChain[0] for int1_TrailChain in int2_TrailChain]
         
         # Create Graph (Dictionary of Node-Node Connectivity from trailMembers)
         dc2_Node = {}
         for i in xrange(len(int2_Node)):
             dc2_Node[str(i)] = [str(x) for x in int2_Node[i]]
         
-        int2_TrailPoly = []
-        for pln0_Trail in pln1_Trail:
-            int1_TrailPoly = []
-            for i in xrange(len(pln0_Trail)):
-                for k in xrange(len(pt1_Node)):
-                    if abs(pln0_Trail[i].X - pt1_Node[k].X) < db0_T and abs(pln0_Trail[i].Y - pt1_Node[k].Y) < db0_T and abs(pln0_Trail[i].Z - pt1_Node[k].Z) < db0_T:
-                        int1_TrailPoly.append(k)
-                        break
-            int2_TrailPoly.append(list(reversed(int1_TrailPoly)))
-        
-        dc2_ShortPath = {}
-
-        for i in xrange(len(pt1_Node)):
-            for int1_TrailPoly in int2_TrailPoly:
-                if i in int1_TrailPoly:
-                    str1_ShortPath = ["S"]
-                    str1_ShortPath.extend(map(str, int1_TrailPoly[:int1_TrailPoly.index(i)+1]))
-                    dc2_ShortPath[str(i)] = str1_ShortPath
-                    break
-        
+        # Distance from the support (1 at the support) and previous node towards it ("S" at the support)
         dc1_ShortPathDist = {}
+        dc1_ShortPathPrev = {}
         dc2_ShortPathDistGrade = {}
         
+        int1_ShortPathDist = [None]*len(pt1_Node)
+        str1_ShortPathPrev = [None]*len(pt1_Node)
+        for int1_TrailChain in int2_TrailChain:
+            for j in xrange(len(int1_TrailChain)):
+                int1_ShortPathDist[int1_TrailChain[j]] = j + 1
+                str1_ShortPathPrev[int1_TrailChain[j]] = str(int1_TrailChain[j-1]) if j > 0 else "S"
         for i in xrange(len(pt1_Node)):
-            for pln0_Trail in pln1_Trail:
-                for j in xrange(len(pln0_Trail)):
-                    if abs(pln0_Trail[j].X - pt1_Node[i].X) < db0_T and abs(pln0_Trail[j].Y - pt1_Node[i].Y) < db0_T and abs(pln0_Trail[j].Z - pt1_Node[i].Z) < db0_T:
-                        dc1_ShortPathDist[str(i)] = len(pln0_Trail) - j
-                        break
+            if int1_ShortPathDist[i] is not None:
+                dc1_ShortPathDist[str(i)] = int1_ShortPathDist[i]
+                dc1_ShortPathPrev[str(i)] = str1_ShortPathPrev[i]
         
 
         # Define Sequences
@@ -351,7 +476,7 @@ if trailMembers and trailMembersID:
                 int2_Deviation1.append([int(str2_Deviation[i][0]),int(str2_Deviation[i][1])])
                 crv1_Deviation1.append(deviationMembers[i])
                 int1_Deviation1ID.append(i)
-                print j
+                print(j)
                 j += 1
             else:
                 dc2_Deviation2Ends[str(k)] = [str(str2_Deviation[i][0]),str(str2_Deviation[i][1])]
@@ -361,9 +486,9 @@ if trailMembers and trailMembersID:
                 int1_Deviation2ID.append(i)
                 k += 1
         
-        print dc2_Deviation1Ends
-        print int1_Deviation1ID
-        print int1_Deviation2ID
+        print(dc2_Deviation1Ends)
+        print(int1_Deviation1ID)
+        print(int1_Deviation2ID)
         
         # Create Dictionary of Trail and Deviation 1 for Structural Matrix
         dc2_EdgeEnds = {}
@@ -430,32 +555,18 @@ if trailMembers and trailMembersID:
 
         
         # Trail In and Out
-        for key in dc2_ShortPath:
-            dc1_NodeTrailOut[key] = dc2_ShortPath[key][len(dc2_ShortPath[key])-2]
-        
-        int0_ShortPathDistGradeMax = max(dc2_ShortPathDistGrade)
+        for key in dc1_ShortPathPrev:
+            dc1_NodeTrailOut[key] = dc1_ShortPathPrev[key]
         
         for key in dc1_NodeTrailOut:
             if dc1_NodeTrailOut[key] == "S": dc1_NodeTrailOut[key] = dc1_NodeTrailOut[key] + key
             dc1_NodeTrailIn[dc1_NodeTrailOut[key]] = key
-
-        for key in dc1_NodeTrailOut:
-            if key not in dc1_NodeTrailIn:
-                str0_Key = "L" + key
-                for i in range(int0_ShortPathDistGradeMax - dc1_ShortPathDist[key] + 1):
-                    dc1_NodeTrailIn[str0_Key[1:]] = str0_Key
-                    str0_Key = "L" + str0_Key
-
-        
-        for key in dc1_NodeTrailIn:
-            if "L" + key not in dc1_NodeTrailOut:
-                dc1_NodeTrailOut[dc1_NodeTrailIn[key]] = key
         
-        # Deviation
+        # Deviation (the last node of a trail has no trail in)
         for key in dc2_Node:
             str1_v = []
             for v in dc2_Node[key]:
-                if v != dc1_NodeTrailOut[key] and v != dc1_NodeTrailIn[key]:
+                if v != dc1_NodeTrailOut[key] and v != dc1_NodeTrailIn.get(key):
                     str1_v.append(v)
             dc2_NodeDeviation[key] = str1_v
         
@@ -498,87 +609,109 @@ if trailMembers and trailMembersID:
         
         ## Create Structural Matrix According to Weight
         
-        # Initialize Matrix with Indices
-        str2_StructuralMatrix = []
-        str1_NodeOrderMatrix = []
-        str2_NodeOrderMatrix = []
+        # Rows of the Matrix layer by layer from the supports. A trail that ends before the last
+        # layer is extended by padding nodes, the node index repeated with its padding depth (0 for
+        # the node itself), joined by auxiliary trails of length 0.0. The matrix is kept sparse:
+        # loads and trail length per row, deviation magnitudes per row and trail column
+        str2_Load = []
+        str1_TrailLength = []
+        dc2_DeviationEntry = []
+        int2_NodeOrderMatrix = []
+        int2_PaddingMatrix = []
         
-        str1_NodeOrder = dc2_ShortPathDistGrade[1]
+        int1_NodeOrder = [int(str0_Node) for str0_Node in dc2_ShortPathDistGrade[1]]
+        int1_Padding = [0]*len(int1_NodeOrder)
 
         for i in sorted(xrange(1,len(dc2_ShortPathDistGrade)+1)):
-            str1_NodeOrderUp = []
-            str2_NodeOrderMatrix.append(str1_NodeOrder)
-            for str0_NodeOrder in str1_NodeOrder:
-                str1_NodeOrderMatrix.append(str0_NodeOrder)
-                if str0_NodeOrder[0] != "L":
-                    str2_StructuralMatrix.append(["0"]*(3+len(str1_NodeOrder)+1))
-                    str1_NodeOrderUp.append(dc1_NodeTrailIn[str0_NodeOrder])
-                    
+            int1_NodeOrderUp = []
+            int1_PaddingUp = []
+            int2_NodeOrderMatrix.append(int1_NodeOrder)
+            int2_PaddingMatrix.append(int1_Padding)
+            for j in xrange(len(int1_NodeOrder)):
+                str2_Load.append(["0"]*3)
+                str1_TrailLength.append("0")
+                dc2_DeviationEntry.append({})
+                if int1_Padding[j] == 0 and str(int1_NodeOrder[j]) in dc1_NodeTrailIn:
+                    int1_NodeOrderUp.append(int(dc1_NodeTrailIn[str(int1_NodeOrder[j])]))
+                    int1_PaddingUp.append(0)
                 else:
-                    str2_StructuralMatrix.append(["0"]*(3+len(str1_NodeOrder)+1))
-                    str1_NodeOrderUp.append("L" + str0_NodeOrder)
-                    dc1_NodeTrailIn[str0_NodeOrder] = str0_NodeOrder[1:]
-                    dc2_EdgeEnds[str0_NodeOrder.replace("L","E")] = [str0_NodeOrder[1:], str0_NodeOrder]
-                    dc2_TrailEndsOut[str0_NodeOrder.replace("L","E")] = [str0_NodeOrder[1:], str0_NodeOrder]
-            str1_NodeOrder = str1_NodeOrderUp
+                    int1_NodeOrderUp.append(int1_NodeOrder[j])
+                    int1_PaddingUp.append(int1_Padding[j] + 1)
+                if int1_Padding[j] > 0:
+                    str1_TrailLength[-1] = "0.0"
+            int1_NodeOrder = int1_NodeOrderUp
+            int1_Padding = int1_PaddingUp
             
-        int0_NodeOrderMatrix = len(str2_NodeOrderMatrix[0])
+        int0_NodeOrderMatrix = len(int2_NodeOrderMatrix[0])
+        
+        # Matrix Row of every Node (first occurrence, as list.index)
+        dc1_NodeRow = {}
+        for i in xrange(len(int2_NodeOrderMatrix)):
+            for j in xrange(int0_NodeOrderMatrix):
+                if int2_PaddingMatrix[i][j] == 0 and str(int2_NodeOrderMatrix[i][j]) not in dc1_NodeRow:
+                    dc1_NodeRow[str(int2_NodeOrderMatrix[i][j])] = int0_NodeOrderMatrix*i + j
 
         # Add Attribute External Forces
         for key in dc1_NodeExtForce:
-            int0_NodeIndex = str1_NodeOrderMatrix.index(key)
-            str2_StructuralMatrix[int0_NodeIndex][0:3] = [str(item) for item in dc1_NodeExtForceAtt[key]]
-        
-        # Add Attributes Auxiliary Trails
-        for key in dc2_EdgeEnds: 
-            if key[0] == "E": dc1_EdgeAtt[key] = "0.0"
+            int0_NodeIndex = dc1_NodeRow[key]
+            str2_Load[int0_NodeIndex] = [str(item) for item in dc1_NodeExtForceAtt[key]]
         
         # Add Attribute Trail Out
         for key in dc2_EdgeEnds:
             if dc2_EdgeEnds[key][0] in dc1_NodeTrailOut and dc2_EdgeEnds[key][1] == dc1_NodeTrailOut[dc2_EdgeEnds[key][0]]:
-                int0_NodeIndex = str1_NodeOrderMatrix.index(dc2_EdgeEnds[key][0])
-                str2_StructuralMatrix[int0_NodeIndex][len(str2_StructuralMatrix[int0_NodeIndex])-1] = dc1_EdgeAtt[key]
+                int0_NodeIndex = dc1_NodeRow[dc2_EdgeEnds[key][0]]
+                str1_TrailLength[int0_NodeIndex] = dc1_EdgeAtt[key]
             elif dc2_EdgeEnds[key][1] in dc1_NodeTrailOut and dc2_EdgeEnds[key][0] == dc1_NodeTrailOut[dc2_EdgeEnds[key][1]]:
-                int0_NodeIndex = str1_NodeOrderMatrix.index(dc2_EdgeEnds[key][1])
-                str2_StructuralMatrix[int0_NodeIndex][len(str2_StructuralMatrix[int0_NodeIndex])-1] = dc1_EdgeAtt[key]
+                int0_NodeIndex = dc1_NodeRow[dc2_EdgeEnds[key][1]]
+                str1_TrailLength[int0_NodeIndex] = dc1_EdgeAtt[key]
         
         # Add Attribute Deviation
         for key in dc2_EdgeEnds:
             if dc2_EdgeEnds[key][0] in dc2_NodeDeviation and dc2_EdgeEnds[key][1] in dc2_NodeDeviation[dc2_EdgeEnds[key][0]]:
-                int0_NodeIndex = str1_NodeOrderMatrix.index(dc2_EdgeEnds[key][0])
-                int0_NodeIndexTo = str1_NodeOrderMatrix.index(dc2_EdgeEnds[key][1])
+                int0_NodeIndex = dc1_NodeRow[dc2_EdgeEnds[key][0]]
+                int0_NodeIndexTo = dc1_NodeRow[dc2_EdgeEnds[key][1]]
                 int0_NodeIndexRaw = (int0_NodeIndexTo) % int0_NodeOrderMatrix
-                str2_StructuralMatrix[int0_NodeIndex][3 + int0_NodeIndexRaw] = dc1_EdgeAtt[key]
+                dc2_DeviationEntry[int0_NodeIndex][int0_NodeIndexRaw] = dc1_EdgeAtt[key]
             if dc2_EdgeEnds[key][1] in dc2_NodeDeviation and dc2_EdgeEnds[key][0] in dc2_NodeDeviation[dc2_EdgeEnds[key][1]]:
-                int0_NodeIndex = str1_NodeOrderMatrix.index(dc2_EdgeEnds[key][1])
-                int0_NodeIndexTo = str1_NodeOrderMatrix.index(dc2_EdgeEnds[key][0])
+                int0_NodeIndex = dc1_NodeRow[dc2_EdgeEnds[key][1]]
+                int0_NodeIndexTo = dc1_NodeRow[dc2_EdgeEnds[key][0]]
                 int0_NodeIndexRaw = (int0_NodeIndexTo) % int0_NodeOrderMatrix
-                str2_StructuralMatrix[int0_NodeIndex][3 + int0_NodeIndexRaw] = dc1_EdgeAtt[key]
+                dc2_DeviationEntry[int0_NodeIndex][int0_NodeIndexRaw] = dc1_EdgeAtt[key]
         
-        # Order Matrix
-        str2_StructuralMatrixOrder = []
-        int1_StructuralMatrixOrder = []
-        str2_NodeOrderMatrixReversed = []
+        # Order Matrix, the deviations as sparse rows (CSR, columns are trail indices within the layer)
+        str1_LoadOrder = []
+        str1_TrailLengthOrder = []
+        int1_DevRowPtr = [0]
+        int1_DevCol = []
+        str1_DevValue = []
         
-        for i in reversed(xrange(1,len(str2_NodeOrderMatrix)+1)):
+        for i in reversed(xrange(1,len(int2_NodeOrderMatrix)+1)):
             for j in xrange(int0_NodeOrderMatrix):
                 int0_Index = int0_NodeOrderMatrix*(i-1)+j
-                if i != len(str2_NodeOrderMatrix):
-                    int1_StructuralMatrixOrder.append(str2_NodeOrderMatrix[i-1][j])
-                str2_StructuralMatrixOrder.append(str2_StructuralMatrix[int0_NodeOrderMatrix*(i-1)+j])
-        
-        for i in reversed(xrange(1,len(str2_NodeOrderMatrix)+1)):
-            str1_NodeOrderMatrixReversed = []
-            for j in xrange(int0_NodeOrderMatrix):
-                str1_NodeOrderMatrixReversed.append(str2_NodeOrderMatrix[i-1][j])
-            str2_NodeOrderMatrixReversed.append(str1_NodeOrderMatrixReversed)
-
+                str1_LoadOrder.extend(str2_Load[int0_Index])
+                str1_TrailLengthOrder.append(str1_TrailLength[int0_Index])
+                for int0_Col in sorted(dc2_DeviationEntry[int0_Index]):
+                    int1_DevCol.append(int0_Col)
+                    str1_DevValue.append(dc2_DeviationEntry[int0_Index][int0_Col])
+                int1_DevRowPtr.append(len(int1_DevCol))
+        
+        # Integer Node Order and padding depth in the same row order, padding nodes carry the
+        # index of the node they extend
+        int1_NodeOrderOut = ListListToList(int2_NodeOrderMatrix[::-1])
+        int1_PaddingOut = ListListToList(int2_PaddingMatrix[::-1])
+        bl1_NodePaddingOut = [int0_Padding > 0 for int0_Padding in int1_PaddingOut]
+        
+        # Node labels, padding nodes with one "L" per depth, and the auxiliary trails between
+        # the padding nodes, keyed with one "E" per depth
+        str1_NodeOrderOut = ["L"*int1_PaddingOut[i] + str(int1_NodeOrderOut[i]) for i in xrange(len(int1_NodeOrderOut))]
+        for i in xrange(len(int1_NodeOrderOut)):
+            if int1_PaddingOut[i] > 0:
+                str0_Node = str(int1_NodeOrderOut[i])
+                dc2_EdgeEnds["E"*int1_PaddingOut[i] + str0_Node] = [str1_NodeOrderOut[i][1:], str1_NodeOrderOut[i]]
+                dc2_TrailEndsOut["E"*int1_PaddingOut[i] + str0_Node] = [str1_NodeOrderOut[i][1:], str1_NodeOrderOut[i]]
         
         # Substitute Node Index with Matrix Index in Deviation2
         str1_Deviation2 = ListListToList(str2_Deviation2)
-        str1_NodeOrder = ListListToList(str2_NodeOrderMatrixReversed)
-        
-        str1_NodeOrderOut = str1_NodeOrder[:]
         
         # Edge-Node List
         dc2_EdgeEndsComplete = {}
@@ -592,15 +725,19 @@ if trailMembers and trailMembersID:
             dc2_EdgeEndsComplete[str( int(int0_EdgeEndsLen+i/3) )] = [str1_Deviation2[i],str1_Deviation2[i+1]]
             dc2_Deviation2EndsOut[str( int(int0_EdgeEndsLen+i/3) )] = [str1_Deviation2[i],str1_Deviation2[i+1]]
                 
+        dc1_NodeOrderIndex = {}
+        for i in xrange(len(int1_NodeOrderOut)):
+            if not bl1_NodePaddingOut[i] and str(int1_NodeOrderOut[i]) not in dc1_NodeOrderIndex:
+                dc1_NodeOrderIndex[str(int1_NodeOrderOut[i])] = i
+        
         for i in xrange(len(str1_Deviation2)):
             if (i+1) % 3 != 0:
-                str1_Deviation2[i] = str1_NodeOrder.index(str(str1_Deviation2[i]))
+                str1_Deviation2[i] = dc1_NodeOrderIndex[str(str1_Deviation2[i])]
         
         
         
         ## Output
         str1_DeviationIndirectOut = str1_Deviation2
-        str1_StructuralBehaviourOut = ListListToList(str2_StructuralMatrixOrder)
         
         #### AUTOMATIC GEOMETRIC INPUT FOR FORM DIAGRAM
         
@@ -609,13 +746,13 @@ if trailMembers and trailMembersID:
         # pt1_NodeOut = geometric locations from vertices in graph
         
         # Amount of layers
-        N_layers = len(str1_NodeOrder)/len(supports)
+        N_layers = len(int1_NodeOrderOut)/len(supports)
         
         # Create List of Origin Nodes with Indexes
-        str1_OriginNodeOut = [str0_OriginNodeOut.replace("L","") for str0_OriginNodeOut in str1_NodeOrder[:len(supports)]]
+        str1_OriginNodeOut = [str(int0_OriginNodeOut) for int0_OriginNodeOut in int1_NodeOrderOut[:len(supports)]]
         pt1_OriginNodeOut = []
-        for str0_OriginNodeOut in str1_OriginNodeOut:
-            pt1_OriginNodeOut.append(pt1_Node[int(str0_OriginNodeOut)])
+        for int0_OriginNodeOut in int1_NodeOrderOut[:len(supports)]:
+            pt1_OriginNodeOut.append(pt1_Node[int0_OriginNodeOut])
 
         str1_ConstraintPlane = []
         pl1_ConstraintPlane = []
@@ -645,8 +782,12 @@ if trailMembers and trailMembersID:
         str1_ConstraintPlaneOut = str1_ConstraintPlane
         pl1_ConstraintPlaneOut = pl1_ConstraintPlane
 
-        TP.str1_StructuralBehaviourOut = str1_StructuralBehaviourOut
+        TP.str1_LoadOut = str1_LoadOrder
+        TP.str1_TrailLengthOut = str1_TrailLengthOrder
+        TP.str1_DevValueOut = str1_DevValue
         TP.str1_DeviationIndirectOut = str1_DeviationIndirectOut
+        TP.int1_DevRowPtrOut = int1_DevRowPtr
+        TP.int1_DevColOut = int1_DevCol
         TP.pt1_NodeOut = pt1_NodeOut
         TP.str1_NodeOut = str1_NodeOut
         TP.crv1_EdgeOut = crv1_EdgeOut
@@ -659,6 +800,8 @@ if trailMembers and trailMembersID:
         TP.int1_Deviation1ID = int1_Deviation1ID
         TP.int1_Deviation2ID = int1_Deviation2ID
         TP.str1_NodeOrderOut = str1_NodeOrderOut
+        TP.int1_NodeOrderOut = int1_NodeOrderOut
+        TP.bl1_NodePaddingOut = bl1_NodePaddingOut
         TP.str1_ConstraintPlaneOut = str1_ConstraintPlaneOut
         TP.pl1_ConstraintPlaneOut = pl1_ConstraintPlaneOut
         TP.str1_OriginNodeOut = str1_OriginNodeOut
@@ -671,20 +814,15 @@ def StringToFloat(val):
     except (ValueError, TypeError):
         return 1.0
 
-if TP and hasattr(TP, "str1_StructuralBehaviourOut"):
-    str1_StructuralBehaviour = TP.str1_StructuralBehaviourOut[:]
-    str1_DeviationIndirect = TP.str1_DeviationIndirectOut[:]
-    db1_StructuralBehaviour = []
-    db1_DeviationIndirect = []
-        
-    for i in xrange(len(str1_StructuralBehaviour)):
-        db1_StructuralBehaviour.append(StringToFloat(str1_StructuralBehaviour[i]))
-    
-    for i in xrange(len(str1_DeviationIndirect)):
-        db1_DeviationIndirect.append(StringToFloat(str1_DeviationIndirect[i]))
+if TP and hasattr(TP, "str1_DevValueOut"):
+    TP.db1_LoadOut = [StringToFloat(str0_Value) for str0_Value in TP.str1_LoadOut]
+    TP.db1_TrailLengthOut = [StringToFloat(str0_Value) for str0_Value in TP.str1_TrailLengthOut]
+    TP.db1_DevValueOut = [StringToFloat(str0_Value) for str0_Value in TP.str1_DevValueOut]
+    TP.db1_DeviationIndirectOut = [StringToFloat(str0_Value) for str0_Value in TP.str1_DeviationIndirectOut]
 
-    del TP.str1_StructuralBehaviourOut
+    del TP.str1_LoadOut
+    del TP.str1_TrailLengthOut
+    del TP.str1_DevValueOut
     del TP.str1_DeviationIndirectOut
     
-    TP.db1_StructuralBehaviourOut = db1_StructuralBehaviour
-    TP.db1_DeviationIndirectOut = db1_DeviationIndirect
\ No newline at end of file
+    TP.compiled = compiledTopology(TP)
\ No newline at end of file
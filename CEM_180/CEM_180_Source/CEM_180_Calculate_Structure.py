@@ -31,50 +31,64 @@ url = { http://github.com/OleOhlbrock/CEM },
 
 """
 
-import Grasshopper, GhPython
-import System
-import rhinoscriptsyntax as rs
-import Rhino.Geometry as rh
+import array
+import json
 import math
-import System.Drawing.Color
-import copy
 import time
-import clr
 import os
+import struct
+import sys
 import collections
 from os.path import expanduser
-from System import Array, Func
 
-path = expanduser(str(os.getenv('APPDATA')) + ("\\Grasshopper\\Libraries\\NLoptNet\\NLoptNet.dll"))
-path = expanduser(path)
-
-clr.AddReferenceToFileAndPath(path)
-clr.AddReference('System.Core')
-
-import NLoptNet as nl
+try:
+    import Grasshopper, GhPython
+    import System
+    import rhinoscriptsyntax as rs
+    import Rhino.Geometry as rh
+    import System.Drawing.Color
+    import clr
+    from System import Array, Func
+except ImportError:
+    # headless: plain Python without Rhino, the optimization through NLoptNet is not available
+    import CEM_180_Headless as rh
+    from CEM_180_Headless import System
+    rs = None
+    clr = None
+
+try:
+    xrange
+except NameError:
+    xrange = range
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    import ghpythonlib.parallel as ghparallel
+except ImportError:
+    ghparallel = None
+
+if clr:
+    path = expanduser(str(os.getenv('APPDATA')) + ("\\Grasshopper\\Libraries\\NLoptNet\\NLoptNet.dll"))
+    path = expanduser(path)
+
+    clr.AddReferenceToFileAndPath(path)
+    clr.AddReference('System.Core')
+
+    import NLoptNet as nl
+else:
+    nl = None
 
 global int0_Counter
 global pt2_Trails
-global pt1_GlobNodeOut
-global ln1_GlobTrailEdgeOut
-global ln1_GlobDeviation1EdgeOut
-global ln1_GlobDeviation2EdgeOut
 global vc2_GlobTrailForce
-global ln2_GlobExtEdge
 global pt2_GlobNode
 global pt2_GlobNodeIteration
-global ln2_GlobTrailEdge
-global cl2_GlobTrailEdge
-global db2_GlobTrailEdge
-global ln2_GlobDeviation1Edge
-global cl2_GlobDeviation1Edge
-global db2_GlobDeviation1Edge
-global ln2_GlobDeviation2Edge
-global cl2_GlobDeviation2Edge
-global db2_GlobDeviation2Edge
-global ln2_GlobExtFOEdge
-global cl2_GlobExtFOEdge
-global db2_GlobExtFOEdge
+global int2_GlobTrailSign
+global vc2_GlobSelfWeight
 global int0_CounterOpt 
 global db0_DistanceBest
 global db1_VariableBest
@@ -85,38 +99,111 @@ global int1_DevEdgeInputID
 global str0_GlobSolver
 global str0_GlobDivergence
 global str0_GlobIteration
+global str0_GlobConvergence
 
 class model(object):
+    __slots__ = ("FD", "str1_GlobTrailEdgeOut", "str1_GlobDeviation1EdgeOut", "str1_GlobDeviation2EdgeOut", "str1_NodeOrderOut", "int1_NodeOrderOut", "bl1_NodePaddingOut",
+                 "bl1_GlobTrailAuxiliaryOut", "str1_EdgeOut", "int0_SolveCountOut", "db1_VariableOut", "db1_BoundUpOut", "db1_BoundLowOut",
+                 "str0_SolverOut", "str0_DivergenceOut", "str0_ConvergenceOut", "SC")
+    
     def __repr__(self):
         return self.ToString()
         
     def __str__(self):
         return self.ToString()
+    
+    # The lines, colours and filtered lists of the form diagram are built on first access
+    def __getattr__(self, str0_Name):
+        if str0_Name not in str1_FormDiagramOutput or not hasattr(self, "FD"):
+            raise AttributeError(str0_Name)
+        return FormDiagramGet(self.FD, str0_Name)
+    
+    def __dir__(self):
+        str1_Name = set(dir(type(self))) - set(self.__slots__)
+        str1_Name |= set([str0_Name for str0_Name in self.__slots__ if hasattr(self, str0_Name)])
+        if hasattr(self, "FD"):
+            str1_Name |= set(str1_FormDiagramOutput)
+        return sorted(str1_Name)
         
     def ToString(self):
-        if TPC and hasattr(TPC, "db1_StructuralBehaviourOut"):
-            str0_Description = ""
-            if int0_LayerCount:
-                str0_Description += "Structural Model\n\nlayers: " + str(int0_LayerCount)
-                if pt1_GlobNodeOut and ln1_GlobTrailEdgeOut:
-                    str0_Description += "\nvertices: " + str(len(pt1_GlobNodeOut)-int0_TrailNumber) + "\ntrail members: " + str(len(ln1_GlobTrailEdgeOut)-int0_TrailNumber) 
-                    if ln1_GlobDeviation1EdgeOut:
-                        str0_Description += "\ndirect deviation members: " + str(len(ln1_GlobDeviation1EdgeOut))
-                    if ln1_GlobDeviation2EdgeOut:
-                        str0_Description += "\nindirect deviation members: " + str(len(ln1_GlobDeviation2EdgeOut))
-                    if str0_GlobSolver:
-                        str0_Description += "\nsolver: " +  str0_GlobSolver
-                        if str0_GlobDivergence:
-                            str0_Description += "\ndivergence: " +  str0_GlobDivergence
-                    return str0_Description
-                else:
-                    return "Empty Structural Model"
-            else:
-                return "Empty Structural Model"
-        else:
+        FD = getattr(self, "FD", None)
+        if not FD or FD.int0_TrailNumber == 0 or FD.int0_NodeCount == 0:
             return "Empty Structural Model"
-
-
+        int0_Layers = FD.int0_NodeCount // FD.int0_TrailNumber
+        str0_Description = "Structural Model\n\nlayers: " + str(int0_Layers)
+        str0_Description += "\nvertices: " + str(FD.int0_NodeCount) + "\ntrail members: " + str((int0_Layers-1)*FD.int0_TrailNumber)
+        if len(FD.Members(int0_KindDeviation1)):
+            str0_Description += "\ndirect deviation members: " + str(len(FD.Members(int0_KindDeviation1)))
+        if len(FD.Members(int0_KindDeviation2)):
+            str0_Description += "\nindirect deviation members: " + str(len(FD.Members(int0_KindDeviation2)))
+        if getattr(self, "str0_SolverOut", ""):
+            str0_Description += "\nsolver: " + self.str0_SolverOut
+            if getattr(self, "str0_DivergenceOut", ""):
+                str0_Description += "\ndivergence: " + self.str0_DivergenceOut
+        if getattr(self, "str0_ConvergenceOut", ""):
+            str0_Description += "\nconvergence rate: " + self.str0_ConvergenceOut
+        return str0_Description
+
+    # Node positions, trail forces and force envelopes for several load cases (at the variables of the model by default)
+    def SolveLoadCases(self, db3_Load, db1_Variable = None):
+        if db1_Variable is None:
+            db1_Variable = self.db1_VariableOut
+        return SolveLoadCases(ModelContext(self), db3_Load, db1_Variable)
+
+    # Node positions, trail forces and objective for a population of variable vectors
+    def SolveDesigns(self, db2_Variable):
+        return SolveDesigns(ModelContext(self), db2_Variable)
+
+    # Number of sign variables and their permutations under the symmetries of the topology
+    def SignVariableCount(self):
+        return SignVariableCount(ModelContext(self))
+
+    def SignSymmetry(self):
+        return SignSymmetry(ModelContext(self), self.db1_VariableOut)
+
+    # Residuals of the target objective for a variable vector (their sum of squares is the objective)
+    def SolveResidual(self, db1_Variable):
+        return SolveResidual(ModelContext(self), db1_Variable)
+
+    # Form diagram, IDs and variables in one binary buffer (read with ModelFromBytes)
+    def ToBytes(self):
+        return ModelToBytes(self)
+
+    # Model of a buffer written by ToBytes (e.g. archive.ModelBytes()), no model is needed to call it
+    @staticmethod
+    def FromBytes(xx0_Buffer):
+        return ModelFromBytes(xx0_Buffer)
+
+# Attributes of the model that are set
+def ModelState(M0):
+    return dict([(str0_Name, getattr(M0, str0_Name)) for str0_Name in model.__slots__ if hasattr(M0, str0_Name)])
+
+# Solve context of the run that calculated the model, a model read with FromBytes has none
+def ModelContext(M0):
+    if not hasattr(M0, "SC"):
+        raise ValueError("The model has no solve context, solve it with Calculate_Structure first")
+    return M0.SC
+
+
+
+### TOPOLOGY OVERLAY
+# The inputs for constraint planes and origin nodes are laid over the topology instead of
+# changing a deep copy of it. All other attributes are read from the compiled topology of
+# Build_Topology (or from the topology itself if it was built without one).
+class topologyOverlay(object):
+    __slots__ = ("TP", "pl1_ConstraintPlaneOut", "int1_ConstraintPlaneOut", "pt1_OriginNodeOut")
+
+    def __init__(self, TP):
+        self.TP = getattr(TP, "compiled", TP)
+        if hasattr(self.TP, "pl1_ConstraintPlaneOut"):
+            self.pl1_ConstraintPlaneOut = self.TP.pl1_ConstraintPlaneOut
+        if hasattr(self.TP, "pt1_OriginNodeOut"):
+            self.pt1_OriginNodeOut = self.TP.pt1_OriginNodeOut
+
+    def __getattr__(self, str0_Name):
+        if str0_Name == "TP":
+            raise AttributeError(str0_Name)
+        return getattr(self.TP, str0_Name)
 
 ### AUXILIARY FUNCTIONS
 def ListListToList(xx2_Data):
@@ -138,6 +225,65 @@ def ListToListList(xx1_Data, int0_R, int0_C):
         xx2_DataOut.append(xx1_DataOut)
     return xx2_DataOut
 
+def SolveLinear(db2_A, db1_B):
+    # Gaussian elimination with partial pivoting, None if the system is singular
+    int0_N = len(db1_B)
+    db2_M = [db2_A[i][:] + [db1_B[i]] for i in xrange(int0_N)]
+    db0_Scale = max([abs(db2_A[i][i]) for i in xrange(int0_N)] + [0.0])
+    for k in xrange(int0_N):
+        int0_Pivot = max(xrange(k, int0_N), key=lambda i: abs(db2_M[i][k]))
+        if abs(db2_M[int0_Pivot][k]) <= 1e-14*db0_Scale or db0_Scale == 0.0:
+            return None
+        db2_M[k], db2_M[int0_Pivot] = db2_M[int0_Pivot], db2_M[k]
+        for i in xrange(k+1, int0_N):
+            db0_Factor = db2_M[i][k]/db2_M[k][k]
+            for j in xrange(k, int0_N+1):
+                db2_M[i][j] -= db0_Factor*db2_M[k][j]
+    db1_X = [0.0]*int0_N
+    for k in reversed(xrange(int0_N)):
+        db1_X[k] = (db2_M[k][int0_N] - sum([db2_M[k][j]*db1_X[j] for j in xrange(k+1, int0_N)]))/db2_M[k][k]
+    return db1_X
+
+### INDEX MAPS
+# Lists from an integer id to its position, instead of list.index() scans over the labels.
+# Labels that are not plain integers (padding nodes "L..", auxiliary trails "E..") have no id.
+def IndexID(xx0_ID):
+    str0_ID = str(xx0_ID)
+    if str0_ID.isdigit() and str(int(str0_ID)) == str0_ID:
+        return int(str0_ID)
+    return -1
+
+def IndexMap(xx1_ID, bl1_Skip = None):
+    # First position of every id, -1 where absent
+    int1_Index = []
+    for k in xrange(len(xx1_ID)):
+        int0_ID = IndexID(xx1_ID[k])
+        if int0_ID < 0 or (bl1_Skip and bl1_Skip[k]):
+            continue
+        if int0_ID >= len(int1_Index):
+            int1_Index.extend([-1]*(int0_ID + 1 - len(int1_Index)))
+        if int1_Index[int0_ID] == -1:
+            int1_Index[int0_ID] = k
+    return int1_Index
+
+def IndexLists(xx1_ID):
+    # All positions of every id
+    int2_Index = []
+    for k in xrange(len(xx1_ID)):
+        int0_ID = IndexID(xx1_ID[k])
+        if int0_ID < 0:
+            continue
+        while int0_ID >= len(int2_Index):
+            int2_Index.append([])
+        int2_Index[int0_ID].append(k)
+    return int2_Index
+
+def IndexOf(int1_Index, xx0_ID):
+    int0_ID = IndexID(xx0_ID)
+    if int0_ID < 0 or int0_ID >= len(int1_Index):
+        return -1
+    return int1_Index[int0_ID]
+
 def DataTreeToListList(dt2_Data):
     xx2_DataOut = []
     for i in xrange(dt2_Data.BranchCount):
@@ -183,9 +329,12 @@ if SW and hasattr(SW, "yieldStress") and hasattr(SW, "specWeight"):
     yieldStress = SW.yieldStress
     specWeight = SW.specWeight
 
-TPC = copy.deepcopy(TP)
+TPC = topologyOverlay(TP) if TP else TP
 
-if TPC and hasattr(TPC, "db1_StructuralBehaviourOut"):
+# A topology of Build_Topology, with the sparse matrix of the structural behaviour
+bl0_Topology = bool(TPC) and hasattr(TPC, "db1_DevValueOut")
+
+if bl0_Topology:
     if len(constraintPlane) > 0:
         if len(constraintPlane) == len(constraintPlaneID):
             TPC.pl1_ConstraintPlaneOut = constraintPlane
@@ -215,31 +364,33 @@ if TPC and hasattr(TPC, "dc2_TrailEndsOut"):
     dc2_TrailEdge = dict( [ [tuple(v),k] for k, v in TPC.dc2_TrailEndsOut.items() ] )
 
 str1_NodeOrder = []
-if TPC and hasattr(TPC, "db1_StructuralBehaviourOut"):
-    str1_NodeOrder = TPC.str1_NodeOrderOut[:]
+if bl0_Topology:
+    str1_NodeOrder = list(TPC.str1_NodeOrderOut)
 
 # Trail Edge
 str1_TrailEdgeID = []
-for str0_NodeOrder in str1_NodeOrder:
+dc1_NodeTrailEdge = {}
+if str1_NodeOrder:
     for key in dc2_TrailEdge:
-        if str0_NodeOrder == key[0] and dc2_TrailEdge[key] != "X":
-            str1_TrailEdgeID.append( dc2_TrailEdge[key] )
-            dc2_TrailEdge[key] = "X"
-        if str0_NodeOrder == key[1] and dc2_TrailEdge[key] != "X":
+        dc1_NodeTrailEdge.setdefault(key[0], []).append(key)
+        if key[1] != key[0]:
+            dc1_NodeTrailEdge.setdefault(key[1], []).append(key)
+for str0_NodeOrder in str1_NodeOrder:
+    for key in dc1_NodeTrailEdge.get(str0_NodeOrder, []):
+        if dc2_TrailEdge[key] != "X":
             str1_TrailEdgeID.append( dc2_TrailEdge[key] )
             dc2_TrailEdge[key] = "X"
+bl1_TrailAuxiliary = [IndexID(str0_TrailEdgeID) < 0 for str0_TrailEdgeID in str1_TrailEdgeID]
 
 # Direct Deviation Edges
 
 dc2_Deviation1EndsOut = []
 dc2_Deviation2EndsOut = []
-db1_StructuralBehaviourOut = []
 pt1_OriginNodeOut = []
 
-if TPC and hasattr(TPC, "db1_StructuralBehaviourOut"):
+if bl0_Topology:
     dc2_Deviation1EndsOut = TPC.dc2_Deviation1EndsOut
     dc2_Deviation2EndsOut = TPC.dc2_Deviation2EndsOut
-    db1_StructuralBehaviourOut = TPC.db1_StructuralBehaviourOut
     pt1_OriginNodeOut = TPC.pt1_OriginNodeOut
 
 
@@ -247,16 +398,32 @@ if TPC and hasattr(TPC, "db1_StructuralBehaviourOut"):
     dc2_Dev2Edge = dict( [ [tuple(v),k] for k, v in dc2_Deviation2EndsOut.items() ] )
 
     str1_Dev1EdgeID = []
-    db2_StructuralBehaviourOut = []
-    for i in range(len(str1_NodeOrder)):
-        db1_StructuralBehaviourOutRow = db1_StructuralBehaviourOut[i*(3+len(pt1_OriginNodeOut)+1):(i+1)*(3+len(pt1_OriginNodeOut)+1)]
-        db2_StructuralBehaviourOut.append(db1_StructuralBehaviourOutRow)
     
-    for i in range(len(db2_StructuralBehaviourOut)):
-        for j in range(4+(i % (len(db2_StructuralBehaviourOut[i])-4) ) ,len(db2_StructuralBehaviourOut[i])-1):
-            if db2_StructuralBehaviourOut[i][j] != 0:
+    # Sparse Matrix of the Structural Behaviour (see Build_Topology): loads and trail length per
+    # row, deviations per row as CSR with the trail index within the layer as column. The trail
+    # lengths and deviations are copied, the variables of the optimization are written into them
+    int0_RowTrail = len(pt1_OriginNodeOut)
+    int1_DevRowPtr = TPC.int1_DevRowPtrOut
+    int1_DevCol = TPC.int1_DevColOut
+    db1_DevValue = list(TPC.db1_DevValueOut)
+    db2_Load = [TPC.db1_LoadOut[3*i:3*i+3] for i in xrange(len(str1_NodeOrder))]
+    db1_RowTrailLength = list(TPC.db1_TrailLengthOut)
+    
+    # Position of every entry (i,j) and of the entry (j,i) of the same layer (-1 if absent)
+    dc1_DevPosition = {}
+    for i in xrange(len(str1_NodeOrder)):
+        for p in xrange(int1_DevRowPtr[i], int1_DevRowPtr[i+1]):
+            dc1_DevPosition[(i, int1_DevCol[p])] = p
+    int1_DevTranspose = [-1]*len(int1_DevCol)
+    for (i, j), p in dc1_DevPosition.items():
+        int1_DevTranspose[p] = dc1_DevPosition.get(((i // int0_RowTrail)*int0_RowTrail + j, i % int0_RowTrail), -1)
+    
+    for i in range(len(str1_NodeOrder)):
+        for p in xrange(int1_DevRowPtr[i], int1_DevRowPtr[i+1]):
+            int0_Col = int1_DevCol[p]
+            if int0_Col > i % int0_RowTrail and db1_DevValue[p] != 0:
                 id_i = str1_NodeOrder[i]
-                id_j = str1_NodeOrder[ (i // (len(db2_StructuralBehaviourOut[i])-4)) * (len(db2_StructuralBehaviourOut[i])-4) + j-3]
+                id_j = str1_NodeOrder[(i // int0_RowTrail)*int0_RowTrail + int0_Col]
                 if (id_i,id_j) in dc2_Dev1Edge:
                     str1_Dev1EdgeID.append(dc2_Dev1Edge[(id_i,id_j)])
                 else:
@@ -267,13 +434,429 @@ if TPC and hasattr(TPC, "db1_StructuralBehaviourOut"):
     str1_Dev2EdgeID = [str(key) for key in int1_Dev2EdgeID]
     
     int1_DevEdgeInputID = []
-    if TPC and hasattr(TPC, "db1_StructuralBehaviourOut"):
-        int1_DevEdgeInputID = TPC.int1_Deviation1ID[:]
+    if bl0_Topology:
+        int1_DevEdgeInputID = list(TPC.int1_Deviation1ID)
         int1_DevEdgeInputID.extend(TPC.int1_Deviation2ID)
 
 
+### LAYER KERNEL
+# Deviation resultant and static action per node of layer g, computed on plain coordinates
+# over the sparse deviation structure of the layer (cost proportional to the number of
+# deviation edges). A pair (i,j) is active if one of its two matrix entries exceeds the
+# threshold. Values are read from db1_DevValue, so deviation variables set by the
+# optimization are taken into account. Where NumPy can be imported (CPython) the entries of
+# the layer are computed as arrays, in IronPython by the loop over the entries.
+bl0_LayerKernel = True
+
+def LayerDeviation(pt1_InputNode, g):
+    if bl0_LayerKernel and np is not None:
+        return LayerDeviationArray(pt1_InputNode, g)
+    return LayerDeviationSparse(pt1_InputNode, g)
+
+def LayerDeviationArray(pt1_InputNode, g):
+    int0_N = len(pt1_InputNode)
+    int1_RowPtr = np.array(int1_DevRowPtr[g*int0_N:(g+1)*int0_N+1], dtype=int)
+    int0_Start = int1_RowPtr[0]
+    int0_End = int1_RowPtr[-1]
+    
+    # Entries of the layer: row, column, magnitude and magnitude of the transposed entry
+    int1_Row = np.repeat(np.arange(int0_N), np.diff(int1_RowPtr))
+    int1_Col = np.array(int1_DevCol[int0_Start:int0_End], dtype=int)
+    db1_Mag = np.array(db1_DevValue[int0_Start:int0_End], dtype=float)
+    int1_Transpose = np.array(int1_DevTranspose[int0_Start:int0_End], dtype=int)
+    db1_MagT = np.where(int1_Transpose >= 0, db1_Mag[np.maximum(int1_Transpose - int0_Start, 0)], 0.0)
+    bl1_Active = (np.abs(db1_Mag) > db0_Threshold) | (np.abs(db1_MagT) > db0_Threshold)
+    int1_Row = int1_Row[bl1_Active]
+    int1_Col = int1_Col[bl1_Active]
+    db1_Mag = db1_Mag[bl1_Active]
+    
+    # Deviation vectors of the active entries summed per row
+    db2_Node = np.array([[pt0_Node.X, pt0_Node.Y, pt0_Node.Z] for pt0_Node in pt1_InputNode], dtype=float).reshape(int0_N, 3)
+    db2_Length = db2_Node[int1_Col] - db2_Node[int1_Row]
+    db1_Length = np.sqrt((db2_Length**2).sum(axis=1))
+    db1_Scale = db1_Mag/db1_Length
+    db2_DevForceSum = np.zeros((int0_N, 3))
+    for k in xrange(3):
+        db2_DevForceSum[:,k] = np.bincount(int1_Row, weights=db2_Length[:,k]*db1_Scale, minlength=int0_N)
+    db1_DevStatActSum = np.bincount(int1_Row, weights=np.abs(db1_Length*db1_Mag), minlength=int0_N)
+    vc1_DevForceSum = [rh.Vector3d(float(db1_Row[0]), float(db1_Row[1]), float(db1_Row[2])) for db1_Row in db2_DevForceSum]
+    return vc1_DevForceSum, [float(db0_Sum) for db0_Sum in db1_DevStatActSum]
+
+def LayerDeviationSparse(pt1_InputNode, g):
+    int0_N = len(pt1_InputNode)
+    int0_Row0 = g*int0_N
+    vc1_DevForceSum = []
+    db1_DevStatActSum = []
+    for i in xrange(int0_N):
+        pt0_Node_i = pt1_InputNode[i]
+        db0_FX = 0.0
+        db0_FY = 0.0
+        db0_FZ = 0.0
+        db0_StatAct = 0.0
+        for p in xrange(int1_DevRowPtr[int0_Row0 + i], int1_DevRowPtr[int0_Row0 + i + 1]):
+            db0_Mag = db1_DevValue[p]
+            if abs(db0_Mag) > db0_Threshold or int1_DevTranspose[p] >= 0 and abs(db1_DevValue[int1_DevTranspose[p]]) > db0_Threshold:
+                pt0_Node_j = pt1_InputNode[int1_DevCol[p]]
+                db0_DX = pt0_Node_j.X - pt0_Node_i.X
+                db0_DY = pt0_Node_j.Y - pt0_Node_i.Y
+                db0_DZ = pt0_Node_j.Z - pt0_Node_i.Z
+                db0_Length = math.sqrt(db0_DX*db0_DX + db0_DY*db0_DY + db0_DZ*db0_DZ)
+                db0_Scale = db0_Mag/db0_Length
+                db0_FX += db0_DX*db0_Scale
+                db0_FY += db0_DY*db0_Scale
+                db0_FZ += db0_DZ*db0_Scale
+                db0_StatAct += abs(db0_Length*db0_Mag)
+        vc1_DevForceSum.append(rh.Vector3d(db0_FX, db0_FY, db0_FZ))
+        db1_DevStatActSum.append(db0_StatAct)
+    return vc1_DevForceSum, db1_DevStatActSum
+
+
+### BRACING INCIDENCE
+# Indirect deviations starting and ending at each row: {row: [(bracing index, row of the
+# other node)]}, built once per topology. The bracing values are read from xx1_Bracing,
+# so values set by the optimization are taken into account.
+def BracingIncidence(xx1_Bracing):
+    dc2_BracingStart = {}
+    dc2_BracingEnd = {}
+    for i in xrange(0, len(xx1_Bracing), 3):
+        dc2_BracingStart.setdefault(int(xx1_Bracing[i]), []).append((i // 3, int(xx1_Bracing[i+1])))
+        dc2_BracingEnd.setdefault(int(xx1_Bracing[i+1]), []).append((i // 3, int(xx1_Bracing[i])))
+    return dc2_BracingStart, dc2_BracingEnd
+
+# Both directions per row, start nodes first
+def BracingNode():
+    dc2_BracingNode = {}
+    for int0_Row in dc2_BracingStart:
+        dc2_BracingNode[int0_Row] = dc2_BracingStart[int0_Row][:]
+    for int0_Row in dc2_BracingEnd:
+        dc2_BracingNode.setdefault(int0_Row, []).extend(dc2_BracingEnd[int0_Row])
+    return dc2_BracingNode
+
+
+### LEAN SOLVE
+# During the optimization only node positions and trail forces are computed, the signs of
+# the trails and the form diagram are only recorded by the final solve.
+bl0_LeanOptimization = True
+bl0_Lean = False
+
+
+### FORM DIAGRAM
+# The final solve stores the form diagram as contiguous arrays (struct of arrays):
+#   db1_Position    float64  node coordinates (n,3)
+#   int1_Layer      int32    layer of each node (n)
+#   int1_Edge       int32    end nodes of the members (m,2): trails, direct, then indirect deviations
+#   db1_Force       float64  signed forces of the members (m)
+#   int1_Sign       int8     sign of each member (m), for the trails the sign of the trail length
+#   int1_Kind       int32    trail, direct or indirect deviation (m)
+#   int1_KindStart           start of the members of each kind and the end of the last (kinds+1)
+# and the external forces, self-weight and reactions as node, vector (k,3) and whether the
+# vector ends at the node. Position() and Edge() read the arrays in place, the arrays also
+# support the buffer protocol (e.g. numpy.frombuffer). The lines, colours and filtered ID
+# lists of the model are only built when an output is first read (model.__getattr__) and
+# then cached, so components that only read forces never build geometry.
+int0_KindTrail = 0
+int0_KindDeviation1 = 1
+int0_KindDeviation2 = 2
+
+class formDiagram(object):
+    __slots__ = ("int0_TrailNumber", "int0_NodeCount", "db1_Position", "int1_Layer", "int1_Edge", "db1_Force", "int1_Sign", "int1_Kind", "int1_KindStart", "int1_ExtFONode", "db1_ExtFOVector",
+                 "int1_ExtFOEnd", "str1_NodeOrder", "bl1_NodePadding", "str1_TrailEdgeID", "bl1_TrailAuxiliary", "str1_Dev1EdgeID", "str1_Dev2EdgeID", "int1_DevEdgeInputID", "dc1_Output")
+
+    def Position(self, i):
+        return self.db1_Position[3*i], self.db1_Position[3*i+1], self.db1_Position[3*i+2]
+
+    def Edge(self, k):
+        return self.int1_Edge[2*k], self.int1_Edge[2*k+1]
+
+    # Members of one kind are stored in one block, range of their indices
+    def Members(self, int0_Kind):
+        return xrange(self.int1_KindStart[int0_Kind], self.int1_KindStart[int0_Kind+1])
+
+# Block offsets of an array of kinds in the order of FormDiagram()
+def KindStart(int1_Kind):
+    int1_Start = [0]*(int0_KindDeviation2 + 2)
+    for int0_Kind in int1_Kind:
+        int1_Start[int0_Kind+1] += 1
+    for int0_Kind in xrange(int0_KindDeviation2 + 1):
+        int1_Start[int0_Kind+1] += int1_Start[int0_Kind]
+    return int1_Start
+
+str1_FormDiagramOutput = ["pt1_GlobNodeOut", "ln1_GlobTrailEdgeOut", "cl1_GlobTrailEdgeOut", "db1_GlobTrailEdgeOut", "ln1_GlobDeviation1EdgeOut", "cl1_GlobDeviation1EdgeOut", "db1_GlobDeviation1EdgeOut",
+                          "ln1_GlobDeviation2EdgeOut", "cl1_GlobDeviation2EdgeOut", "db1_GlobDeviation2EdgeOut", "ln1_GlobDeviationEdgeOut", "str1_GlobDeviationEdgeOut", "cl1_GlobDeviationEdgeOut", "db1_GlobDeviationEdgeOut",
+                          "ln1_GlobExtFOEdgeOut", "cl1_GlobExtFOEdgeOut", "db1_GlobExtFOEdgeOut", "pt1_NodeOut", "str1_NodeOut", "ln1_TrailEdgeOut", "str1_TrailEdgeOut", "cl1_TrailEdgeOut", "db1_TrailEdgeOut"]
+
+# Arrays of the last sub-iteration of the final solve
+def FormDiagram(str1_NodeOrderC):
+    FD = formDiagram()
+    FD.int0_TrailNumber = int0_TrailNumber
+    FD.int0_NodeCount = len(str1_NodeOrderC)
+    FD.db1_Position = array.array("d")
+    FD.int1_Layer = array.array("i")
+    for g in xrange(len(pt2_GlobNodeIteration)):
+        for pt0_Node in pt2_GlobNodeIteration[g]:
+            FD.db1_Position.extend((pt0_Node.X, pt0_Node.Y, pt0_Node.Z))
+            FD.int1_Layer.append(g)
+    FD.int1_Edge = array.array("i")
+    FD.db1_Force = array.array("d")
+    FD.int1_Sign = array.array("b")
+    FD.int1_Kind = array.array("i")
+    FD.int1_KindStart = [0]
+
+    # Trail edges from each node to the node of the next layer
+    int1_TrailSign = ListListToList(int2_GlobTrailSign)
+    for k in xrange(min(int0_LayerCount*int0_TrailNumber, len(str1_TrailEdgeID))):
+        FD.int1_Edge.extend((k, k + int0_TrailNumber))
+        if int1_TrailSign[k] != 0:
+            FD.db1_Force.append(int1_TrailSign[k]*vc2_GlobTrailForce[k // int0_TrailNumber][k % int0_TrailNumber].Length)
+        else:
+            FD.db1_Force.append(0.0)
+        FD.int1_Sign.append(int1_TrailSign[k])
+        FD.int1_Kind.append(int0_KindTrail)
+    FD.int1_KindStart.append(len(FD.int1_Kind))
+
+    # Direct deviation edges within each layer
+    for i in xrange(int0_LayerCount*int0_TrailNumber):
+        for p in xrange(int1_DevRowPtr[i], int1_DevRowPtr[i+1]):
+            int0_Col = int1_DevCol[p]
+            db0_Force = db1_DevValue[p]
+            if int0_Col > i % int0_TrailNumber and db0_Force != 0:
+                FD.int1_Edge.extend((i, (i // int0_TrailNumber)*int0_TrailNumber + int0_Col))
+                FD.db1_Force.append(db0_Force)
+                FD.int1_Sign.append(1 if db0_Force > 0.0 else -1)
+                FD.int1_Kind.append(int0_KindDeviation1)
+    FD.int1_KindStart.append(len(FD.int1_Kind))
+
+    # Indirect deviation edges between any nodes
+    for i in xrange(0, len(xx1_Bracing), 3):
+        db0_Force = float(xx1_Bracing[i+2])
+        FD.int1_Edge.extend((int(xx1_Bracing[i]), int(xx1_Bracing[i+1])))
+        FD.db1_Force.append(db0_Force)
+        FD.int1_Sign.append(1 if db0_Force > 0.0 else -1 if db0_Force < 0.0 else 0)
+        FD.int1_Kind.append(int0_KindDeviation2)
+    FD.int1_KindStart.append(len(FD.int1_Kind))
+
+    # External forces and self-weight per layer, then the reactions at the end of the trails
+    FD.int1_ExtFONode = array.array("i")
+    FD.db1_ExtFOVector = array.array("d")
+    FD.int1_ExtFOEnd = array.array("b")
+    for g in xrange(int0_LayerCount):
+        for i in xrange(int0_TrailNumber):
+            FD.int1_ExtFONode.append(g*int0_TrailNumber + i)
+            FD.db1_ExtFOVector.extend(db2_Load[g*int0_TrailNumber + i])
+            FD.int1_ExtFOEnd.append(0)
+        for i in xrange(len(vc2_GlobSelfWeight[g])):
+            vc0_SelfWeight = vc2_GlobSelfWeight[g][i]
+            FD.int1_ExtFONode.append(g*int0_TrailNumber + i)
+            FD.db1_ExtFOVector.extend((vc0_SelfWeight.X, vc0_SelfWeight.Y, vc0_SelfWeight.Z))
+            FD.int1_ExtFOEnd.append(0)
+    for i in xrange(int0_TrailNumber):
+        vc0_Reaction = vc2_GlobTrailForce[int0_LayerCount-1][i]
+        FD.int1_ExtFONode.append(int0_LayerCount*int0_TrailNumber + i)
+        FD.db1_ExtFOVector.extend((vc0_Reaction.X, vc0_Reaction.Y, vc0_Reaction.Z))
+        FD.int1_ExtFOEnd.append(1 if int2_GlobTrailSign[int0_LayerCount-1][i] < 0 else 0)
+
+    FD.str1_NodeOrder = str1_NodeOrderC
+    FD.bl1_NodePadding = bl1_NodePadding
+    FD.str1_TrailEdgeID = str1_TrailEdgeID
+    FD.bl1_TrailAuxiliary = bl1_TrailAuxiliary
+    FD.str1_Dev1EdgeID = str1_Dev1EdgeID
+    FD.str1_Dev2EdgeID = str1_Dev2EdgeID
+    FD.int1_DevEdgeInputID = int1_DevEdgeInputID
+    FD.dc1_Output = {}
+    return FD
+
+def FormDiagramColour(int0_Sign):
+    if int0_Sign > 0:
+        return System.Drawing.Color.Red
+    elif int0_Sign < 0:
+        return System.Drawing.Color.Blue
+    return System.Drawing.Color.Black
+
+def FormDiagramLine(FD, int0_Kind):
+    pt1_Node = FormDiagramGet(FD, "pt1_Node")
+    return [rh.Line(pt1_Node[FD.int1_Edge[2*k]], pt1_Node[FD.int1_Edge[2*k+1]]) for k in FD.Members(int0_Kind)]
+
+def FormDiagramSort(FD, xx1_Deviation):
+    return [xx1_Deviation[k] for k in FormDiagramGet(FD, "int1_DeviationOrder")]
+
+def FormDiagramFilter(xx1_Data, bl1_Skip):
+    return [xx1_Data[i] for i in xrange(len(xx1_Data)) if not bl1_Skip[i]]
+
+# Cached output of the form diagram, built from the arrays or other outputs on the first call
+def FormDiagramGet(FD, str0_Name):
+    if str0_Name not in FD.dc1_Output:
+        FD.dc1_Output[str0_Name] = FormDiagramOutput(FD, str0_Name)
+    return FD.dc1_Output[str0_Name]
+
+def FormDiagramOutput(FD, str0_Name):
+
+    # Nodes
+    if str0_Name == "pt1_Node":
+        return [rh.Point3d(FD.db1_Position[3*i], FD.db1_Position[3*i+1], FD.db1_Position[3*i+2]) for i in xrange(len(FD.int1_Layer))]
+    if str0_Name == "pt1_GlobNodeOut":
+        return FormDiagramGet(FD, "pt1_Node")[:FD.int0_NodeCount]
+
+    # Trail edges
+    if str0_Name == "ln1_GlobTrailEdgeOut":
+        return FormDiagramLine(FD, int0_KindTrail)
+    if str0_Name == "cl1_GlobTrailEdgeOut":
+        return [FormDiagramColour(FD.int1_Sign[k]) for k in FD.Members(int0_KindTrail)]
+    if str0_Name == "db1_GlobTrailEdgeOut":
+        return [FD.db1_Force[k] for k in FD.Members(int0_KindTrail)]
+
+    # Direct and indirect deviation edges
+    if str0_Name == "ln1_GlobDeviation1EdgeOut":
+        return FormDiagramLine(FD, int0_KindDeviation1)
+    if str0_Name == "cl1_GlobDeviation1EdgeOut":
+        return [FormDiagramColour(FD.int1_Sign[k]) for k in FD.Members(int0_KindDeviation1)]
+    if str0_Name == "db1_GlobDeviation1EdgeOut":
+        return [FD.db1_Force[k] for k in FD.Members(int0_KindDeviation1)]
+    if str0_Name == "ln1_GlobDeviation2EdgeOut":
+        return FormDiagramLine(FD, int0_KindDeviation2)
+    if str0_Name == "cl1_GlobDeviation2EdgeOut":
+        return [FormDiagramColour(FD.int1_Sign[k]) for k in FD.Members(int0_KindDeviation2)]
+    if str0_Name == "db1_GlobDeviation2EdgeOut":
+        return [FD.db1_Force[k] for k in FD.Members(int0_KindDeviation2)]
+
+    # All deviation edges sorted by their IDs, then by the input order of the deviations
+    if str0_Name == "int1_DeviationOrder":
+        str1_DevEdgeID = list(FD.str1_Dev1EdgeID) + list(FD.str1_Dev2EdgeID)
+        int1_Order = sorted(xrange(len(str1_DevEdgeID)), key = lambda k: str1_DevEdgeID[k])
+        return [xx0_Sort[2] for xx0_Sort in sorted(zip(FD.int1_DevEdgeInputID, [str1_DevEdgeID[k] for k in int1_Order], int1_Order))]
+    if str0_Name == "ln1_GlobDeviationEdgeOut":
+        return FormDiagramSort(FD, FormDiagramGet(FD, "ln1_GlobDeviation1EdgeOut") + FormDiagramGet(FD, "ln1_GlobDeviation2EdgeOut"))
+    if str0_Name == "str1_GlobDeviationEdgeOut":
+        return FormDiagramSort(FD, list(FD.str1_Dev1EdgeID) + list(FD.str1_Dev2EdgeID))
+    if str0_Name == "cl1_GlobDeviationEdgeOut":
+        return FormDiagramSort(FD, FormDiagramGet(FD, "cl1_GlobDeviation1EdgeOut") + FormDiagramGet(FD, "cl1_GlobDeviation2EdgeOut"))
+    if str0_Name == "db1_GlobDeviationEdgeOut":
+        return FormDiagramSort(FD, FormDiagramGet(FD, "db1_GlobDeviation1EdgeOut") + FormDiagramGet(FD, "db1_GlobDeviation2EdgeOut"))
+
+    # External forces, self-weight and reactions
+    if str0_Name == "ln1_GlobExtFOEdgeOut":
+        pt1_Node = FormDiagramGet(FD, "pt1_Node")
+        ln1_ExtFOEdge = []
+        for k in xrange(len(FD.int1_ExtFONode)):
+            pt0_Node = pt1_Node[FD.int1_ExtFONode[k]]
+            vc0_ExtFO = rh.Vector3d(FD.db1_ExtFOVector[3*k], FD.db1_ExtFOVector[3*k+1], FD.db1_ExtFOVector[3*k+2])
+            if FD.int1_ExtFOEnd[k]:
+                ln1_ExtFOEdge.append(rh.Line(pt0_Node - vc0_ExtFO, pt0_Node))
+            else:
+                ln1_ExtFOEdge.append(rh.Line(pt0_Node, pt0_Node + vc0_ExtFO))
+        return ln1_ExtFOEdge
+    if str0_Name == "cl1_GlobExtFOEdgeOut":
+        return [System.Drawing.Color.DarkGreen for int0_Node in FD.int1_ExtFONode]
+    if str0_Name == "db1_GlobExtFOEdgeOut":
+        return [math.sqrt(FD.db1_ExtFOVector[3*k]**2 + FD.db1_ExtFOVector[3*k+1]**2 + FD.db1_ExtFOVector[3*k+2]**2) for k in xrange(len(FD.int1_ExtFONode))]
+
+    # Nodes and trail edges without the padding nodes and the auxiliary trails
+    if str0_Name == "pt1_NodeOut":
+        return FormDiagramFilter(FormDiagramGet(FD, "pt1_GlobNodeOut"), FD.bl1_NodePadding)
+    if str0_Name == "str1_NodeOut":
+        return FormDiagramFilter(FD.str1_NodeOrder, FD.bl1_NodePadding)
+    if str0_Name == "ln1_TrailEdgeOut":
+        return FormDiagramFilter(FormDiagramGet(FD, "ln1_GlobTrailEdgeOut"), FD.bl1_TrailAuxiliary)
+    if str0_Name == "str1_TrailEdgeOut":
+        return FormDiagramFilter(FD.str1_TrailEdgeID, FD.bl1_TrailAuxiliary)
+    if str0_Name == "cl1_TrailEdgeOut":
+        return FormDiagramFilter(FormDiagramGet(FD, "cl1_GlobTrailEdgeOut"), FD.bl1_TrailAuxiliary)
+    if str0_Name == "db1_TrailEdgeOut":
+        return FormDiagramFilter(FormDiagramGet(FD, "db1_GlobTrailEdgeOut"), FD.bl1_TrailAuxiliary)
+
+    raise AttributeError(str0_Name)
+
+
+### BINARY BUFFER
+# The model serializes to one buffer: the magic bytes, the version and the length of a JSON
+# header (little endian uint32), the header, then the arrays in little endian order, each
+# aligned to 8 bytes. The header lists dtype, length and offset (from the start of the
+# buffer) of every array and holds the ID lists and scalars of the model.
+str0_BufferMagic = b"CEMM"
+int0_BufferVersion = 1
+dc1_BufferType = {"d": "<f8", "i": "<i4", "b": "|i1"}
+str1_BufferArray = ["db1_Position", "int1_Layer", "int1_Edge", "db1_Force", "int1_Sign", "int1_Kind", "int1_ExtFONode", "db1_ExtFOVector", "int1_ExtFOEnd"]
+str1_BufferValue = ["str1_GlobTrailEdgeOut", "str1_GlobDeviation1EdgeOut", "str1_GlobDeviation2EdgeOut", "str1_NodeOrderOut", "int1_NodeOrderOut", "bl1_NodePaddingOut", "bl1_GlobTrailAuxiliaryOut",
+                    "str1_EdgeOut", "int0_SolveCountOut", "db1_VariableOut", "db1_BoundUpOut", "db1_BoundLowOut", "str0_SolverOut", "str0_DivergenceOut",
+                    "str0_ConvergenceOut"]
+
+def BufferBytes(xx1_Array):
+    if sys.byteorder == "big":
+        xx1_Array = array.array(xx1_Array.typecode, xx1_Array)
+        xx1_Array.byteswap()
+    return xx1_Array.tobytes() if hasattr(xx1_Array, "tobytes") else xx1_Array.tostring()
+
+def ModelToBytes(M):
+    FD = M.FD
+    dc1_Value = {"int0_TrailNumber": FD.int0_TrailNumber, "int0_NodeCount": FD.int0_NodeCount, "int1_DevEdgeInputID": list(FD.int1_DevEdgeInputID)}
+    for str0_Name in str1_BufferValue:
+        if hasattr(M, str0_Name):
+            dc1_Value[str0_Name] = list(getattr(M, str0_Name)) if isinstance(getattr(M, str0_Name), (list, tuple)) else getattr(M, str0_Name)
+    
+    # The offsets depend on the length of the header, which contains them
+    xx2_Array = [[str0_Name, dc1_BufferType[getattr(FD, str0_Name).typecode], len(getattr(FD, str0_Name)), 0] for str0_Name in str1_BufferArray]
+    str0_Header = ""
+    int0_Start = -1
+    while int0_Start != len(str0_Header):
+        int0_Start = len(str0_Header)
+        int0_Offset = (12 + int0_Start + 7) // 8 * 8
+        for xx1_Array in xx2_Array:
+            xx1_Array[3] = int0_Offset
+            int0_Offset += (xx1_Array[2]*getattr(FD, xx1_Array[0]).itemsize + 7) // 8 * 8
+        str0_Header = json.dumps({"arrays": xx2_Array, "values": dc1_Value}, sort_keys = True)
+        
+    xx1_Buffer = [str0_BufferMagic, struct.pack("<II", int0_BufferVersion, len(str0_Header)), str0_Header.encode("utf-8")]
+    int0_Length = 12 + len(str0_Header)
+    for xx1_Array in xx2_Array:
+        xx1_Buffer.append(b"\x00"*(xx1_Array[3] - int0_Length))
+        xx0_Bytes = BufferBytes(getattr(FD, xx1_Array[0]))
+        xx1_Buffer.append(xx0_Bytes)
+        int0_Length = xx1_Array[3] + len(xx0_Bytes)
+    return b"".join(xx1_Buffer)
+
+# Model with the arrays and IDs of a buffer, its outputs are built from them as after a solve
+def ModelFromBytes(xx0_Buffer):
+    if xx0_Buffer[:4] != str0_BufferMagic:
+        raise ValueError("The buffer does not contain a structural model")
+    int0_Version, int0_Header = struct.unpack("<II", xx0_Buffer[4:12])
+    if int0_Version > int0_BufferVersion:
+        raise ValueError("The structural model was written by a newer version (" + str(int0_Version) + ")")
+    dc1_Header = json.loads(xx0_Buffer[12:12+int0_Header].decode("utf-8"))
+    dc1_TypeCode = dict([(v, k) for k, v in dc1_BufferType.items()])
+    
+    FD = formDiagram()
+    for str0_Name, str0_Type, int0_Count, int0_Offset in dc1_Header["arrays"]:
+        xx1_Array = array.array(dc1_TypeCode[str0_Type])
+        xx0_Bytes = xx0_Buffer[int0_Offset:int0_Offset + int0_Count*xx1_Array.itemsize]
+        if hasattr(xx1_Array, "frombytes"):
+            xx1_Array.frombytes(xx0_Bytes)
+        else:
+            xx1_Array.fromstring(xx0_Bytes)
+        if sys.byteorder == "big":
+            xx1_Array.byteswap()
+        setattr(FD, str0_Name, xx1_Array)
+    FD.int1_KindStart = KindStart(FD.int1_Kind)
+    
+    dc1_Value = dc1_Header["values"]
+    M0 = model()
+    for str0_Name in str1_BufferValue:
+        if str0_Name in dc1_Value:
+            setattr(M0, str0_Name, dc1_Value[str0_Name])
+    FD.int0_TrailNumber = dc1_Value["int0_TrailNumber"]
+    FD.int0_NodeCount = dc1_Value["int0_NodeCount"]
+    FD.str1_NodeOrder = dc1_Value["str1_NodeOrderOut"]
+    FD.bl1_NodePadding = dc1_Value["bl1_NodePaddingOut"]
+    FD.str1_TrailEdgeID = dc1_Value["str1_GlobTrailEdgeOut"]
+    FD.bl1_TrailAuxiliary = dc1_Value["bl1_GlobTrailAuxiliaryOut"]
+    FD.str1_Dev1EdgeID = dc1_Value["str1_GlobDeviation1EdgeOut"]
+    FD.str1_Dev2EdgeID = dc1_Value["str1_GlobDeviation2EdgeOut"]
+    FD.int1_DevEdgeInputID = dc1_Value["int1_DevEdgeInputID"]
+    FD.dc1_Output = {}
+    M0.FD = FD
+    return M0
+
+
 ### EQUILIBRIUM FUNCTION
-def Equilibrium(db1_StructuralBehaviour, xx1_Bracing, pt1_OriginNode, pl1_ConstraintPlane):
+def Equilibrium(xx1_Bracing, pt1_OriginNode, pl1_ConstraintPlane):
     
     global int0_Counter     # global counter
     
@@ -300,47 +883,7 @@ def Equilibrium(db1_StructuralBehaviour, xx1_Bracing, pt1_OriginNode, pl1_Constr
             for i in xrange(int0_TrailNumber):
                 vc1_TrailForceIn.append(-vc2_GlobTrailForce[g-1][i])
     
-        # Extract Deviation Matrix
-        db2_DevForceMag = []
-
-        for i in range(g * int0_TrailNumber, (g + 1) * int0_TrailNumber):
-            db1_DevForceMag = []
-            for j in range(3, int0_TrailNumber + 3):
-                db1_DevForceMag.append(db2_StructuralBehaviour[i][j])
-            db2_DevForceMag.append(db1_DevForceMag)
-    
     
-        ### LAYER DEVELOPMENT
-        
-        ## Initialize Layer
-        
-        
-        # Create Deviation Length and Unit Vector Matrix
-        vc2_DevLengthVector = []
-        vc2_DevUnitVector = []
-        db2_DevLengthVector = []
-        
-        vc2_DevLengthVector = [ [rh.Vector3d(0.0,0.0,0.0) for i in xrange(int0_TrailNumber)] for i in xrange(int0_TrailNumber)]
-        vc2_DevUnitVector = [ [rh.Vector3d(0.0,0.0,0.0) for i in xrange(int0_TrailNumber)] for i in xrange(int0_TrailNumber)]
-        db2_DevLengthVector = [ [0.0 for i in xrange(int0_TrailNumber)] for i in xrange(int0_TrailNumber)]
-        
-        for i in xrange(int0_TrailNumber):
-            for j in xrange(int0_TrailNumber):
-                if abs(db2_DevForceMag[i][j]) > db0_Threshold:
-                    vc0_InputNode_j = rh.Vector3d(pt1_InputNode[j])
-                    vc0_InputNode_i = rh.Vector3d(pt1_InputNode[i])
-                    vc0_DevLengthVector = vc0_InputNode_j - vc0_InputNode_i
-                    vc2_DevLengthVector[i][j] = vc0_DevLengthVector
-                    vc2_DevLengthVector[j][i] = -vc0_DevLengthVector
-                    db0_DevLengthVector = vc0_DevLengthVector.Length
-                    db2_DevLengthVector[i][j] = db0_DevLengthVector
-                    db2_DevLengthVector[j][i] = db0_DevLengthVector
-                    vc0_DevUnitVector = rh.Vector3d(vc0_DevLengthVector.X/db0_DevLengthVector, vc0_DevLengthVector.Y/db0_DevLengthVector, vc0_DevLengthVector.Z/db0_DevLengthVector)
-                    vc2_DevUnitVector[i][j] = vc0_DevUnitVector
-                    vc2_DevUnitVector[j][i] = -vc0_DevUnitVector
-        
-        
-        
         ### MAIN FUNCTION
         
         # Create List of External Forces
@@ -349,56 +892,24 @@ def Equilibrium(db1_StructuralBehaviour, xx1_Bracing, pt1_OriginNode, pl1_Constr
         db1_ExtForceY = []
         db1_ExtForceZ = []
         
-        # list for external forces only
-        db1_ExtFOX = []
-        db1_ExtFOY = []
-        db1_ExtFOZ = []
-        
         # Add External Forces from Matrix    
         for i in xrange(g*int0_TrailNumber,(g+1)*int0_TrailNumber):
-            db1_ExtFOX.append(db2_StructuralBehaviour[i][0])
-            db1_ExtFOY.append(db2_StructuralBehaviour[i][1])
-            db1_ExtFOZ.append(db2_StructuralBehaviour[i][2])
-            
-        for i in xrange(g*int0_TrailNumber,(g+1)*int0_TrailNumber):
-            db1_ExtForceX.append(db2_StructuralBehaviour[i][0])
-            db1_ExtForceY.append(db2_StructuralBehaviour[i][1])
-            db1_ExtForceZ.append(db2_StructuralBehaviour[i][2])
+            db1_ExtForceX.append(db2_Load[i][0])
+            db1_ExtForceY.append(db2_Load[i][1])
+            db1_ExtForceZ.append(db2_Load[i][2])
             
             # Add Magnitudes of Bracing Forces as External Forces
-            # Start node of bracing
-            if len(xx1_Bracing) > 0:
-                if int0_Counter != 0:
-                    for j in xrange(0,len(xx1_Bracing),3):
-                        int0_BracingFromLayerIndex = int(xx1_Bracing[j]) // int0_TrailNumber
-                        if i == int(xx1_Bracing[j]):
-                            pt0_BracingFrom = pt2_GlobNodeIteration[g][i-g*int0_TrailNumber]
-                            int0_BracingToLayerIndex = int(xx1_Bracing[j+1]) // int0_TrailNumber
-                            int0_BracingToTrailIndex = int(xx1_Bracing[j+1]) % int0_TrailNumber
-                            pt0_BracingTo = pt2_GlobNodeIteration[int0_BracingToLayerIndex][int0_BracingToTrailIndex]
-                            vc0_ForceA = rh.Vector3d(pt0_BracingTo-pt0_BracingFrom)
-                            rh.Vector3d.Unitize(vc0_ForceA)
-                            vc0_ForceA = float(xx1_Bracing[j+2])*vc0_ForceA
-                            db1_ExtForceX[i-g*int0_TrailNumber] += vc0_ForceA.X
-                            db1_ExtForceY[i-g*int0_TrailNumber] += vc0_ForceA.Y
-                            db1_ExtForceZ[i-g*int0_TrailNumber] += vc0_ForceA.Z
-                        
-            # End node of bracing
-            if len(xx1_Bracing) > 0:
-                if int0_Counter != 0:
-                    for j in xrange(1,len(xx1_Bracing),3):
-                        int0_BracingFromLayerIndex = int(xx1_Bracing[j]) // int0_TrailNumber
-                        if i == int(xx1_Bracing[j]):
-                            pt0_BracingFrom = pt2_GlobNodeIteration[g][i-g*int0_TrailNumber]
-                            int0_BracingToLayerIndex = int(xx1_Bracing[j-1]) // int0_TrailNumber
-                            int0_BracingToTrailIndex = int(xx1_Bracing[j-1]) % int0_TrailNumber
-                            pt0_BracingTo = pt2_GlobNodeIteration[int0_BracingToLayerIndex][int0_BracingToTrailIndex]
-                            vc0_ForceA = rh.Vector3d(pt0_BracingTo-pt0_BracingFrom)
-                            rh.Vector3d.Unitize(vc0_ForceA)
-                            vc0_ForceA = float(xx1_Bracing[j+1])*vc0_ForceA
-                            db1_ExtForceX[i-g*int0_TrailNumber] += vc0_ForceA.X
-                            db1_ExtForceY[i-g*int0_TrailNumber] += vc0_ForceA.Y
-                            db1_ExtForceZ[i-g*int0_TrailNumber] += vc0_ForceA.Z
+            # Start nodes of bracings first, then end nodes
+            if int0_Counter != 0:
+                for int0_Bracing, int0_Other in dc2_BracingStart.get(i, []) + dc2_BracingEnd.get(i, []):
+                    pt0_BracingFrom = pt2_GlobNodeIteration[g][i-g*int0_TrailNumber]
+                    pt0_BracingTo = pt2_GlobNodeIteration[int0_Other // int0_TrailNumber][int0_Other % int0_TrailNumber]
+                    vc0_ForceA = rh.Vector3d(pt0_BracingTo-pt0_BracingFrom)
+                    rh.Vector3d.Unitize(vc0_ForceA)
+                    vc0_ForceA = float(xx1_Bracing[3*int0_Bracing+2])*vc0_ForceA
+                    db1_ExtForceX[i-g*int0_TrailNumber] += vc0_ForceA.X
+                    db1_ExtForceY[i-g*int0_TrailNumber] += vc0_ForceA.Y
+                    db1_ExtForceZ[i-g*int0_TrailNumber] += vc0_ForceA.Z
         
         # Vector sum of external and bracing forces for the equilibrium calculation
         vc1_ExtForce = []
@@ -406,138 +917,37 @@ def Equilibrium(db1_StructuralBehaviour, xx1_Bracing, pt1_OriginNode, pl1_Constr
             vc0_ExtForce = rh.Vector3d(db1_ExtForceX[i],db1_ExtForceY[i],db1_ExtForceZ[i])
             vc1_ExtForce.append(vc0_ExtForce)
         
-        # Vector sum of external forces only for visualization
-        vc1_ExtFO = []
-        for i in xrange(int0_TrailNumber):
-            vc0_ExtFO = rh.Vector3d(db1_ExtFOX[i],db1_ExtFOY[i],db1_ExtFOZ[i])
-            vc1_ExtFO.append(vc0_ExtFO)
-        
-        # Add External Forces to the Form Diagram
-        ln1_ExtFOEdge = []
-        cl1_ExtFOEdge = []
-        db1_ExtFOEdge = []
-        
-        for i in xrange(len(vc1_ExtFO)):
-            ln1_ExtFOEdge.append(rh.Line(pt1_InputNode[i],(pt1_InputNode[i] + vc1_ExtFO[i])))
-            cl1_ExtFOEdge.append(System.Drawing.Color.DarkGreen)
-            db1_ExtFOEdge.append(abs(vc1_ExtFO[i].Length))
-        
-        # Extract Deviation Matrix
-        db2_DevForceMag = []
-        
-        for i in xrange(g*int0_TrailNumber,(g+1)*int0_TrailNumber):
-            db1_DevForceMag = []
-            for j in xrange(3,int0_TrailNumber+3):
-                db1_DevForceMag.append(db2_StructuralBehaviour[i][j])
-            db2_DevForceMag.append(db1_DevForceMag)
-        
-        
         # Create Trail Length and Static Action Matrix from Input Origin Points
         db1_TrailLength = []
         db1_TrailStatAct = []
         
         for i in xrange(g*int0_TrailNumber,(g+1)*int0_TrailNumber):
-            db1_TrailLength.append(db2_StructuralBehaviour[i][int0_TrailNumber+3])
+            db1_TrailLength.append(db1_RowTrailLength[i])
             if g == 0:
                 db1_TrailStatAct.append(0)
             else:
-                db1_TrailStatAct.append(abs((db2_StructuralBehaviour[i-int0_TrailNumber][int0_TrailNumber+3]*vc1_TrailForceIn[i-g*int0_TrailNumber]).Length))
+                db1_TrailStatAct.append(abs((db1_RowTrailLength[i-int0_TrailNumber]*vc1_TrailForceIn[i-g*int0_TrailNumber]).Length))
         
-        # Calculate Hadamard Product of Deviation Length Matrix and Deviation Matrix
-        vc2_DevForce = []
-        db2_DevStatAct = []
-        
-        for i in xrange(int0_TrailNumber):
-            vc1_DevForce = []
-            db1_DevStatAct = []
-            for j in xrange(int0_TrailNumber):
-                vc0_DevForce = vc2_DevUnitVector[i][j]*db2_DevForceMag[i][j]
-                db0_DevStatAct = abs(db2_DevLengthVector[i][j]*db2_DevForceMag[i][j])
-                vc1_DevForce.append(vc0_DevForce)
-                db1_DevStatAct.append(db0_DevStatAct)
-            vc2_DevForce.append(vc1_DevForce)
-            db2_DevStatAct.append(db1_DevStatAct)
-
-        
-        # Sum Deviation Vectors and Static Action per each Node
-        vc1_DevForceSum = []
-        db1_DevStatActSum = []
+        # Deviation Resultant and Static Action per each Node
         db1_IndDevStatActSum = []
+        vc1_DevForceSum, db1_DevStatActSum = LayerDeviation(pt1_InputNode, g)
         
-        for i in xrange(int0_TrailNumber):
-            vc0_DevForceSum = rh.Vector3d(0,0,0)
-            db0_DevStatActSum = 0
-            for j in xrange(int0_TrailNumber):
-                vc0_DevForceSum += vc2_DevForce[i][j]
-                db0_DevStatActSum += db2_DevStatAct[i][j]
-            vc1_DevForceSum.append(vc0_DevForceSum)
-            db1_DevStatActSum.append(db0_DevStatActSum)
         # Get Static Action per Node for Indirect Deviations
-        # Start Node of Inderect Deviations
         if specWeight and yieldStress and len(xx1_Bracing) > 0:
-            int1_StartBracingIndex = []
-            int1_EndBracingIndex = []
-            db1_BracingValue = []
-            for i in xrange(0,len(xx1_Bracing),3):
-                int1_StartBracingIndex.append(int(xx1_Bracing[i]))
-                int1_EndBracingIndex.append(int(xx1_Bracing[i+1]))
-                db1_BracingValue.append(float(xx1_Bracing[i+2]))
             for i in xrange(int0_TrailNumber):
                 if int0_Counter != 0:
-                    int1_StartBracingIndex_C = int1_StartBracingIndex[:]
-                    int1_EndBracingIndex_C = int1_EndBracingIndex[:]
-                    db1_BracingValue_C = db1_BracingValue[:]
+                    pt0_Node = pt2_GlobNodeIteration[g][i]
+                    # Start Node of Indirect Deviations
                     db0_IndDevStatActSum = 0
-                    for j in int1_StartBracingIndex:
-                        if g*int0_TrailNumber + i == j:
-                            int0_StartBracingIndex = int1_StartBracingIndex_C.index(g*int0_TrailNumber + i)
-                            int0_StartBracingGlobIndex = g*int0_TrailNumber + i
-                            int0_EndBracingGlobIndex = int1_EndBracingIndex_C[ int0_StartBracingIndex ]
-                            db0_ValueBracingGlobIndex = db1_BracingValue_C[ int0_StartBracingIndex ]
-                            int1_StartBracingIndex_C.pop( int0_StartBracingIndex )
-                            int1_EndBracingIndex_C.pop( int0_StartBracingIndex )
-                            db1_BracingValue_C.pop( int0_StartBracingIndex )
-                            # Get Start and End Nodes of Bracing
-                            int0_StartBracingLayer = g
-                            int0_StartBracingTrail = i
-                            int0_EndBracingLayer = int0_EndBracingGlobIndex // int0_TrailNumber
-                            int0_EndBracingTrail = int0_EndBracingGlobIndex % int0_TrailNumber
-                            pt0_StartBracing = pt2_GlobNodeIteration[int0_StartBracingLayer][int0_StartBracingTrail]
-                            pt0_EndBracing = pt2_GlobNodeIteration[int0_EndBracingLayer][int0_EndBracingTrail]
-                            db0_IndDevStatActSum += abs(db0_ValueBracingGlobIndex*pt0_StartBracing.DistanceTo(pt0_EndBracing))
+                    for int0_Bracing, int0_Other in dc2_BracingStart.get(g*int0_TrailNumber + i, []):
+                        pt0_EndBracing = pt2_GlobNodeIteration[int0_Other // int0_TrailNumber][int0_Other % int0_TrailNumber]
+                        db0_IndDevStatActSum += abs(float(xx1_Bracing[3*int0_Bracing+2])*pt0_Node.DistanceTo(pt0_EndBracing))
                     db1_IndDevStatActSum.append(db0_IndDevStatActSum)
-                        
-            # End Node of Inderect Deviations
-            int1_StartBracingIndex = []
-            int1_EndBracingIndex = []
-            db1_BracingValue = []
-            for i in xrange(1,len(xx1_Bracing),3):
-                int1_StartBracingIndex.append(int(xx1_Bracing[i-1]))
-                int1_EndBracingIndex.append(int(xx1_Bracing[i]))
-                db1_BracingValue.append(float(xx1_Bracing[i+1]))
-            for i in xrange(int0_TrailNumber):
-                if int0_Counter != 0:
-                    int1_StartBracingIndex_C = int1_StartBracingIndex[:]
-                    int1_EndBracingIndex_C = int1_EndBracingIndex[:]
-                    db1_BracingValue_C = db1_BracingValue[:]
+                    # End Node of Indirect Deviations
                     db0_IndDevStatActSum = 0
-                    for j in int1_EndBracingIndex:
-                        if g*int0_TrailNumber + i == j:
-                            int0_EndBracingIndex = int1_EndBracingIndex_C.index(g*int0_TrailNumber + i)
-                            int0_EndBracingGlobIndex = g*int0_TrailNumber + i
-                            int0_StartBracingGlobIndex = int1_StartBracingIndex_C[ int0_EndBracingIndex ]
-                            db0_ValueBracingGlobIndex = db1_BracingValue_C[ int0_EndBracingIndex ]
-                            int1_StartBracingIndex_C.pop( int0_EndBracingIndex )
-                            int1_EndBracingIndex_C.pop( int0_EndBracingIndex )
-                            db1_BracingValue_C.pop( int0_EndBracingIndex )
-                            # Get Start and End Nodes of Bracing
-                            int0_EndBracingLayer = g
-                            int0_EndBracingTrail = i
-                            int0_StartBracingLayer = int0_StartBracingGlobIndex // int0_TrailNumber
-                            int0_StartBracingTrail = int0_StartBracingGlobIndex % int0_TrailNumber
-                            pt0_StartBracing = pt2_GlobNodeIteration[int0_StartBracingLayer][int0_StartBracingTrail]
-                            pt0_EndBracing = pt2_GlobNodeIteration[int0_EndBracingLayer][int0_EndBracingTrail]
-                            db0_IndDevStatActSum += abs(db0_ValueBracingGlobIndex*pt0_StartBracing.DistanceTo(pt0_EndBracing))
+                    for int0_Bracing, int0_Other in dc2_BracingEnd.get(g*int0_TrailNumber + i, []):
+                        pt0_StartBracing = pt2_GlobNodeIteration[int0_Other // int0_TrailNumber][int0_Other % int0_TrailNumber]
+                        db0_IndDevStatActSum += abs(float(xx1_Bracing[3*int0_Bracing+2])*pt0_StartBracing.DistanceTo(pt0_Node))
                     db1_IndDevStatActSum[i] += db0_IndDevStatActSum
         else:
             db1_IndDevStatActSum = [0.0 for i in range(int0_TrailNumber)]
@@ -565,13 +975,6 @@ def Equilibrium(db1_StructuralBehaviour, xx1_Bracing, pt1_OriginNode, pl1_Constr
                     vc0_TrailForceOut = -(vc1_ExtForce[i] + vc1_DevForceSum[i] + vc1_TrailForceIn[i])
                     vc1_TrailForceOut.append(vc0_TrailForceOut)
                 
-
-        # Add Self Weight to the Form Diagram
-        # external force plus self-weight
-        for i in xrange(len(vc1_SelfWeight)):
-            ln1_ExtFOEdge.append(rh.Line(pt1_InputNode[i],(pt1_InputNode[i] + vc1_SelfWeight[i])))
-            cl1_ExtFOEdge.append(System.Drawing.Color.DarkGreen)
-            db1_ExtFOEdge.append(abs(vc1_SelfWeight[i].Length))
         
         
         ## Construction Form Diagram
@@ -590,85 +993,40 @@ def Equilibrium(db1_StructuralBehaviour, xx1_Bracing, pt1_OriginNode, pl1_Constr
             # Modify result in case of constraint planes
             if pl1_ConstraintPlane:
                 if g != int0_LayerCount-1:
-                    for j in xrange(len(id_NodePlane)):
-                        if str(str1_NodeOrderC[((g+1)*int0_TrailNumber)+i]) == str(id_NodePlane[j]):
-                            pl0_PlaneTrailOut = pl1_ConstraintPlane[j]
-                            if pl0_PlaneTrailOut is not None:
-                                xx1_Intersect = rh.Intersect.Intersection.LinePlane(ln0_TrailOut,pl0_PlaneTrailOut)
-                                bl0_Intersect = xx1_Intersect[0]
-                                db0_Intersect = xx1_Intersect[1]
-                                if abs(db0_Intersect) < abs(db0_Threshold):
-                                    db1_TrailLength[i] = 0.0
-                                    pt0_Node = pt1_InputNode[i]
-                                if bl0_Intersect and abs(db0_Intersect) > abs(db0_Threshold):
-                                    pt0_Node = ln0_TrailOut.PointAt(db0_Intersect)
-                                    db1_TrailLength[i] = pt1_InputNode[i].DistanceTo(pt0_Node)*db0_Intersect/abs(db0_Intersect)
+                    for j in int2_RowPlane[((g+1)*int0_TrailNumber)+i]:
+                        pl0_PlaneTrailOut = pl1_ConstraintPlane[j]
+                        if pl0_PlaneTrailOut is not None:
+                            xx1_Intersect = rh.Intersect.Intersection.LinePlane(ln0_TrailOut,pl0_PlaneTrailOut)
+                            bl0_Intersect = xx1_Intersect[0]
+                            db0_Intersect = xx1_Intersect[1]
+                            if abs(db0_Intersect) < abs(db0_Threshold):
+                                db1_TrailLength[i] = 0.0
+                                pt0_Node = pt1_InputNode[i]
+                            if bl0_Intersect and abs(db0_Intersect) > abs(db0_Threshold):
+                                pt0_Node = ln0_TrailOut.PointAt(db0_Intersect)
+                                db1_TrailLength[i] = pt1_InputNode[i].DistanceTo(pt0_Node)*db0_Intersect/abs(db0_Intersect)
                     pt1_Node[len(pt1_Node)-1] = pt0_Node
         
-        # Build Trail Edges
-        ln1_TrailEdge = []
-        cl1_TrailEdge = []
-        db1_TrailEdge = []
+        # Signs of the Trail Edges (tension, compression or zero length)
+        int1_TrailSign = []
         
-        for i in xrange(int0_TrailNumber):
-            ln0_TrailEdge = rh.Line(pt1_InputNode[i],pt1_Node[i])
-            ln1_TrailEdge.append(ln0_TrailEdge)
-            if db1_TrailLength[i] > 0.0:
-                cl1_TrailEdge.append(System.Drawing.Color.Red)
-                db1_TrailEdge.append(vc1_TrailForceOut[i].Length)
-            elif db1_TrailLength[i] < 0.0:
-                cl1_TrailEdge.append(System.Drawing.Color.Blue)
-                db1_TrailEdge.append(-vc1_TrailForceOut[i].Length)
-            else:
-                cl1_TrailEdge.append(System.Drawing.Color.Black)
-                db1_TrailEdge.append(0.0)
-            #db1_TrailEdge.append(abs(vc1_TrailForceOut[i].Length))
-
-
-        # Build Deviation Edges
-        ln1_Deviation1Edge = []
-        cl1_Deviation1Edge = []
-        db1_Deviation1Edge = []
-        k = 3
-        
-        for i in xrange(g*int0_TrailNumber,(g+1)*int0_TrailNumber):
-            k += 1
-            for j in xrange(k,int0_TrailNumber+3):
-                if db2_StructuralBehaviour[i][j] != 0:
-                    ln0_Deviation1Edge = rh.Line(pt1_InputNode[i % int0_TrailNumber],pt1_InputNode[j-3])
-                    ln1_Deviation1Edge.append(ln0_Deviation1Edge)
-                    if db2_StructuralBehaviour[i][j] > 0.0:
-                        cl1_Deviation1Edge.append(System.Drawing.Color.Red)
-                    else:
-                        cl1_Deviation1Edge.append(System.Drawing.Color.Blue)
-                    #db1_Deviation1Edge.append(abs(db2_StructuralBehaviour[i][j]))
-                    db1_Deviation1Edge.append(db2_StructuralBehaviour[i][j])
+        if not bl0_Lean:
+            for i in xrange(int0_TrailNumber):
+                if db1_TrailLength[i] > 0.0:
+                    int1_TrailSign.append(1)
+                elif db1_TrailLength[i] < 0.0:
+                    int1_TrailSign.append(-1)
+                else:
+                    int1_TrailSign.append(0)
         vc2_GlobTrailForce.append(vc1_TrailForceOut)
 
 
-        # Form Diagram
-        ln2_GlobTrailEdge.append(ln1_TrailEdge)
-        db2_GlobTrailEdge.append(db1_TrailEdge)
-        cl2_GlobTrailEdge.append(cl1_TrailEdge)
-        ln2_GlobDeviation1Edge.append(ln1_Deviation1Edge)
-        cl2_GlobDeviation1Edge.append(cl1_Deviation1Edge)
-        db2_GlobDeviation1Edge.append(db1_Deviation1Edge)
-        ln2_GlobExtFOEdge.append(ln1_ExtFOEdge)
-        cl2_GlobExtFOEdge.append(cl1_ExtFOEdge)
-        db2_GlobExtFOEdge.append(db1_ExtFOEdge)
+        # Form Diagram (the lines and colours are built from these by FormDiagram())
+        int2_GlobTrailSign.append(int1_TrailSign)
+        vc2_GlobSelfWeight.append(vc1_SelfWeight)
         pt2_GlobNode.append(pt1_Node)
 
         g += 1
-    
-    # Add Reactions to Form Diagram
-    for i in xrange(len(vc2_GlobTrailForce[g-1])):
-        if cl2_GlobTrailEdge[g-1][i] != System.Drawing.Color.Blue:
-            ln1_ExtFOEdge.append(rh.Line(pt2_GlobNode[g-1][i],(pt2_GlobNode[g-1][i] + vc2_GlobTrailForce[g-1][i])))
-            db1_ExtFOEdge.append(abs(ln1_ExtFOEdge[len(ln1_ExtFOEdge)-1].Length))
-        else:
-            ln1_ExtFOEdge.append(rh.Line((pt2_GlobNode[g-1][i] - vc2_GlobTrailForce[g-1][i]),pt2_GlobNode[g-1][i]))
-            db1_ExtFOEdge.append(abs(ln1_ExtFOEdge[len(ln1_ExtFOEdge)-1].Length))
-        cl1_ExtFOEdge.append(System.Drawing.Color.DarkGreen)
         
     # Update Counter
     int0_Counter += 1
@@ -677,32 +1035,213 @@ def Equilibrium(db1_StructuralBehaviour, xx1_Bracing, pt1_OriginNode, pl1_Constr
     return
 
 
+### FIXED POINT ACCELERATION
+# The sub-iterations for the indirect deviations are a fixed point iteration x = G(x) over the
+# stacked node positions of all layers (G is one sweep of Equilibrium with the bracing
+# directions taken from x). Anderson mixing over the last int0_AndersonDepth iterates replaces
+# the plain update, Aitken relaxation is used when the least squares problem is singular.
+# With bl0_Anderson = False or int0_AndersonDepth = 0 the plain sub-iterations are used.
+bl0_Anderson = True
+int0_AndersonDepth = 5
+
+class fixedPoint(object):
+    pass
+
+def FixedPointStart():
+    A = fixedPoint()
+    A.db2_X = []
+    A.db2_G = []
+    A.db2_F = []
+    A.db1_Residual = []
+    A.db0_Omega = 1.0
+    return A
+
+def FixedPointStep(A, db1_X, db1_G):
+    if not bl0_Anderson:
+        return db1_G[:]
+    int0_Size = len(db1_X)
+    db1_F = [db1_G[k] - db1_X[k] for k in xrange(int0_Size)]
+    A.db2_X.append(db1_X)
+    A.db2_G.append(db1_G)
+    A.db2_F.append(db1_F)
+    if len(A.db2_X) > int0_AndersonDepth + 1:
+        A.db2_X.pop(0)
+        A.db2_G.pop(0)
+        A.db2_F.pop(0)
+    int0_M = len(A.db2_F) - 1
+    if int0_M == 0:
+        return db1_G[:]
+    
+    # Anderson mixing: minimize |f_k - dF gamma| and take g_k - dG gamma
+    db1_XNext = None
+    db2_DF = [[A.db2_F[j+1][k] - A.db2_F[j][k] for k in xrange(int0_Size)] for j in xrange(int0_M)]
+    db2_DG = [[A.db2_G[j+1][k] - A.db2_G[j][k] for k in xrange(int0_Size)] for j in xrange(int0_M)]
+    db2_A = [[sum([db2_DF[i][k]*db2_DF[j][k] for k in xrange(int0_Size)]) for j in xrange(int0_M)] for i in xrange(int0_M)]
+    db1_B = [sum([db2_DF[i][k]*db1_F[k] for k in xrange(int0_Size)]) for i in xrange(int0_M)]
+    db1_Gamma = SolveLinear(db2_A, db1_B)
+    if db1_Gamma is not None:
+        db1_XNext = db1_G[:]
+        for j in xrange(int0_M):
+            for k in xrange(int0_Size):
+                db1_XNext[k] -= db1_Gamma[j]*db2_DG[j][k]
+    
+    # Aitken relaxation of the last two residuals
+    if db1_XNext is None:
+        db1_FPrev = A.db2_F[-2]
+        db1_DF = [db1_F[k] - db1_FPrev[k] for k in xrange(int0_Size)]
+        db0_DF = sum([db0_Value*db0_Value for db0_Value in db1_DF])
+        if db0_DF > 0:
+            A.db0_Omega = -A.db0_Omega*sum([db1_FPrev[k]*db1_DF[k] for k in xrange(int0_Size)])/db0_DF
+        db1_XNext = [db1_X[k] + A.db0_Omega*db1_F[k] for k in xrange(int0_Size)]
+    return db1_XNext
+
+# Divergence of a sub-iteration, the distance of the new node positions db1_G from the positions
+# db1_X of the previous one summed over the nodes of the last layer (as the divergence was always
+# measured), and the positions for the next sub-iteration (None once the divergence is below the
+# threshold or at the last sub-iteration)
+def SubIteration(A, db1_X, db1_G, int0_TrailNumber, int0_Counter, int0_CounterBracing, db0_Threshold):
+    db0_Divergence = 0.0
+    for k in xrange(len(db1_X) - 3*int0_TrailNumber, len(db1_X), 3):
+        db0_Divergence += math.sqrt((db1_G[k]-db1_X[k])**2 + (db1_G[k+1]-db1_X[k+1])**2 + (db1_G[k+2]-db1_X[k+2])**2)
+    A.db1_Residual.append(db0_Divergence)
+    if int0_Counter < int0_CounterBracing and db0_Divergence > db0_Threshold:
+        return db0_Divergence, FixedPointStep(A, db1_X, db1_G)
+    return db0_Divergence, None
+
+# Mean reduction of the divergence per sub-iteration
+def FixedPointRate(A):
+    db1_Residual = A.db1_Residual
+    if len(db1_Residual) < 2 or db1_Residual[0] == 0:
+        return None
+    return (db1_Residual[-1]/db1_Residual[0])**(1.0/(len(db1_Residual) - 1))
+
+
+### NEWTON SOLVER
+# Alternative to the sub-iterations: the indirect deviations are solved as the nonlinear
+# system H(y) - y = 0, where y are the positions of the nodes at the ends of the bracings
+# (the only positions a sweep reads from the previous sub-iteration) and H is one sweep.
+# The Jacobian is taken by forward differences over y, the step is damped by backtracking.
+# Switched on by the "newton" setting of the optimization set-up.
+bl0_Newton = bool(O and getattr(O, "newton", False))
+int0_NewtonIteration = 20
+
+def NewtonResidual(C, S, db3_NodePrev, xx1_BracingNode, db1_Y):
+    db3_Node = [db3_NodePrev[0]] + [db2_Node[:] for db2_Node in db3_NodePrev[1:]]
+    for k in xrange(len(xx1_BracingNode)):
+        int0_Layer, int0_Trail = xx1_BracingNode[k]
+        db3_Node[int0_Layer][int0_Trail] = db1_Y[3*k:3*k+3]
+    xx1_Layer = AdjointForward(C, S, db3_Node, C.dc2_BracingNode)
+    db1_R = []
+    for k in xrange(len(xx1_BracingNode)):
+        int0_Layer, int0_Trail = xx1_BracingNode[k]
+        db1_Q = xx1_Layer[int0_Layer-1].db2_NodeOut[int0_Trail]
+        db1_R.extend([db1_Q[0] - db1_Y[3*k], db1_Q[1] - db1_Y[3*k+1], db1_Q[2] - db1_Y[3*k+2]])
+    return db1_R, xx1_Layer
+
+def NewtonBracing(C, S):
+    int0_N = C.int0_TrailNumber
+    
+    # Unknowns: bracing nodes that are not origin nodes
+    xx1_BracingNode = []
+    for int2_Row in C.int2_BracingRow:
+        for int0_Row in int2_Row:
+            xx0_Node = (int0_Row // int0_N, int0_Row % int0_N)
+            if xx0_Node[0] > 0 and xx0_Node not in xx1_BracingNode:
+                xx1_BracingNode.append(xx0_Node)
+    
+    # Start from the sweep without indirect deviations
+    xx1_Layer = AdjointForward(C, S, [S.db2_Origin], {})
+    db3_NodePrev = [S.db2_Origin] + [AL.db2_NodeOut for AL in xx1_Layer]
+    if len(xx1_BracingNode) == 0:
+        return db3_NodePrev, 0
+    db1_Y = []
+    for int0_Layer, int0_Trail in xx1_BracingNode:
+        db1_Y.extend(db3_NodePrev[int0_Layer][int0_Trail])
+    db1_R, xx1_Layer = NewtonResidual(C, S, db3_NodePrev, xx1_BracingNode, db1_Y)
+    db0_R = math.sqrt(sum([db0_Value*db0_Value for db0_Value in db1_R]))
+    
+    for int0_Iteration in xrange(int0_NewtonIteration):
+        if db0_R < C.db0_Threshold*1e-3:
+            break
+        
+        # Jacobian of the residual by forward differences
+        int0_Size = len(db1_Y)
+        db2_J = [[0.0]*int0_Size for i in xrange(int0_Size)]
+        for j in xrange(int0_Size):
+            db0_H = 1e-7*max(1.0, abs(db1_Y[j]))
+            db1_YH = db1_Y[:]
+            db1_YH[j] += db0_H
+            db1_RH = NewtonResidual(C, S, db3_NodePrev, xx1_BracingNode, db1_YH)[0]
+            for i in xrange(int0_Size):
+                db2_J[i][j] = (db1_RH[i] - db1_R[i])/db0_H
+        db1_Step = SolveLinear(db2_J, [-db0_Value for db0_Value in db1_R])
+        if db1_Step is None:
+            return None, int0_Iteration
+        
+        # Backtracking line search on the norm of the residual
+        db0_Alpha = 1.0
+        for int0_Search in xrange(10):
+            db1_YNew = [db1_Y[k] + db0_Alpha*db1_Step[k] for k in xrange(int0_Size)]
+            db1_RNew, xx1_LayerNew = NewtonResidual(C, S, db3_NodePrev, xx1_BracingNode, db1_YNew)
+            db0_RNew = math.sqrt(sum([db0_Value*db0_Value for db0_Value in db1_RNew]))
+            if db0_RNew <= (1 - 1e-4*db0_Alpha)*db0_R:
+                break
+            db0_Alpha /= 2
+        else:
+            return None, int0_Iteration
+        db1_Y, db1_R, db0_R, xx1_Layer = db1_YNew, db1_RNew, db0_RNew, xx1_LayerNew
+    
+    # Positions of the previous sub-iteration for the final sweep
+    db3_NodePrev = [S.db2_Origin] + [AL.db2_NodeOut[:] for AL in xx1_Layer]
+    for k in xrange(len(xx1_BracingNode)):
+        int0_Layer, int0_Trail = xx1_BracingNode[k]
+        db3_NodePrev[int0_Layer][int0_Trail] = db1_Y[3*k:3*k+3]
+    return db3_NodePrev, int0_Iteration
+
+
+### VARIABLES
+# Write the variables of the optimization into the deviations (both entries of a direct deviation),
+# the trail lengths of the rows and the bracings, return the origin nodes
+def ApplyVariables(db1_Variable, db1_Deviation, db1_TrailLength, xx1_BracingVar, pt1_OriginNode):
+    pt1_OriginNodeMod = [pt0_OriginNode for pt0_OriginNode in pt1_OriginNode]
+    if len(db1_Variable) > 0:
+        int0_CountVar = 0
+        
+        for int0_Position, int0_Transpose in int2_Deviation1Position:
+            db1_Deviation[int0_Position] = db1_Variable[int0_CountVar]
+            if int0_Transpose >= 0:
+                db1_Deviation[int0_Transpose] = db1_Variable[int0_CountVar]
+            int0_CountVar += 1
+        for i in range(len(int2_TrailEdge)):
+            db1_TrailLength[int2_TrailEdge[i][0]] = db1_Variable[int0_CountVar]
+            int0_CountVar += 1
+        for i in range(2,len(xx1_BracingVar),3):
+            xx1_BracingVar[i] = db1_Variable[int0_CountVar]
+            int0_CountVar += 1
+        for i in range(len(pt1_OriginNode)):
+            pt1_OriginNodeMod[i] = rh.Point3d(db1_Variable[int0_CountVar], pt1_OriginNode[i].Y, pt1_OriginNode[i].Z)
+            int0_CountVar += 1
+        for i in range(len(pt1_OriginNode)):
+            pt1_OriginNodeMod[i] = rh.Point3d(pt1_OriginNodeMod[i].X, db1_Variable[int0_CountVar], pt1_OriginNode[i].Z)
+            int0_CountVar += 1
+        for i in range(len(pt1_OriginNode)):
+            pt1_OriginNodeMod[i] = rh.Point3d(pt1_OriginNodeMod[i].X, pt1_OriginNodeMod[i].Y, db1_Variable[int0_CountVar])
+            int0_CountVar += 1
+    return pt1_OriginNodeMod
+
+
 ### MAIN FUNCTION
-def Main(db1_StructuralBehaviour, str1_NodeOrderC, xx1_Bracing, pl1_ConstraintPlane, id_NodePlane, pt1_OriginNode, str1_Edge, db0_Divergence, db0_Threshold, int0_CounterBracing, int0_TrailNumber, int0_C, int0_R, db2_StructuralBehaviour, int0_LayerCount, db1_Variable, bl0_Print):
+def Main(str1_NodeOrderC, xx1_Bracing, pl1_ConstraintPlane, id_NodePlane, pt1_OriginNode, str1_Edge, db0_Divergence, db0_Threshold, int0_CounterBracing, int0_TrailNumber, int0_LayerCount, db1_Variable, bl0_Print):
 
     ### GLOBAL VARIABLES
     
+    global int0_Counter
     global pt2_Trails
-    global pt1_GlobNodeOut
-    global ln1_GlobTrailEdgeOut
-    global ln1_GlobDeviation1EdgeOut
-    global ln1_GlobDeviation2EdgeOut
     global vc2_GlobTrailForce
-    global ln2_GlobExtEdge
     global pt2_GlobNode
     global pt2_GlobNodeIteration
-    global ln2_GlobTrailEdge
-    global cl2_GlobTrailEdge
-    global db2_GlobTrailEdge
-    global ln2_GlobDeviation1Edge
-    global cl2_GlobDeviation1Edge
-    global db2_GlobDeviation1Edge
-    global ln2_GlobDeviation2Edge
-    global cl2_GlobDeviation2Edge
-    global db2_GlobDeviation2Edge
-    global ln2_GlobExtFOEdge
-    global cl2_GlobExtFOEdge
-    global db2_GlobExtFOEdge
+    global int2_GlobTrailSign
+    global vc2_GlobSelfWeight
     global int0_CounterOpt 
     global db0_DistanceBest
     global db1_VariableBest
@@ -713,6 +1252,7 @@ def Main(db1_StructuralBehaviour, str1_NodeOrderC, xx1_Bracing, pl1_ConstraintPl
     global str0_GlobSolver
     global str0_GlobDivergence
     global str0_GlobIteration
+    global str0_GlobConvergence
     
     
     if bl0_Print:
@@ -732,25 +1272,13 @@ def Main(db1_StructuralBehaviour, str1_NodeOrderC, xx1_Bracing, pl1_ConstraintPl
     # Re-Inatialize Global Variables
     dbl0_Divergence = 0
     vc2_GlobTrailForce = []
-    ln2_GlobExtEdge = []
     pt2_GlobNode = []
-    ln2_GlobTrailEdge = []
-    cl2_GlobTrailEdge = []
-    db2_GlobTrailEdge = []
-    ln2_GlobDeviation1Edge = []
-    cl2_GlobDeviation1Edge = []
-    db2_GlobDeviation1Edge = []
-    ln2_GlobDeviation2Edge = []
-    cl2_GlobDeviation2Edge = []
-    db2_GlobDeviation2Edge = []
-    ln2_GlobExtFOEdge = []
-    cl2_GlobExtFOEdge = []
-    db2_GlobExtFOEdge = []
+    int2_GlobTrailSign = []
+    vc2_GlobSelfWeight = []
     
     
     # Initial Check
-    int0_StructuralLayersMatrix = int(len(db1_StructuralBehaviour)/(3+len(pt1_OriginNode)+1)/len(pt1_OriginNode))
-    if db1_StructuralBehaviour == None or int0_StructuralLayersMatrix == 0:
+    if int0_LayerCount == 0:
         print(str("Please input Matrix of Structural Behaviour"))
         if len(pt1_OriginNode) == 0:
             print(str("Please input Origin Points"))
@@ -758,42 +1286,28 @@ def Main(db1_StructuralBehaviour, str1_NodeOrderC, xx1_Bracing, pl1_ConstraintPl
         if len(pt1_OriginNode) == 0:
             print(str("Please input Origin Points"))
         else:
-            pt1_OriginNodeMod = [pt0_OriginNode for pt0_OriginNode in pt1_OriginNode]
-            
-            
             # Update Variables for Optimization
-            if len(db1_Variable) > 0:
-                int0_CountVar = 0
-                
-                for i in range(len(int2_Deviation1Edge)):
-                    key1 = int2_Deviation1Edge[i][0] % int0_TrailNumber + 3
-                    key0 = (int2_Deviation1Edge[i][0] // int0_TrailNumber)*int0_TrailNumber + int2_Deviation1Edge[i][1] - 3
-                    db2_StructuralBehaviour[int2_Deviation1Edge[i][0]][int2_Deviation1Edge[i][1]] =  db1_Variable[int0_CountVar]
-                    db2_StructuralBehaviour[key0][key1] = db1_Variable[int0_CountVar]
-                    int0_CountVar += 1
-                for i in range(len(int2_TrailEdge)):
-                    db2_StructuralBehaviour[ int2_TrailEdge[i][0] ][ int2_TrailEdge[i][1]]  =  db1_Variable[int0_CountVar]
-                    int0_CountVar += 1
-                for i in range(2,len(xx1_Bracing),3):
-                    xx1_Bracing[i] = db1_Variable[int0_CountVar]
-                    int0_CountVar += 1
-                for i in range(len(pt1_OriginNode)):
-                    pt1_OriginNodeMod[i] = rh.Point3d(db1_Variable[int0_CountVar], pt1_OriginNode[i].Y, pt1_OriginNode[i].Z)
-                    int0_CountVar += 1
-                for i in range(len(pt1_OriginNode)):
-                    pt1_OriginNodeMod[i] = rh.Point3d(pt1_OriginNodeMod[i].X, db1_Variable[int0_CountVar], pt1_OriginNode[i].Z)
-                    int0_CountVar += 1
-                for i in range(len(pt1_OriginNode)):
-                    pt1_OriginNodeMod[i] = rh.Point3d(pt1_OriginNodeMod[i].X, pt1_OriginNodeMod[i].Y, db1_Variable[int0_CountVar])
-                    int0_CountVar += 1
-
+            pt1_OriginNodeMod = ApplyVariables(db1_Variable, db1_DevValue, db1_RowTrailLength, xx1_Bracing, pt1_OriginNode)
                     
                     
             # Start Iteration
+            A = FixedPointStart()
+            
+            # Converged Positions of the Nodes at the Bracings by Newton's Method
+            if bl0_Newton and len(xx1_Bracing) > 0:
+                db3_NodePrev, int0_NewtonCount = NewtonBracing(SC, SolveState(SC, db1_Variable))
+                if db3_NodePrev is not None:
+                    pt2_GlobNodeIteration[0] = pt1_OriginNodeMod
+                    for j in xrange(1, int0_LayerCount+1):
+                        pt2_GlobNodeIteration[j] = [rh.Point3d(db1_Node[0], db1_Node[1], db1_Node[2]) for db1_Node in db3_NodePrev[j]]
+                    int0_Counter = 1
+                    if bl0_Print:
+                        str0_DescriptionOpt += "\nnewton iterations: " + str(int0_NewtonCount)
+            
             while int0_Counter < int0_CounterBracing and db0_Divergence > db0_Threshold:
                 
                 # Call Main Function
-                Equilibrium(db1_StructuralBehaviour, xx1_Bracing, pt1_OriginNodeMod, pl1_ConstraintPlane)
+                Equilibrium(xx1_Bracing, pt1_OriginNodeMod, pl1_ConstraintPlane)
                 
                 # Store Nodes' Position
                 # Here the original line was:
@@ -801,11 +1315,19 @@ def Main(db1_StructuralBehaviour, str1_NodeOrderC, xx1_Bracing, pl1_ConstraintPl
                 
                 pt2_GlobNodeIteration[0] = pt1_OriginNodeMod
                 
+                # Divergence from the previous Sub-Iteration and accelerated Positions for the next one
+                db1_FixedPointX = None
+                if int0_Counter-1 != 0:
+                    db1_FixedPointX = []
+                    db1_FixedPointG = []
+                    for j in xrange(1,len(pt2_GlobNode)+1):
+                        for pt0_Node in pt2_GlobNodeIteration[j]:
+                            db1_FixedPointX.extend([pt0_Node.X, pt0_Node.Y, pt0_Node.Z])
+                        for pt0_Node in pt2_GlobNode[j-1]:
+                            db1_FixedPointG.extend([pt0_Node.X, pt0_Node.Y, pt0_Node.Z])
+                    db0_Divergence, db1_FixedPointX = SubIteration(A, db1_FixedPointX, db1_FixedPointG, int0_TrailNumber, int0_Counter, int0_CounterBracing, db0_Threshold)
+                
                 for j in xrange(1,len(pt2_GlobNode)+1):
-                    if int0_Counter-1 != 0:
-                        db0_Divergence = 0
-                        for k in xrange(len(pt2_GlobNode[j-1])):
-                            db0_Divergence += pt2_GlobNode[j-1][k].DistanceTo(pt2_GlobNodeIteration[j][k])
                     pt2_GlobNodeIteration[j] = pt2_GlobNode[j-1]
                 
                 if bl0_Print:
@@ -816,146 +1338,64 @@ def Main(db1_StructuralBehaviour, str1_NodeOrderC, xx1_Bracing, pl1_ConstraintPl
                         db0_Divergence = 0.00
                     str0_Description += "divergence: " + str(db0_Divergence)
                     
-                    print str0_Description
+                    print(str0_Description)
 
                 
                 if int0_Counter < int0_CounterBracing and db0_Divergence > db0_Threshold:
+                    # Accelerated Positions for the next Sub-Iteration
+                    if db1_FixedPointX is not None:
+                        int0_Index = 0
+                        for j in xrange(1,len(pt2_GlobNode)+1):
+                            pt1_Node = []
+                            for k in xrange(len(pt2_GlobNode[j-1])):
+                                pt1_Node.append(rh.Point3d(db1_FixedPointX[int0_Index], db1_FixedPointX[int0_Index+1], db1_FixedPointX[int0_Index+2]))
+                                int0_Index += 3
+                            pt2_GlobNodeIteration[j] = pt1_Node
+                    
                     # Re-Inatialize Global Variables
                     dbl0_Divergence = 0
                     vc2_GlobTrailForce = []
-                    ln2_GlobExtEdge = []
                     pt2_GlobNode = []
-                    ln2_GlobTrailEdge = []
-                    cl2_GlobTrailEdge = []
-                    db2_GlobTrailEdge = []
-                    ln2_GlobDeviation1Edge = []
-                    cl2_GlobDeviation1Edge = []
-                    db2_GlobDeviation1Edge = []
-                    ln2_GlobDeviation2Edge = []
-                    cl2_GlobDeviation2Edge = []
-                    db2_GlobDeviation2Edge = []
-                    ln2_GlobExtFOEdge = []
-                    cl2_GlobExtFOEdge = []
-                    db2_GlobExtFOEdge = []
-    
-                if int0_Counter == int0_CounterBracing or db0_Divergence < db0_Threshold:
+                    int2_GlobTrailSign = []
+                    vc2_GlobSelfWeight = []
+    
+                if (int0_Counter == int0_CounterBracing or db0_Divergence < db0_Threshold) and not bl0_Lean:
                     
-                    # Add Bracing
-                    ln1_Deviation2Edge = []
-                    cl1_Deviation2Edge = []
-                    db1_Deviation2Edge = []
-                    for i in xrange(0,len(xx1_Bracing),3):
-                        int0_BracingFromLayerIndex = int(xx1_Bracing[i]) // int0_TrailNumber
-                        int0_BracingFromTrailIndex = int(xx1_Bracing[i]) % int0_TrailNumber
-                        int0_BracingToLayerIndex = int(xx1_Bracing[i+1]) // int0_TrailNumber
-                        int0_BracingToTrailIndex = int(xx1_Bracing[i+1]) % int0_TrailNumber
-                        ln0_Deviation2Edge = rh.Line(pt2_GlobNodeIteration[int0_BracingFromLayerIndex][int0_BracingFromTrailIndex],pt2_GlobNodeIteration[int0_BracingToLayerIndex][int0_BracingToTrailIndex])
-                        ln1_Deviation2Edge.append(ln0_Deviation2Edge)
-                        if float(xx1_Bracing[i+2]) > 0.0:
-                            cl1_Deviation2Edge.append(System.Drawing.Color.Red)
-                        elif float(xx1_Bracing[i+2]) < 0.0:
-                            cl1_Deviation2Edge.append(System.Drawing.Color.Blue)
-                        else:
-                            cl1_Deviation2Edge.append(System.Drawing.Color.Black)
-                        db1_Deviation2Edge.append(xx1_Bracing[i+2])
-                        
-                        
                     ### OUTPUT
     
-                    ln1_GlobExtEdgeOut = ListListToList(ln2_GlobExtEdge)
-                    pt1_GlobNodeOut = ListListToList(pt2_GlobNodeIteration)
-                    ln1_GlobTrailEdgeOut = ListListToList(ln2_GlobTrailEdge)
-                    cl1_GlobTrailEdgeOut = ListListToList(cl2_GlobTrailEdge)
-                    db1_GlobTrailEdgeOut = ListListToList(db2_GlobTrailEdge)
-                    ln1_GlobDeviation1EdgeOut = ListListToList(ln2_GlobDeviation1Edge)
-                    cl1_GlobDeviation1EdgeOut = ListListToList(cl2_GlobDeviation1Edge)
-                    db1_GlobDeviation1EdgeOut = ListListToList(db2_GlobDeviation1Edge)
-                    ln1_GlobDeviation2EdgeOut = ln1_Deviation2Edge
-                    cl1_GlobDeviation2EdgeOut = cl1_Deviation2Edge
-                    db1_GlobDeviation2EdgeOut = db1_Deviation2Edge
-                    ln1_GlobDeviationEdgeOut = ln1_GlobDeviation1EdgeOut[:]
-                    ln1_GlobDeviationEdgeOut.extend(ln1_GlobDeviation2EdgeOut)
-                    str1_GlobDeviationEdgeOut = str1_Dev1EdgeID[:]
-                    str1_GlobDeviationEdgeOut.extend(str1_Dev2EdgeID)
-                    cl1_GlobDeviationEdgeOut = cl1_GlobDeviation1EdgeOut[:]
-                    cl1_GlobDeviationEdgeOut.extend(cl1_GlobDeviation2EdgeOut)
-                    db1_GlobDeviationEdgeOut = db1_GlobDeviation1EdgeOut[:]
-                    db1_GlobDeviationEdgeOut.extend(db1_GlobDeviation2EdgeOut)
-                    int1_DevEdgeInputSortID = int1_DevEdgeInputID[:]
-                    if len(str1_GlobDeviationEdgeOut) > 0:
-                        str1_GlobDeviationEdgeOut, ln1_GlobDeviationEdgeOut, cl1_GlobDeviationEdgeOut, db1_GlobDeviationEdgeOut = (list(t) for t in zip(*sorted(zip(str1_GlobDeviationEdgeOut, ln1_GlobDeviationEdgeOut, cl1_GlobDeviationEdgeOut, db1_GlobDeviationEdgeOut))))
-                        int1_DevEdgeInputSortID, ln1_GlobDeviationEdgeOut, str1_GlobDeviationEdgeOut, cl1_GlobDeviationEdgeOut, db1_GlobDeviationEdgeOut = (list(t) for t in zip(*sorted(zip(int1_DevEdgeInputSortID, ln1_GlobDeviationEdgeOut, str1_GlobDeviationEdgeOut, cl1_GlobDeviationEdgeOut, db1_GlobDeviationEdgeOut))))
-                    ln1_GlobExtFOEdgeOut = ListListToList(ln2_GlobExtFOEdge)
-                    cl1_GlobExtFOEdgeOut = ListListToList(cl2_GlobExtFOEdge)
-                    db1_GlobExtFOEdgeOut = ListListToList(db2_GlobExtFOEdge)
-                    M.ln1_GlobExtEdgeOut = ln1_GlobExtEdgeOut
-                    M.pt1_GlobNodeOut = pt1_GlobNodeOut[:len(str1_NodeOrderC)]
-                    M.ln1_GlobTrailEdgeOut = ln1_GlobTrailEdgeOut[:len(str1_TrailEdgeID)]
+                    M.FD = FormDiagram(str1_NodeOrderC)
                     M.str1_GlobTrailEdgeOut = str1_TrailEdgeID
-                    M.cl1_GlobTrailEdgeOut = cl1_GlobTrailEdgeOut[:len(str1_TrailEdgeID)]
-                    M.db1_GlobTrailEdgeOut = db1_GlobTrailEdgeOut[:len(str1_TrailEdgeID)]
-                    M.ln1_GlobDeviation1EdgeOut = ln1_GlobDeviation1EdgeOut
                     M.str1_GlobDeviation1EdgeOut = str1_Dev1EdgeID
-                    M.cl1_GlobDeviation1EdgeOut = cl1_GlobDeviation1EdgeOut
-                    M.db1_GlobDeviation1EdgeOut = db1_GlobDeviation1EdgeOut
-                    M.ln1_GlobDeviation2EdgeOut = ln1_GlobDeviation2EdgeOut
                     M.str1_GlobDeviation2EdgeOut = str1_Dev2EdgeID
-                    M.cl1_GlobDeviation2EdgeOut = cl1_GlobDeviation2EdgeOut
-                    M.db1_GlobDeviation2EdgeOut = db1_GlobDeviation2EdgeOut
-                    M.ln1_GlobDeviationEdgeOut = ln1_GlobDeviationEdgeOut
-                    M.str1_GlobDeviationEdgeOut = str1_GlobDeviationEdgeOut
-                    M.cl1_GlobDeviationEdgeOut = cl1_GlobDeviationEdgeOut
-                    M.db1_GlobDeviationEdgeOut = db1_GlobDeviationEdgeOut
-                    M.ln1_GlobExtFOEdgeOut = ln1_GlobExtFOEdgeOut
-                    M.cl1_GlobExtFOEdgeOut = cl1_GlobExtFOEdgeOut
-                    M.db1_GlobExtFOEdgeOut = db1_GlobExtFOEdgeOut
                     M.str1_NodeOrderOut = str1_NodeOrderC
+                    M.int1_NodeOrderOut = int1_NodeOrderC
+                    M.bl1_NodePaddingOut = bl1_NodePadding
+                    M.bl1_GlobTrailAuxiliaryOut = bl1_TrailAuxiliary
                     M.str1_EdgeOut = str1_Edge
+            
+            # Convergence Rate of the Sub-Iterations
+            str0_GlobConvergence = ""
+            db0_Rate = FixedPointRate(A)
+            if db0_Rate is not None:
+                str0_GlobConvergence = "%.4e" % db0_Rate
+                if bl0_Print:
+                    str0_DescriptionOpt += "\nsub-iterations: " + str(int0_Counter)
+                    str0_DescriptionOpt += "\nconvergence rate: " + str0_GlobConvergence
 
-    global int0_Counter
     int0_Counter = 0
     
+    # Objective of the Targets
     db0_Distance = 0
-
-    if targetNode and targetNodeID:
-        db0_DistanceGeometry = 0
-        for i in xrange(0,len(targetNodeID)): 
-            if str(targetNodeID[i]) in str1_NodeOrderC:
-                int0_IndexGlobNode = int(str1_NodeOrderC.index(str(targetNodeID[i])))
-                pt0_GlobNode = pt2_GlobNode[int0_IndexGlobNode // int0_TrailNumber - 1][int0_IndexGlobNode % int0_TrailNumber]
-                targetNode0 = pt0_GlobNode
-                if isinstance(targetNode[i], rh.Curve):
-                    targetNode0 = targetNode[i].PointAt( targetNode[i].ClosestPoint(pt0_GlobNode)[1] )
-                elif isinstance(targetNode[i], rh.Brep) or isinstance(targetNode[i], rh.BrepFace):
-                    targetNode[i] = rs.coercesurface(targetNode[i])
-                    targetNode0 = targetNode[i].PointAt( targetNode[i].ClosestPoint(pt0_GlobNode)[1], targetNode[i].ClosestPoint(pt0_GlobNode)[2] )
-                elif isinstance(targetNode[i], rh.Point3d):
-                    targetNode0 = targetNode[i]
-                db0_DistanceGeometry += targetNodeCoeff*pt0_GlobNode.DistanceToSquared(targetNode0)
-        db0_Distance += targetNodeCoeff*db0_DistanceGeometry
-
-    if targetVector and targetVectorID:
-        db0_DistanceVectorDir = 0
-        db0_DistanceVectorMag = 0
-        for i in xrange(0,len(targetVectorID)):
-            if str(targetVectorID[i]) in str1_NodeOrderC:
-                int0_IndexGlobNode = int(str1_NodeOrderC.index(str(targetVectorID[i])))
-                vc0_GlobVector = vc2_GlobTrailForce[int0_IndexGlobNode // int0_TrailNumber][int0_IndexGlobNode % int0_TrailNumber]
-                targetVector0 = vc0_GlobVector
-                if isinstance(targetVector[i], rh.Vector3d):
-                    targetVector0 = targetVector[i]
-                db0_DistanceVectorMag += (vc0_GlobVector.Length - targetVector0.Length)**2
-                vc0_GlobVectorU = rh.Vector3d(vc0_GlobVector)
-                targetVector0U = rh.Vector3d(targetVector0)
-                vc0_GlobVectorU.Unitize()
-                targetVector0U.Unitize()
-                db0_DistanceVectorDir += ((1- abs(rh.Vector3d.Multiply(vc0_GlobVectorU,targetVector0U)))**2)
-        db0_Distance = db0_Distance + targetVectorCoeffMag*db0_DistanceVectorMag + targetVectorCoeffDir*db0_DistanceVectorDir
+    if SC.bl0_Target:
+        db3_NodeOut = [[[pt0_Node.X, pt0_Node.Y, pt0_Node.Z] for pt0_Node in pt1_Node] for pt1_Node in pt2_GlobNode]
+        db3_TrailForce = [[[vc0_Force.X, vc0_Force.Y, vc0_Force.Z] for vc0_Force in vc1_Force] for vc1_Force in vc2_GlobTrailForce]
+        db0_Distance = TargetObjective(TargetTerms(SC, db3_NodeOut, db3_TrailForce))
 
     if bl0_Print:
         str0_DescriptionOpt += "\nobjective: " + str(db0_Distance)
+        str0_DescriptionOpt += MemoReport()
         str0_DescriptionOpt += "\n\n\n "
-        print str0_DescriptionOpt
+        print(str0_DescriptionOpt)
     
     global GlobDivergence
     str0_GlobDivergence = str(int(db0_Distance*1E5)/1E5)
@@ -966,6 +1406,974 @@ def Main(db1_StructuralBehaviour, str1_NodeOrderC, xx1_Bracing, pl1_ConstraintPl
         
     return(db0_Distance)
 
+### MEMO
+# Bounded LRU memo in front of Main() keyed on the exact variable vector. A hit restores
+# the objective, the model outputs and the state read by the gradient instead of solving.
+bl0_Memo = True
+int0_MemoSize = 64
+dc1_Memo = collections.OrderedDict()
+int0_MemoHit = 0
+int0_MemoMiss = 0
+str1_MemoGlobal = ["vc2_GlobTrailForce", "pt2_GlobNode", "int2_GlobTrailSign", "vc2_GlobSelfWeight", "str0_GlobDivergence", "str0_GlobConvergence"]
+
+def MemoReport():
+    if not bl0_Memo:
+        return ""
+    return "\nmemo hits: " + str(int0_MemoHit) + ", misses: " + str(int0_MemoMiss)
+
+def MainMemo(str1_NodeOrderC, xx1_Bracing, pl1_ConstraintPlane, id_NodePlane, pt1_OriginNode, str1_Edge, db0_Divergence, db0_Threshold, int0_CounterBracing, int0_TrailNumber, int0_LayerCount, db1_Variable, bl0_Print):
+    
+    global int0_MemoHit
+    global int0_MemoMiss
+    global int0_CounterOpt
+    global db0_DistanceBest
+    global db1_VariableBest
+    global str0_GlobIteration
+    global pt2_GlobNodeIteration
+    
+    if not bl0_Memo:
+        return Main(str1_NodeOrderC, xx1_Bracing, pl1_ConstraintPlane, id_NodePlane, pt1_OriginNode, str1_Edge, db0_Divergence, db0_Threshold, int0_CounterBracing, int0_TrailNumber, int0_LayerCount, db1_Variable, bl0_Print)
+    
+    xx0_Key = (bl0_Lean, tuple(db1_Variable))
+    if xx0_Key in dc1_Memo:
+        int0_MemoHit += 1
+        db0_Distance, dc1_Global, dc1_Model = dc1_Memo.pop(xx0_Key)
+        dc1_Memo[xx0_Key] = (db0_Distance, dc1_Global, dc1_Model)
+        
+        # Restore the solve
+        globals().update(dc1_Global)
+        pt2_GlobNodeIteration = dc1_Global["pt2_GlobNodeIteration"][:]
+        for str0_Name in dc1_Model:
+            setattr(M, str0_Name, dc1_Model[str0_Name])
+        ApplyVariables(db1_Variable, db1_DevValue, db1_RowTrailLength, xx1_Bracing, pt1_OriginNode)
+        
+        if bl0_Print:
+            int0_CounterOpt += 1
+            str0_DescriptionOpt = ""
+            str0_DescriptionOpt += "\niteration: " + str(int0_CounterOpt)
+            str0_DescriptionOpt += "\nobjective: " + str(db0_Distance)
+            str0_DescriptionOpt += MemoReport()
+            str0_DescriptionOpt += "\n\n\n "
+            print(str0_DescriptionOpt)
+        str0_GlobIteration = str(int0_CounterOpt)
+        
+        if db0_Distance < db0_DistanceBest:
+            db0_DistanceBest = db0_Distance
+            db1_VariableBest = db1_Variable
+        return db0_Distance
+    
+    int0_MemoMiss += 1
+    db0_Distance = Main(str1_NodeOrderC, xx1_Bracing, pl1_ConstraintPlane, id_NodePlane, pt1_OriginNode, str1_Edge, db0_Divergence, db0_Threshold, int0_CounterBracing, int0_TrailNumber, int0_LayerCount, db1_Variable, bl0_Print)
+    dc1_Global = dict([(str0_Name, globals().get(str0_Name)) for str0_Name in str1_MemoGlobal])
+    dc1_Global["pt2_GlobNodeIteration"] = pt2_GlobNodeIteration[:]
+    dc1_Memo[xx0_Key] = (db0_Distance, dc1_Global, ModelState(M))
+    while len(dc1_Memo) > int0_MemoSize:
+        dc1_Memo.popitem(False)
+    return db0_Distance
+
+### ADJOINT GRADIENT
+# Reverse-mode derivative of the objective of Main() with respect to db1_Variable.
+# The last layer sweep is repeated on floats at the current state and recorded, then the
+# adjoints are propagated from the targets back through the layers to the variables.
+# Indirect deviations use the positions of the previous sub-iteration, their adjoint is
+# iterated to the fixed point in the same way as the sub-iterations of Main().
+bl0_AdjointGradient = True
+
+class adjointLayer(object):
+    pass
+
+
+def AdjointForward(C, S, db3_NodePrev, dc2_BracingNode, xx1_Prefix = []):
+    int0_N = C.int0_TrailNumber
+    xx1_Layer = list(xx1_Prefix)
+    if xx1_Layer:
+        db2_Node = xx1_Layer[-1].db2_NodeOut
+        db2_TrailForce = xx1_Layer[-1].db2_TrailForce
+    else:
+        db2_Node = db3_NodePrev[0]
+        db2_TrailForce = [[0.0, 0.0, 0.0] for i in xrange(int0_N)]
+    
+    for g in xrange(len(xx1_Layer), C.int0_LayerCount):
+        AL = adjointLayer()
+        AL.db2_Node = db2_Node
+        AL.db2_TrailForceIn = db2_TrailForce
+        AL.xx2_Pair = []
+        AL.xx2_Bracing = []
+        AL.db1_TrailStatAct = []
+        AL.db2_TrailForce = []
+        AL.db1_TrailForceLength = []
+        AL.db2_TrailUnit = []
+        AL.xx2_Plane = []
+        AL.db2_NodeOut = []
+        
+        for i in xrange(int0_N):
+            int0_Row = g*int0_N + i
+            db1_P = db2_Node[i]
+            db1_Load = S.db2_Load[int0_Row]
+            db1_Sum = [db1_Load[0], db1_Load[1], db1_Load[2]]
+            db0_StatAct = 0.0
+            
+            # Indirect deviations (positions of the previous sub-iteration)
+            xx1_Bracing = []
+            for int0_Bracing, int0_Other in dc2_BracingNode.get(int0_Row, []):
+                db1_From = db3_NodePrev[int0_Row // int0_N][i]
+                db1_To = db3_NodePrev[int0_Other // int0_N][int0_Other % int0_N]
+                db1_D = [db1_To[0]-db1_From[0], db1_To[1]-db1_From[1], db1_To[2]-db1_From[2]]
+                db0_D = math.sqrt(db1_D[0]**2 + db1_D[1]**2 + db1_D[2]**2)
+                db1_U = [db1_D[0]/db0_D, db1_D[1]/db0_D, db1_D[2]/db0_D] if db0_D > 0 else [0.0, 0.0, 0.0]
+                db0_V = S.db1_BracingValue[int0_Bracing]
+                for k in xrange(3): db1_Sum[k] += db0_V*db1_U[k]
+                db0_StatAct += abs(db0_V*db0_D)/2
+                xx1_Bracing.append((int0_Bracing, int0_Other, db0_D, db1_U))
+            AL.xx2_Bracing.append(xx1_Bracing)
+            
+            # Direct deviations
+            xx1_Pair = []
+            for p in xrange(C.int1_DevRowPtr[int0_Row], C.int1_DevRowPtr[int0_Row+1]):
+                j = C.int1_DevCol[p]
+                db0_Mag = S.db1_Deviation[p]
+                int0_Transpose = C.int1_DevTranspose[p]
+                if abs(db0_Mag) > C.db0_Threshold or (int0_Transpose >= 0 and abs(S.db1_Deviation[int0_Transpose]) > C.db0_Threshold):
+                    db1_D = [db2_Node[j][0]-db1_P[0], db2_Node[j][1]-db1_P[1], db2_Node[j][2]-db1_P[2]]
+                    db0_D = math.sqrt(db1_D[0]**2 + db1_D[1]**2 + db1_D[2]**2)
+                    db1_U = [db1_D[0]/db0_D, db1_D[1]/db0_D, db1_D[2]/db0_D]
+                    for k in xrange(3): db1_Sum[k] += db0_Mag*db1_U[k]
+                    db0_StatAct += abs(db0_D*db0_Mag)/2
+                    xx1_Pair.append((j, db0_Mag, db0_D, db1_U))
+            AL.xx2_Pair.append(xx1_Pair)
+            
+            # Self weight
+            db0_TrailStatAct = 0.0
+            if g != 0:
+                db1_FIn = db2_TrailForce[i]
+                db0_TrailStatAct = abs(S.db1_TrailLength[int0_Row - int0_N])*math.sqrt(db1_FIn[0]**2 + db1_FIn[1]**2 + db1_FIn[2]**2)
+            AL.db1_TrailStatAct.append(db0_TrailStatAct)
+            if C.db0_SelfWeight is not None:
+                db1_Sum[2] -= (db0_TrailStatAct + db0_StatAct)*C.db0_SelfWeight
+            
+            # Trail force and new node
+            db1_F = [db2_TrailForce[i][k] - db1_Sum[k] for k in xrange(3)]
+            db0_F = math.sqrt(db1_F[0]**2 + db1_F[1]**2 + db1_F[2]**2)
+            db1_U = [db1_F[0]/db0_F, db1_F[1]/db0_F, db1_F[2]/db0_F] if db0_F > 0 else [0.0, 0.0, 0.0]
+            db0_Length = S.db1_TrailLength[int0_Row]
+            db1_Q = [db1_P[k] + db1_U[k]*db0_Length for k in xrange(3)]
+            xx1_Plane = None
+            if C.pl1_ConstraintPlane and g != C.int0_LayerCount-1:
+                for j in C.int2_RowPlane[((g+1)*int0_N)+i]:
+                    if C.pl1_ConstraintPlane[j] is not None:
+                        pl0_Plane = C.pl1_ConstraintPlane[j]
+                        ln0_TrailOut = rh.Line(rh.Point3d(db1_P[0], db1_P[1], db1_P[2]), rh.Vector3d(db1_U[0], db1_U[1], db1_U[2]))
+                        bl0_Intersect, db0_Intersect = rh.Intersect.Intersection.LinePlane(ln0_TrailOut, pl0_Plane)[0:2]
+                        if abs(db0_Intersect) < abs(C.db0_Threshold):
+                            db1_Q = db1_P[:]
+                            xx1_Plane = (0.0, None, 0.0)
+                        if bl0_Intersect and abs(db0_Intersect) > abs(C.db0_Threshold):
+                            db1_Q = [db1_P[k] + db1_U[k]*db0_Intersect for k in xrange(3)]
+                            db1_Normal = [pl0_Plane.Normal.X, pl0_Plane.Normal.Y, pl0_Plane.Normal.Z]
+                            xx1_Plane = (db0_Intersect, db1_Normal, sum([db1_U[k]*db1_Normal[k] for k in xrange(3)]))
+            AL.db2_TrailForce.append(db1_F)
+            AL.db1_TrailForceLength.append(db0_F)
+            AL.db2_TrailUnit.append(db1_U)
+            AL.xx2_Plane.append(xx1_Plane)
+            AL.db2_NodeOut.append(db1_Q)
+        
+        xx1_Layer.append(AL)
+        db2_Node = AL.db2_NodeOut
+        db2_TrailForce = AL.db2_TrailForce
+    return xx1_Layer
+
+def AdjointReverse(C, S, xx1_Layer, db3_NodeOutAdj, db3_ForceAdj):
+    int0_N = C.int0_TrailNumber
+    db0_SelfWeight = C.db0_SelfWeight
+    dc1_DevAdj = {}
+    db1_LengthAdj = [0.0]*(C.int0_LayerCount*int0_N)
+    db1_BracingAdj = [0.0]*len(S.db1_BracingValue)
+    db3_NodePrevAdj = [[[0.0, 0.0, 0.0] for i in xrange(int0_N)] for g in xrange(C.int0_LayerCount+1)]
+    db2_NodeInAdj = [[0.0, 0.0, 0.0] for i in xrange(int0_N)]
+    db2_ForceInAdj = [[0.0, 0.0, 0.0] for i in xrange(int0_N)]
+    
+    for g in reversed(xrange(C.int0_LayerCount)):
+        AL = xx1_Layer[g]
+        db2_QAdj = [[db3_NodeOutAdj[g][i][k] + db2_NodeInAdj[i][k] for k in xrange(3)] for i in xrange(int0_N)]
+        db2_FAdj = [[db3_ForceAdj[g][i][k] + db2_ForceInAdj[i][k] for k in xrange(3)] for i in xrange(int0_N)]
+        db2_NodeInAdj = [[0.0, 0.0, 0.0] for i in xrange(int0_N)]
+        db2_ForceInAdj = [[0.0, 0.0, 0.0] for i in xrange(int0_N)]
+        
+        for i in xrange(int0_N):
+            int0_Row = g*int0_N + i
+            db1_QAdj = db2_QAdj[i]
+            db1_U = AL.db2_TrailUnit[i]
+            db1_PAdj = db2_NodeInAdj[i]
+            
+            # New node
+            for k in xrange(3): db1_PAdj[k] += db1_QAdj[k]
+            xx1_Plane = AL.xx2_Plane[i]
+            if xx1_Plane is None:
+                db0_Length = S.db1_TrailLength[int0_Row]
+                db1_LengthAdj[int0_Row] += sum([db1_QAdj[k]*db1_U[k] for k in xrange(3)])
+                db1_UAdj = [db1_QAdj[k]*db0_Length for k in xrange(3)]
+            elif xx1_Plane[1] is None:
+                db1_UAdj = [0.0, 0.0, 0.0]
+            else:
+                db0_Intersect, db1_Normal, db0_Denom = xx1_Plane
+                db0_TAdj = sum([db1_QAdj[k]*db1_U[k] for k in xrange(3)])
+                db1_UAdj = [db1_QAdj[k]*db0_Intersect - db0_TAdj*db0_Intersect/db0_Denom*db1_Normal[k] for k in xrange(3)]
+                for k in xrange(3): db1_PAdj[k] -= db0_TAdj*db1_Normal[k]/db0_Denom
+            
+            # Unit vector of the trail force
+            db1_FAdj = db2_FAdj[i]
+            db0_F = AL.db1_TrailForceLength[i]
+            if db0_F > 0:
+                db0_Dot = sum([db1_U[k]*db1_UAdj[k] for k in xrange(3)])
+                for k in xrange(3): db1_FAdj[k] += (db1_UAdj[k] - db1_U[k]*db0_Dot)/db0_F
+            
+            # Trail force = trail force in - (external + deviation + self weight)
+            for k in xrange(3): db2_ForceInAdj[i][k] += db1_FAdj[k]
+            db1_SumAdj = [-db1_FAdj[0], -db1_FAdj[1], -db1_FAdj[2]]
+            db0_StatActAdj = 0.0
+            if db0_SelfWeight is not None:
+                db0_StatActAdj = -db0_SelfWeight*db1_SumAdj[2]
+                if g != 0:
+                    db1_FIn = AL.db2_TrailForceIn[i]
+                    db0_FIn = math.sqrt(db1_FIn[0]**2 + db1_FIn[1]**2 + db1_FIn[2]**2)
+                    db0_LengthIn = S.db1_TrailLength[int0_Row - int0_N]
+                    if db0_FIn > 0:
+                        for k in xrange(3): db2_ForceInAdj[i][k] += db0_StatActAdj*abs(db0_LengthIn)*db1_FIn[k]/db0_FIn
+                    if db0_LengthIn != 0:
+                        db1_LengthAdj[int0_Row - int0_N] += db0_StatActAdj*db0_FIn*math.copysign(1.0, db0_LengthIn)
+            
+            # Direct deviations
+            for j, db0_Mag, db0_D, db1_DU in AL.xx2_Pair[i]:
+                db0_Dot = sum([db1_DU[k]*db1_SumAdj[k] for k in xrange(3)])
+                db0_MagAdj = db0_Dot
+                if db0_Mag != 0:
+                    db0_MagAdj += db0_StatActAdj/2*db0_D*math.copysign(1.0, db0_Mag)
+                dc1_DevAdj[(int0_Row, j)] = dc1_DevAdj.get((int0_Row, j), 0.0) + db0_MagAdj
+                for k in xrange(3):
+                    db0_DAdj = db0_Mag*(db1_SumAdj[k] - db1_DU[k]*db0_Dot)/db0_D + db0_StatActAdj/2*abs(db0_Mag)*db1_DU[k]
+                    db2_NodeInAdj[j][k] += db0_DAdj
+                    db1_PAdj[k] -= db0_DAdj
+            
+            # Indirect deviations
+            for int0_Bracing, int0_Other, db0_D, db1_DU in AL.xx2_Bracing[i]:
+                db0_V = S.db1_BracingValue[int0_Bracing]
+                db0_Dot = sum([db1_DU[k]*db1_SumAdj[k] for k in xrange(3)])
+                db1_BracingAdj[int0_Bracing] += db0_Dot
+                if db0_V != 0:
+                    db1_BracingAdj[int0_Bracing] += db0_StatActAdj/2*db0_D*math.copysign(1.0, db0_V)
+                if db0_D > 0:
+                    db1_From = db3_NodePrevAdj[int0_Row // int0_N][i]
+                    db1_To = db3_NodePrevAdj[int0_Other // int0_N][int0_Other % int0_N]
+                    for k in xrange(3):
+                        db0_DAdj = db0_V*(db1_SumAdj[k] - db1_DU[k]*db0_Dot)/db0_D + db0_StatActAdj/2*abs(db0_V)*db1_DU[k]
+                        db1_To[k] += db0_DAdj
+                        db1_From[k] -= db0_DAdj
+    
+    return dc1_DevAdj, db1_LengthAdj, db1_BracingAdj, db2_NodeInAdj, db3_NodePrevAdj
+
+def AdjointGradient(C, db1_Variable, db3_NodePrev):
+    int0_N = C.int0_TrailNumber
+    int0_L = C.int0_LayerCount
+    
+    # Forward sweep at the positions of the last sub-iteration of the solve
+    S = SolveState(C, db1_Variable)
+    xx1_Layer = AdjointForward(C, S, db3_NodePrev, C.dc2_BracingNode)
+    
+    # Adjoints of the objective
+    db3_NodeOutAdj = [[[0.0, 0.0, 0.0] for i in xrange(int0_N)] for g in xrange(int0_L)]
+    db3_ForceAdj = [[[0.0, 0.0, 0.0] for i in xrange(int0_N)] for g in xrange(int0_L)]
+    
+    xx1_Term = TargetTerms(C, [AL.db2_NodeOut for AL in xx1_Layer], [AL.db2_TrailForce for AL in xx1_Layer])
+    for db0_Weight, db0_Value, bl0_Force, int0_Layer, int0_Trail, db1_Derivative in xx1_Term:
+        db1_Adj = db3_ForceAdj[int0_Layer][int0_Trail] if bl0_Force else db3_NodeOutAdj[int0_Layer][int0_Trail]
+        for k in xrange(3): db1_Adj[k] += 2*db0_Weight*db0_Value*db1_Derivative[k]
+    
+    # Reverse sweep, iterated for the positions used by the indirect deviations
+    db3_LagAdj = [[[0.0, 0.0, 0.0] for i in xrange(int0_N)] for g in xrange(int0_L)]
+    for int0_Iteration in xrange(C.int0_CounterBracing):
+        db3_OutAdj = [[[db3_NodeOutAdj[g][i][k] + db3_LagAdj[g][i][k] for k in xrange(3)] for i in xrange(int0_N)] for g in xrange(int0_L)]
+        dc1_DevAdj, db1_LengthAdj, db1_BracingAdj, db2_OriginAdj, db3_NodePrevAdj = AdjointReverse(C, S, xx1_Layer, db3_OutAdj, db3_ForceAdj)
+        if len(C.int2_BracingRow) == 0:
+            break
+        db0_Change = 0.0
+        for g in xrange(int0_L):
+            for i in xrange(int0_N):
+                for k in xrange(3):
+                    db0_Change += abs(db3_NodePrevAdj[g+1][i][k] - db3_LagAdj[g][i][k])
+        db3_LagAdj = db3_NodePrevAdj[1:]
+        if db0_Change < C.db0_Threshold*1e-3:
+            break
+    for i in xrange(int0_N):
+        for k in xrange(3): db2_OriginAdj[i][k] += db3_NodePrevAdj[0][i][k]
+    
+    # Gradient in the order of db1_Variable
+    db1_Gradient = []
+    for int0_Row, int0_Col in C.int2_Deviation1Edge:
+        int0_RowT = (int0_Row // int0_N)*int0_N + int0_Col - 3
+        db1_Gradient.append(dc1_DevAdj.get((int0_Row, int0_Col - 3), 0.0) + dc1_DevAdj.get((int0_RowT, int0_Row % int0_N), 0.0))
+    for int0_Row in C.int1_TrailRow:
+        db1_Gradient.append(db1_LengthAdj[int0_Row])
+    db1_Gradient.extend(db1_BracingAdj)
+    for k in xrange(3):
+        for i in xrange(int0_N):
+            db1_Gradient.append(db2_OriginAdj[i][k])
+    return db1_Gradient
+
+
+### SOLVE CONTEXT
+# What the reentrant solves read of a run: the topology, constraint planes, self-weight,
+# targets and the layout of the variables, captured by SolveContext() before the first solve
+# changes the matrix. The matrix is held as compact arrays: the loads and the trail length of
+# every row and the deviation magnitudes in the order of the sparse deviation structure, as
+# they are read from the topology.
+class solveContext(object):
+    pass
+
+def SolveContext():
+    int0_N = int0_TrailNumber
+    C = solveContext()
+    C.int0_TrailNumber = int0_N
+    C.int0_LayerCount = int0_LayerCount
+    C.db2_Load = [tuple(db1_Load) for db1_Load in db2_Load]
+    C.db1_TrailLength = list(db1_RowTrailLength)
+    
+    # Deviations, with the position of the entry (j,i) for every entry (i,j) of a layer (-1 if absent)
+    C.int1_DevRowPtr = int1_DevRowPtr
+    C.int1_DevCol = int1_DevCol
+    C.db1_Deviation = list(db1_DevValue)
+    C.dc1_DevPosition = dc1_DevPosition
+    C.int1_DevTranspose = int1_DevTranspose
+    
+    C.int2_BracingRow = [(int(xx1_Bracing[i]), int(xx1_Bracing[i+1])) for i in xrange(0, len(xx1_Bracing), 3)]
+    C.db1_BracingValue = [float(xx1_Bracing[i]) for i in xrange(2, len(xx1_Bracing), 3)]
+    C.dc2_BracingNode = BracingNode()
+    C.db2_Origin = [(pt0_Node.X, pt0_Node.Y, pt0_Node.Z) for pt0_Node in pt1_OriginNode]
+    C.pl1_ConstraintPlane = pl1_ConstraintPlane
+    C.int2_RowPlane = int2_RowPlane
+    C.db0_SelfWeight = specWeight/yieldStress if specWeight and yieldStress else None
+    C.db0_Threshold = db0_Threshold
+    C.int0_CounterBracing = int0_CounterBracing
+    C.bl0_Newton = bl0_Newton
+    
+    # Variables: direct deviations (both entries), trail lengths, indirect deviations, origin nodes
+    C.int2_Deviation1Edge = [(int0_Row, int0_Col) for int0_Row, int0_Col in int2_Deviation1Edge]
+    C.int2_Deviation1Position = int2_Deviation1Position
+    C.int1_TrailRow = [int0_Row for int0_Row, int0_Col in int2_TrailEdge]
+    
+    # First layer of the sweep moved by each variable, the layers before it do not change
+    C.int1_VariableLayer = [int0_Row // int0_N for int0_Row, int0_Col in C.int2_Deviation1Edge] + [int0_Row // int0_N for int0_Row in C.int1_TrailRow] + [0]*(len(C.int2_BracingRow) + 3*len(C.db2_Origin))
+    
+    # Targets as (layer of the sweep, trail, target), the nodes are the outputs of the layer before them
+    C.xx1_TargetNode = []
+    C.xx1_TargetVector = []
+    C.db0_TargetNodeCoeff = targetNodeCoeff
+    C.db0_TargetVectorCoeffMag = targetVectorCoeffMag
+    C.db0_TargetVectorCoeffDir = targetVectorCoeffDir
+    if targetNode and targetNodeID:
+        for i in xrange(len(targetNodeID)):
+            int0_IndexGlobNode = IndexOf(int1_NodeRow, targetNodeID[i])
+            if int0_IndexGlobNode >= 0:
+                C.xx1_TargetNode.append(((int0_IndexGlobNode // int0_N - 1) % int0_LayerCount, int0_IndexGlobNode % int0_N, targetNode[i]))
+    if targetVector and targetVectorID:
+        for i in xrange(len(targetVectorID)):
+            int0_IndexGlobNode = IndexOf(int1_NodeRow, targetVectorID[i])
+            if int0_IndexGlobNode >= 0:
+                C.xx1_TargetVector.append((int0_IndexGlobNode // int0_N, int0_IndexGlobNode % int0_N, targetVector[i]))
+    C.bl0_Target = bool(targetNode and targetNodeID or targetVector and targetVectorID)
+    
+    C.str1_NodeOrder = str1_NodeOrderC
+    C.str1_TrailEdgeID = str1_TrailEdgeID
+    C.xx1_ColourCache = []
+    return C
+
+# Point of a target geometry closest to a node (the target itself for a point, the node if there is none)
+def TargetPoint(xx0_Target, pt0_Node):
+    if isinstance(xx0_Target, rh.Curve):
+        return xx0_Target.PointAt( xx0_Target.ClosestPoint(pt0_Node)[1] )
+    elif isinstance(xx0_Target, rh.Brep) or isinstance(xx0_Target, rh.BrepFace):
+        srf0_Target = rs.coercesurface(xx0_Target)
+        return srf0_Target.PointAt( srf0_Target.ClosestPoint(pt0_Node)[1], srf0_Target.ClosestPoint(pt0_Node)[2] )
+    elif isinstance(xx0_Target, rh.Point3d):
+        return xx0_Target
+    return pt0_Node
+
+
+### TARGET TERMS
+# The objective is a sum of weighted squares over the terms of the targets: the coordinates of
+# the distance of a target node to its target (weight targetNodeCoeff squared), the difference
+# of the magnitudes of trail force and target vector (weight targetVectorCoeffMag) and one minus
+# the absolute cosine of their directions (weight targetVectorCoeffDir). A term is (weight, value,
+# trail force (True) or node position (False), layer, trail, derivative of the value with respect
+# to that trail force or node position). Main(), the reentrant solves, the adjoint and the
+# differences all evaluate the targets through TargetTerms().
+def TargetTerms(C, db3_NodeOut, db3_TrailForce):
+    xx1_Term = []
+    db0_WeightNode = C.db0_TargetNodeCoeff*C.db0_TargetNodeCoeff
+    for int0_Layer, int0_Trail, xx0_Target in C.xx1_TargetNode:
+        db1_Q = db3_NodeOut[int0_Layer][int0_Trail]
+        targetNode0 = TargetPoint(xx0_Target, rh.Point3d(db1_Q[0], db1_Q[1], db1_Q[2]))
+        db1_Target = [targetNode0.X, targetNode0.Y, targetNode0.Z]
+        for k in xrange(3):
+            db1_Derivative = [0.0, 0.0, 0.0]
+            db1_Derivative[k] = 1.0
+            xx1_Term.append((db0_WeightNode, db1_Q[k] - db1_Target[k], False, int0_Layer, int0_Trail, db1_Derivative))
+    
+    for int0_Layer, int0_Trail, xx0_Target in C.xx1_TargetVector:
+        db1_F = db3_TrailForce[int0_Layer][int0_Trail]
+        db0_F = math.sqrt(db1_F[0]**2 + db1_F[1]**2 + db1_F[2]**2)
+        db1_U = [db1_F[k]/db0_F for k in xrange(3)] if db0_F > 0 else [0.0, 0.0, 0.0]
+        
+        # A target that is not a vector is the trail force itself
+        bl0_Vector = isinstance(xx0_Target, rh.Vector3d)
+        db1_T = [xx0_Target.X, xx0_Target.Y, xx0_Target.Z] if bl0_Vector else db1_F
+        db0_T = math.sqrt(db1_T[0]**2 + db1_T[1]**2 + db1_T[2]**2)
+        db1_TU = [db1_T[k]/db0_T for k in xrange(3)] if db0_T > 0 else [0.0, 0.0, 0.0]
+        db0_Cos = sum([db1_U[k]*db1_TU[k] for k in xrange(3)])
+        
+        db1_MagDerivative = db1_U if bl0_Vector else [0.0, 0.0, 0.0]
+        db1_DirDerivative = [0.0, 0.0, 0.0]
+        if bl0_Vector and db0_F > 0 and db0_Cos != 0:
+            db1_DirDerivative = [-math.copysign(1.0, db0_Cos)*(db1_TU[k] - db0_Cos*db1_U[k])/db0_F for k in xrange(3)]
+        xx1_Term.append((C.db0_TargetVectorCoeffMag, db0_F - db0_T, True, int0_Layer, int0_Trail, db1_MagDerivative))
+        xx1_Term.append((C.db0_TargetVectorCoeffDir, 1 - abs(db0_Cos), True, int0_Layer, int0_Trail, db1_DirDerivative))
+    return xx1_Term
+
+def TargetObjective(xx1_Term):
+    return sum([xx0_Term[0]*xx0_Term[1]*xx0_Term[1] for xx0_Term in xx1_Term])
+
+
+### REENTRANT SOLVE
+# Objective of Main() for a variable vector, with the state of the solve held in a solveState
+# instead of the module globals: the deviation magnitudes, trail lengths and bracing values
+# with the variables applied, the origin nodes and the node positions of the sub-iterations.
+# The context is only read, so several solves can run at the same time in the threads of
+# ghpythonlib.parallel.
+class solveState(object):
+    pass
+
+def SolveState(C, db1_Variable):
+    S = solveState()
+    S.db2_Load = C.db2_Load
+    S.db1_Deviation = list(C.db1_Deviation)
+    S.db1_TrailLength = list(C.db1_TrailLength)
+    S.db1_BracingValue = list(C.db1_BracingValue)
+    S.db2_Origin = [list(db1_Node) for db1_Node in C.db2_Origin]
+    if len(db1_Variable) > 0:
+        int0_CountVar = 0
+        for int0_Position, int0_Transpose in C.int2_Deviation1Position:
+            S.db1_Deviation[int0_Position] = db1_Variable[int0_CountVar]
+            if int0_Transpose >= 0:
+                S.db1_Deviation[int0_Transpose] = db1_Variable[int0_CountVar]
+            int0_CountVar += 1
+        for int0_Row in C.int1_TrailRow:
+            S.db1_TrailLength[int0_Row] = db1_Variable[int0_CountVar]
+            int0_CountVar += 1
+        for b in xrange(len(S.db1_BracingValue)):
+            S.db1_BracingValue[b] = float(db1_Variable[int0_CountVar])
+            int0_CountVar += 1
+        for k in xrange(3):
+            for db1_Node in S.db2_Origin:
+                db1_Node[k] = db1_Variable[int0_CountVar]
+                int0_CountVar += 1
+    return S
+
+def Solve(C, S, xx1_Prefix = []):
+    # First sweep without indirect deviations, then sub-iterations as in Main(). The sweep
+    # starts after the layers of xx1_Prefix, taken from a solve they are unchanged in.
+    S.db3_NodePrev = [S.db2_Origin]
+    S.xx1_Layer = AdjointForward(C, S, S.db3_NodePrev, {}, xx1_Prefix)
+    S.db3_NodePrev = [S.db2_Origin] + [AL.db2_NodeOut for AL in S.xx1_Layer]
+    S.int0_NewtonCount = 0
+    if C.bl0_Newton and len(C.int2_BracingRow) > 0:
+        db3_NodePrev, S.int0_NewtonCount = NewtonBracing(C, S)
+        if db3_NodePrev is not None:
+            S.db3_NodePrev = db3_NodePrev
+    S.A = FixedPointStart()
+    int0_Counter = 1
+    db0_Divergence = float("inf")
+    while int0_Counter < C.int0_CounterBracing and db0_Divergence > C.db0_Threshold:
+        S.xx1_Layer = AdjointForward(C, S, S.db3_NodePrev, C.dc2_BracingNode)
+        int0_Counter += 1
+        db1_X = ListListToList(ListListToList(S.db3_NodePrev[1:]))
+        db1_G = ListListToList(ListListToList([AL.db2_NodeOut for AL in S.xx1_Layer]))
+        db0_Divergence, db1_X = SubIteration(S.A, db1_X, db1_G, C.int0_TrailNumber, int0_Counter, C.int0_CounterBracing, C.db0_Threshold)
+        if db1_X is not None:
+            S.db3_NodePrev = [S.db2_Origin] + [[db1_X[3*(g*C.int0_TrailNumber + i):3*(g*C.int0_TrailNumber + i)+3] for i in xrange(C.int0_TrailNumber)] for g in xrange(C.int0_LayerCount)]
+    return S
+
+# Target terms of a solve (solved first if no state is given)
+def SolveTerms(C, db1_Variable, S = None):
+    if S is None:
+        S = Solve(C, SolveState(C, db1_Variable))
+    return TargetTerms(C, [AL.db2_NodeOut for AL in S.xx1_Layer], [AL.db2_TrailForce for AL in S.xx1_Layer])
+
+def SolveObjective(C, db1_Variable, S = None):
+    return TargetObjective(SolveTerms(C, db1_Variable, S))
+
+# Square roots of the weights of the target terms, a negative weight (targetVectorCoeffMag or
+# targetVectorCoeffDir below zero) has no residual form
+def TermRoot(xx1_Term):
+    for xx0_Term in xx1_Term:
+        if xx0_Term[0] < 0:
+            raise ValueError("Residuals need non-negative target coefficients, got " + str(xx0_Term[0]))
+    return [math.sqrt(xx0_Term[0]) for xx0_Term in xx1_Term]
+
+# Residuals of the objective, the values of the target terms scaled by the square root of their
+# weights, their sum of squares is the objective
+def SolveResidual(C, db1_Variable, S = None):
+    xx1_Term = SolveTerms(C, db1_Variable, S)
+    db1_Root = TermRoot(xx1_Term)
+    return [db1_Root[k]*xx1_Term[k][1] for k in xrange(len(xx1_Term))]
+
+
+### GROUPED DIFFERENCES
+# Variables that move disjoint sets of residuals are perturbed together, one solve per colour
+# instead of one per variable. A variable moves the trail forces of its layer or the nodes of
+# the next one, from there on the trails of the following layers and, through the direct
+# deviations of a layer, the trails connected to them. Indirect deviations couple all nodes,
+# then every variable keeps its own colour.
+bl0_GroupedDifferences = True
+
+# Without indirect deviations a layer only depends on the layers before it, the solve of a
+# colour then starts from the first layer its variables move and reuses the layers before it
+# from the unperturbed solve.
+bl0_LayerCache = True
+
+def ResidualStructure(C):
+    # Trail force (True) or node position (False), layer and trail of every target term
+    xx1_Residual = []
+    for int0_Layer, int0_Trail, xx0_Target in C.xx1_TargetNode:
+        xx1_Residual.extend([(False, int0_Layer + 1, int0_Trail)]*3)
+    for int0_Layer, int0_Trail, xx0_Target in C.xx1_TargetVector:
+        xx1_Residual.extend([(True, int0_Layer, int0_Trail)]*2)
+    return xx1_Residual
+
+def VariableReach(C):
+    # Target terms moved by each variable, in the order of db1_Variable in Main(), None for all of them
+    int0_N = C.int0_TrailNumber
+    int0_L = C.int0_LayerCount
+    xx1_Residual = ResidualStructure(C)
+    if len(C.int2_BracingRow) > 0:
+        return [None]*(len(C.int2_Deviation1Edge) + len(C.int1_TrailRow) + len(C.int2_BracingRow) + 3*int0_N)
+    
+    # Trails connected by direct deviations in each row
+    st2_Neighbour = [set(C.int1_DevCol[C.int1_DevRowPtr[r]:C.int1_DevRowPtr[r+1]]) for r in xrange(int0_L*int0_N)]
+    for r in xrange(int0_L*int0_N):
+        for j in st2_Neighbour[r]:
+            st2_Neighbour[(r // int0_N)*int0_N + j].add(r % int0_N)
+    
+    # Start of each variable: trail forces (True) or nodes (False), layer and trails
+    xx1_Start = []
+    for int0_Row, int0_Col in C.int2_Deviation1Edge:
+        xx1_Start.append((True, int0_Row // int0_N, set([int0_Row % int0_N, int0_Col - 3])))
+    for int0_Row in C.int1_TrailRow:
+        xx1_Start.append((False, int0_Row // int0_N + 1, set([int0_Row % int0_N])))
+    for k in range(3):
+        for i in range(int0_N):
+            xx1_Start.append((False, 0, set([i])))
+    
+    xx1_Reach = []
+    for bl0_Force, int0_Layer, st1_Trail in xx1_Start:
+        st1_Node = [set() for g in xrange(int0_L+1)]
+        st1_Force = [set() for g in xrange(int0_L)]
+        if bl0_Force:
+            st1_Force[int0_Layer] = set(st1_Trail)
+        else:
+            st1_Node[int0_Layer] = set(st1_Trail)
+        for g in xrange(min(int0_Layer, int0_L), int0_L):
+            st1_Force[g] |= st1_Node[g]
+            for i in st1_Node[g]:
+                st1_Force[g] |= st2_Neighbour[g*int0_N + i]
+            if g > 0:
+                st1_Force[g] |= st1_Force[g-1]
+            st1_Node[g+1] |= st1_Node[g] | st1_Force[g]
+        st1_Reach = set()
+        for k in xrange(len(xx1_Residual)):
+            bl0_ForceResidual, g, i = xx1_Residual[k]
+            if (bl0_ForceResidual and i in st1_Force[g]) or (not bl0_ForceResidual and i in st1_Node[g]):
+                st1_Reach.add(k)
+        xx1_Reach.append(st1_Reach)
+    return xx1_Reach
+
+def VariableColours(C, db1_BoundUp, db1_BoundLow):
+    # Greedy colouring of the free variables, kept for the bounds of the running optimization
+    bl1_Free = [db1_BoundUp[i] != db1_BoundLow[i] for i in xrange(len(db1_BoundUp))]
+    if C.xx1_ColourCache and C.xx1_ColourCache[0] == bl1_Free:
+        return C.xx1_ColourCache[1], C.xx1_ColourCache[2]
+    xx1_Reach = VariableReach(C)
+    int2_Colour = []
+    st1_ColourReach = []
+    for i in xrange(len(bl1_Free)):
+        if not bl1_Free[i]:
+            continue
+        int0_Colour = -1
+        if xx1_Reach[i] is not None:
+            for c in xrange(len(int2_Colour)):
+                if st1_ColourReach[c] is not None and st1_ColourReach[c].isdisjoint(xx1_Reach[i]):
+                    int0_Colour = c
+                    break
+        if int0_Colour < 0:
+            int2_Colour.append([])
+            st1_ColourReach.append(None if xx1_Reach[i] is None else set())
+            int0_Colour = len(int2_Colour)-1
+        int2_Colour[int0_Colour].append(i)
+        if xx1_Reach[i] is not None:
+            st1_ColourReach[int0_Colour] |= xx1_Reach[i]
+    C.xx1_ColourCache[:] = [bl1_Free, int2_Colour, xx1_Reach]
+    return int2_Colour, xx1_Reach
+
+# Jacobian of the values of the target terms by forward differences around the solve S of
+# db1_Variable, one solve per colour (a column per variable, zero for fixed variables), and
+# the number of solves
+def TermJacobian(C, db1_Variable, S, db1_BoundUp, db1_BoundLow, db0_Dx):
+    db1_Value = [xx0_Term[1] for xx0_Term in SolveTerms(C, db1_Variable, S)]
+    bl0_Prefix = bl0_LayerCache and len(C.int2_BracingRow) == 0
+    if bl0_GroupedDifferences:
+        int2_Colour, xx1_Reach = VariableColours(C, db1_BoundUp, db1_BoundLow)
+    else:
+        int2_Colour = [[i] for i in xrange(len(db1_Variable)) if db1_BoundUp[i] != db1_BoundLow[i]]
+        xx1_Reach = [None]*len(db1_Variable)
+    
+    def Group(c):
+        db1_Step = []
+        db1_VariableDx = list(db1_Variable)
+        for i in int2_Colour[c]:
+            db1_Step.append(db0_Dx if db1_Variable[i] + db0_Dx <= db1_BoundUp[i] else -db0_Dx)
+            db1_VariableDx[i] += db1_Step[-1]
+        xx1_Prefix = S.xx1_Layer[:min([C.int1_VariableLayer[i] for i in int2_Colour[c]])] if bl0_Prefix else []
+        db1_ValueDx = [xx0_Term[1] for xx0_Term in SolveTerms(C, db1_VariableDx, Solve(C, SolveState(C, db1_VariableDx), xx1_Prefix))]
+        xx1_Column = []
+        for a in xrange(len(int2_Colour[c])):
+            st1_Reach = xx1_Reach[int2_Colour[c][a]]
+            xx1_Column.append([(db1_ValueDx[k] - db1_Value[k]) / db1_Step[a] if st1_Reach is None or k in st1_Reach else 0.0 for k in xrange(len(db1_Value))])
+        return xx1_Column
+    
+    if ghparallel:
+        xx2_Column = list(ghparallel.run(Group, range(len(int2_Colour)), False))
+    else:
+        xx2_Column = [Group(c) for c in range(len(int2_Colour))]
+    db2_J = [[0.0]*len(db1_Value) for i in xrange(len(db1_Variable))]
+    for c in xrange(len(int2_Colour)):
+        for a in xrange(len(int2_Colour[c])):
+            db2_J[int2_Colour[c][a]] = xx2_Column[c][a]
+    return db2_J, len(int2_Colour)
+
+# Gradient of the objective from the Jacobian of the target terms (2 sum of w v dv/dx)
+def DifferenceGradient(C, db1_Variable, db1_BoundUp, db1_BoundLow, db0_Dx):
+    S = Solve(C, SolveState(C, db1_Variable))
+    xx1_Term = SolveTerms(C, db1_Variable, S)
+    db2_J = TermJacobian(C, db1_Variable, S, db1_BoundUp, db1_BoundLow, db0_Dx)[0]
+    return [2*sum([xx1_Term[k][0]*xx1_Term[k][1]*db2_J[i][k] for k in xrange(len(xx1_Term))]) for i in xrange(len(db1_Variable))]
+
+
+### LEVENBERG-MARQUARDT
+# Minimizes the sum of squares of SolveResidual() within the bounds of the variables (optimAlgorithm
+# "LM"). The Jacobian of the target terms is taken by grouped forward differences, spread over
+# the cores. A step is projected onto the bounds and only accepted if it lowers the objective,
+# variables held at a bound by the gradient are left out of the step.
+db0_LevenbergDamping = 1e-3
+
+def LevenbergMarquardt(C, db1_Variable, db1_BoundUp, db1_BoundLow, db0_Dx, db0_T, int0_I, bl0_Print = False):
+    int0_V = len(db1_Variable)
+    db1_X = [min(max(db1_Variable[i], db1_BoundLow[i]), db1_BoundUp[i]) for i in xrange(int0_V)]
+    
+    # Residuals: the values of the target terms scaled by the square roots of their weights
+    S = Solve(C, SolveState(C, db1_X))
+    xx1_Term = SolveTerms(C, db1_X, S)
+    db1_Root = TermRoot(xx1_Term)
+    db1_V = [xx0_Term[1] for xx0_Term in xx1_Term]
+    db1_R = [db1_Root[k]*db1_V[k] for k in xrange(len(db1_V))]
+    db0_F = sum([db0_R*db0_R for db0_R in db1_R])
+    db0_Lambda = db0_LevenbergDamping
+    int0_Solve = 1
+    
+    for int0_Iteration in xrange(int0_I):
+        if db0_F == 0:
+            break
+        db2_J, int0_SolveJ = TermJacobian(C, db1_X, S, db1_BoundUp, db1_BoundLow, db0_Dx)
+        db2_J = [[db1_Root[k]*db1_Column[k] for k in xrange(len(db1_R))] for db1_Column in db2_J]
+        int0_Solve += int0_SolveJ
+        db1_G = [sum([db2_J[i][k]*db1_R[k] for k in xrange(len(db1_R))]) for i in xrange(int0_V)]
+        int1_Free = [i for i in xrange(int0_V) if db1_BoundUp[i] != db1_BoundLow[i] and not (db1_X[i] <= db1_BoundLow[i] and db1_G[i] > 0) and not (db1_X[i] >= db1_BoundUp[i] and db1_G[i] < 0)]
+        if not int1_Free:
+            break
+        db2_JTJ = [[sum([db2_J[a][k]*db2_J[b][k] for k in xrange(len(db1_R))]) for b in int1_Free] for a in int1_Free]
+        
+        # Damping scaled by the diagonal, with a floor for variables the targets hardly see
+        db0_Diagonal = max([db2_JTJ[a][a] for a in xrange(len(int1_Free))])
+        db1_Scale = [max(db2_JTJ[a][a], 1e-6*db0_Diagonal) if db0_Diagonal > 0 else 1.0 for a in xrange(len(int1_Free))]
+        
+        # Raise the damping until a step lowers the objective
+        bl0_Accept = False
+        while not bl0_Accept and db0_Lambda < 1e16:
+            db2_A = [db1_Row[:] for db1_Row in db2_JTJ]
+            for a in xrange(len(int1_Free)):
+                db2_A[a][a] += db0_Lambda*db1_Scale[a]
+            db1_Step = SolveLinear(db2_A, [-db1_G[i] for i in int1_Free])
+            if db1_Step is None:
+                db0_Lambda *= 10
+                continue
+            db1_XNew = db1_X[:]
+            for a in xrange(len(int1_Free)):
+                i = int1_Free[a]
+                db1_XNew[i] = min(max(db1_X[i] + db1_Step[a], db1_BoundLow[i]), db1_BoundUp[i])
+            SNew = Solve(C, SolveState(C, db1_XNew))
+            db1_VNew = [xx0_Term[1] for xx0_Term in SolveTerms(C, db1_XNew, SNew)]
+            db1_RNew = [db1_Root[k]*db1_VNew[k] for k in xrange(len(db1_VNew))]
+            int0_Solve += 1
+            db0_FNew = sum([db0_R*db0_R for db0_R in db1_RNew])
+            if db0_FNew < db0_F:
+                bl0_Accept = True
+                db0_Lambda = max(db0_Lambda/10, 1e-12)
+            else:
+                db0_Lambda *= 10
+        if not bl0_Accept:
+            break
+        
+        db0_Decrease = db0_F - db0_FNew
+        db1_X, S, db1_R, db0_F = db1_XNew, SNew, db1_RNew, db0_FNew
+        if bl0_Print:
+            print("\nLM iteration: " + str(int0_Iteration+1) + "\nobjective: " + str(db0_F) + "\nequilibrium solves: " + str(int0_Solve) + "\n\n\n ")
+        if db0_Decrease <= db0_T*(db0_F + db0_Decrease):
+            break
+    return db1_X, db0_F, int0_Solve
+
+### LOAD CASES
+# Solve the structural model for several sets of external forces on the same topology and
+# variables. db3_Load holds one case per entry, one force vector per node in the order of
+# str1_NodeOrderOut. The cases are independent reentrant solves spread over the cores.
+# Deviation forces are set by the design and do not change with the load case, only the
+# trail forces and the reactions are returned per case.
+class loadCases(object):
+    def __repr__(self):
+        return self.ToString()
+
+    def __str__(self):
+        return self.ToString()
+
+    def ToString(self):
+        return "Load Cases\n\ncases: " + str(len(self.db3_NodeOut)) + "\nvertices: " + str(len(self.str1_NodeOrderOut)) + "\ntrail members: " + str(len(self.str1_TrailEdgeOut))
+
+def SolveLoadCase(C, db1_Variable, db2_Load):
+    S = SolveState(C, db1_Variable)
+    S.db2_Load = [(float(db1_Load[0]), float(db1_Load[1]), float(db1_Load[2])) for db1_Load in db2_Load]
+    return SolveOutput(C, Solve(C, S))
+
+# Node positions, signed trail forces and reactions of a solve as in the output of Main()
+def SolveOutput(C, S):
+    int0_N = C.int0_TrailNumber
+    S.db2_NodeOut = [S.db2_Origin[i] for i in xrange(int0_N)]
+    S.db1_TrailEdgeOut = []
+    for g in xrange(C.int0_LayerCount):
+        AL = S.xx1_Layer[g]
+        if g != C.int0_LayerCount-1:
+            S.db2_NodeOut.extend(AL.db2_NodeOut)
+        for i in xrange(int0_N):
+            db0_Length = S.db1_TrailLength[g*int0_N + i]
+            if AL.xx2_Plane[i] is not None:
+                db0_Length = AL.xx2_Plane[i][0]
+            if db0_Length > 0.0:
+                S.db1_TrailEdgeOut.append(AL.db1_TrailForceLength[i])
+            elif db0_Length < 0.0:
+                S.db1_TrailEdgeOut.append(-AL.db1_TrailForceLength[i])
+            else:
+                S.db1_TrailEdgeOut.append(0.0)
+    S.db1_TrailEdgeOut = S.db1_TrailEdgeOut[:len(C.str1_TrailEdgeID)]
+    S.db2_ReactionOut = S.xx1_Layer[-1].db2_TrailForce
+    
+    # Load path: sum of absolute force times length over the trail and deviation members
+    S.db0_LoadPathOut = 0.0
+    for k in xrange(len(S.db1_TrailEdgeOut)):
+        S.db0_LoadPathOut += abs(S.db1_TrailEdgeOut[k])*NodeDistance(S.db2_NodeOut[k], S.db2_NodeOut[k + int0_N])
+    for k in xrange(len(C.int2_Deviation1Edge)):
+        int0_Row, int0_Col = C.int2_Deviation1Edge[k]
+        int0_Other = (int0_Row // int0_N)*int0_N + int0_Col - 3
+        S.db0_LoadPathOut += abs(S.db1_Deviation[C.int2_Deviation1Position[k][0]])*NodeDistance(S.db2_NodeOut[int0_Row], S.db2_NodeOut[int0_Other])
+    for b in xrange(len(S.db1_BracingValue)):
+        int0_Start, int0_End = C.int2_BracingRow[b]
+        S.db0_LoadPathOut += abs(S.db1_BracingValue[b])*NodeDistance(S.db2_NodeOut[int0_Start], S.db2_NodeOut[int0_End])
+    return S
+
+def NodeDistance(db1_P, db1_Q):
+    return math.sqrt((db1_Q[0]-db1_P[0])**2 + (db1_Q[1]-db1_P[1])**2 + (db1_Q[2]-db1_P[2])**2)
+
+def SolveLoadCases(C, db3_Load, db1_Variable):
+    def Case(c):
+        return SolveLoadCase(C, db1_Variable, db3_Load[c])
+
+    if ghparallel:
+        xx1_Case = list(ghparallel.run(Case, range(len(db3_Load)), False))
+    else:
+        xx1_Case = [Case(c) for c in range(len(db3_Load))]
+
+    LC = loadCases()
+    LC.str1_NodeOrderOut = C.str1_NodeOrder
+    LC.str1_TrailEdgeOut = C.str1_TrailEdgeID
+    LC.db3_NodeOut = [S.db2_NodeOut for S in xx1_Case]
+    LC.db2_TrailEdgeOut = [S.db1_TrailEdgeOut for S in xx1_Case]
+    LC.db3_ReactionOut = [S.db2_ReactionOut for S in xx1_Case]
+
+    # Force envelopes across the cases
+    LC.db1_TrailEdgeMinOut = []
+    LC.db1_TrailEdgeMaxOut = []
+    if len(xx1_Case) > 0:
+        LC.db1_TrailEdgeMinOut = [min(db1_Force) for db1_Force in zip(*LC.db2_TrailEdgeOut)]
+        LC.db1_TrailEdgeMaxOut = [max(db1_Force) for db1_Force in zip(*LC.db2_TrailEdgeOut)]
+    return LC
+
+
+### DESIGN POPULATION
+# Solve many variable vectors of the optimization (rows of db2_Variable, same order as the
+# variables of Main()) on the same topology, e.g. for design space exploration or to build
+# training data. Each design is a reentrant solve without the form diagram, spread over the cores.
+class designs(object):
+    def __repr__(self):
+        return self.ToString()
+
+    def __str__(self):
+        return self.ToString()
+
+    def ToString(self):
+        return "Designs\n\ndesigns: " + str(len(self.db3_NodeOut)) + "\nvariables: " + str(self.int0_VariableCount) + "\nvertices: " + str(len(self.str1_NodeOrderOut))
+
+def SolveDesigns(C, db2_Variable):
+    def Design(b):
+        S = SolveOutput(C, Solve(C, SolveState(C, list(db2_Variable[b]))))
+        S.db0_ObjectiveOut = SolveObjective(C, None, S) if C.bl0_Target else None
+        return S
+
+    if ghparallel:
+        xx1_Design = list(ghparallel.run(Design, range(len(db2_Variable)), False))
+    else:
+        xx1_Design = [Design(b) for b in range(len(db2_Variable))]
+
+    D = designs()
+    D.int0_VariableCount = len(db2_Variable[0]) if len(db2_Variable) > 0 else 0
+    D.str1_NodeOrderOut = C.str1_NodeOrder
+    D.str1_TrailEdgeOut = C.str1_TrailEdgeID
+    D.db3_NodeOut = [S.db2_NodeOut for S in xx1_Design]
+    D.db2_TrailEdgeOut = [S.db1_TrailEdgeOut for S in xx1_Design]
+    D.db3_ReactionOut = [S.db2_ReactionOut for S in xx1_Design]
+    D.db1_ObjectiveOut = [S.db0_ObjectiveOut for S in xx1_Design]
+    D.db1_LoadPathOut = [S.db0_LoadPathOut for S in xx1_Design]
+    return D
+
+
+### SIGN SYMMETRY
+# Permutations of the trails that map the topology onto itself when the signs are ignored:
+# same loads, same absolute trail lengths and deviation magnitudes, and origin nodes related
+# by an isometry that keeps the load directions. Two sign combinations related by such a
+# permutation give congruent forms with the same load path. Each permutation is returned on
+# the sign variables, the deviation and trail entries at the start of the variables of Main().
+# With constraint planes only the identity is returned.
+db0_SymmetryTolerance = 1e-9
+
+def SignVariableCount(C):
+    return len(C.int2_Deviation1Edge) + len(C.int1_TrailRow) + len(C.int2_BracingRow)
+
+def TrailSymmetry(C, S):
+    int0_N = C.int0_TrailNumber
+    
+    # Deviation magnitude of the entry (row, trail within the layer), zero if there is none
+    def Deviation(int0_Row, j):
+        p = C.dc1_DevPosition.get((int0_Row, j), -1)
+        return S.db1_Deviation[p] if p >= 0 else 0.0
+    
+    # Directions kept by the isometry: the loads and the self weight
+    db2_Direction = []
+    for db1_Load in S.db2_Load:
+        db0_F = math.sqrt(db1_Load[0]**2 + db1_Load[1]**2 + db1_Load[2]**2)
+        if db0_F > db0_SymmetryTolerance:
+            db2_Direction.append([db1_Load[0]/db0_F, db1_Load[1]/db0_F, db1_Load[2]/db0_F])
+    if C.db0_SelfWeight is not None:
+        db2_Direction.append([0.0, 0.0, 1.0])
+    
+    dc1_Bracing = {}
+    for b in xrange(len(C.int2_BracingRow)):
+        dc1_Bracing[frozenset(C.int2_BracingRow[b])] = abs(S.db1_BracingValue[b])
+    
+    def Same(db0_A, db0_B):
+        return abs(db0_A - db0_B) <= db0_SymmetryTolerance*max(1.0, abs(db0_A), abs(db0_B))
+    
+    def Fits(int1_Perm, i):
+        # Trail i mapped to int1_Perm[i], checked against the trails assigned before
+        int0_Image = int1_Perm[i]
+        for g in xrange(C.int0_LayerCount):
+            db1_Load = S.db2_Load[g*int0_N + i]
+            db1_Image = S.db2_Load[g*int0_N + int0_Image]
+            if not (Same(db1_Load[0], db1_Image[0]) and Same(db1_Load[1], db1_Image[1]) and Same(db1_Load[2], db1_Image[2])):
+                return False
+            if not Same(abs(S.db1_TrailLength[g*int0_N + i]), abs(S.db1_TrailLength[g*int0_N + int0_Image])):
+                return False
+            for j in xrange(i + 1):
+                if not Same(abs(Deviation(g*int0_N + i, j)), abs(Deviation(g*int0_N + int0_Image, int1_Perm[j]))) or not Same(abs(Deviation(g*int0_N + j, i)), abs(Deviation(g*int0_N + int1_Perm[j], int0_Image))):
+                    return False
+        for j in xrange(i + 1):
+            db1_D = [S.db2_Origin[j][k] - S.db2_Origin[i][k] for k in xrange(3)]
+            db1_DImage = [S.db2_Origin[int1_Perm[j]][k] - S.db2_Origin[int0_Image][k] for k in xrange(3)]
+            if not Same(sum([db1_D[k]**2 for k in xrange(3)]), sum([db1_DImage[k]**2 for k in xrange(3)])):
+                return False
+            for db1_Direction in db2_Direction:
+                if not Same(sum([db1_D[k]*db1_Direction[k] for k in xrange(3)]), sum([db1_DImage[k]*db1_Direction[k] for k in xrange(3)])):
+                    return False
+        return True
+    
+    # Backtracking over the assignments of the trails
+    int2_Perm = []
+    int1_Perm = []
+    def Assign(i):
+        if i == int0_N:
+            int2_Perm.append(int1_Perm[:])
+            return
+        for int0_Image in xrange(int0_N):
+            if int0_Image in int1_Perm:
+                continue
+            int1_Perm.append(int0_Image)
+            if Fits(int1_Perm, i):
+                Assign(i + 1)
+            int1_Perm.pop()
+    if not C.pl1_ConstraintPlane:
+        Assign(0)
+    
+    # Keep the permutations that also map the indirect deviations onto each other
+    int2_Symmetry = []
+    for int1_Trail in int2_Perm:
+        def Row(int0_Row):
+            return (int0_Row // int0_N)*int0_N + int1_Trail[int0_Row % int0_N]
+        if all([frozenset([Row(a) for a in key]) in dc1_Bracing and Same(dc1_Bracing[key], dc1_Bracing[frozenset([Row(a) for a in key])]) for key in dc1_Bracing]):
+            int2_Symmetry.append(int1_Trail)
+    if [i for i in xrange(int0_N)] not in int2_Symmetry:
+        int2_Symmetry.insert(0, [i for i in xrange(int0_N)])
+    return int2_Symmetry
+
+def SignSymmetry(C, db1_Variable):
+    int0_N = C.int0_TrailNumber
+    dc1_Deviation1 = {}
+    for k in xrange(len(C.int2_Deviation1Edge)):
+        int0_Row, int0_Col = C.int2_Deviation1Edge[k]
+        dc1_Deviation1[(int0_Row // int0_N, frozenset([int0_Row % int0_N, int0_Col - 3]))] = k
+    dc1_Trail = {}
+    for k in xrange(len(C.int1_TrailRow)):
+        dc1_Trail[C.int1_TrailRow[k]] = k
+    dc1_Bracing = {}
+    for b in xrange(len(C.int2_BracingRow)):
+        dc1_Bracing[frozenset(C.int2_BracingRow[b])] = b
+    
+    int2_Sign = []
+    for int1_Trail in TrailSymmetry(C, SolveState(C, db1_Variable)):
+        def Row(int0_Row):
+            return (int0_Row // int0_N)*int0_N + int1_Trail[int0_Row % int0_N]
+        int1_Sign = []
+        for int0_Row, int0_Col in C.int2_Deviation1Edge:
+            int1_Sign.append(dc1_Deviation1[(int0_Row // int0_N, frozenset([int1_Trail[int0_Row % int0_N], int1_Trail[int0_Col - 3]]))])
+        for int0_Row in C.int1_TrailRow:
+            int1_Sign.append(len(C.int2_Deviation1Edge) + dc1_Trail[Row(int0_Row)])
+        for int0_Start, int0_End in C.int2_BracingRow:
+            int1_Sign.append(len(C.int2_Deviation1Edge) + len(C.int1_TrailRow) + dc1_Bracing[frozenset([Row(int0_Start), Row(int0_End)])])
+        int2_Sign.append(int1_Sign)
+    return int2_Sign
+
+
 pt2_Trails = []
 
 
@@ -973,33 +2381,37 @@ M = model()
 
 
 
-if TPC and hasattr(TPC,"db1_StructuralBehaviourOut"):
+if bl0_Topology:
 
     vc2_GlobTrailForce = []
-    ln2_GlobExtEdge = []
     pt2_GlobNode = []
     pt2_GlobNodeIteration = []
-    ln2_GlobTrailEdge = []
-    cl2_GlobTrailEdge = []
-    db2_GlobTrailEdge = []
-    ln2_GlobDeviation1Edge = []
-    cl2_GlobDeviation1Edge = []
-    db2_GlobDeviation1Edge = []
-    ln2_GlobDeviation2Edge = []
-    cl2_GlobDeviation2Edge = []
-    db2_GlobDeviation2Edge = []
-    ln2_GlobExtFOEdge = []
-    cl2_GlobExtFOEdge = []
-    db2_GlobExtFOEdge = []
-    
-    
-    db1_StructuralBehaviour = TPC.db1_StructuralBehaviourOut
-    str1_NodeOrderC = TPC.str1_NodeOrderOut
-    xx1_Bracing = TPC.db1_DeviationIndirectOut
+    int2_GlobTrailSign = []
+    vc2_GlobSelfWeight = []
+    
+    
+    str1_NodeOrderC = list(TPC.str1_NodeOrderOut)
+    if hasattr(TPC, "int1_NodeOrderOut"):
+        int1_NodeOrderC = list(TPC.int1_NodeOrderOut)
+        bl1_NodePadding = list(TPC.bl1_NodePaddingOut)
+    else:
+        int1_NodeOrderC = [IndexID(str0_NodeOrderC.lstrip("L")) for str0_NodeOrderC in str1_NodeOrderC]
+        bl1_NodePadding = [str0_NodeOrderC[0] == "L" for str0_NodeOrderC in str1_NodeOrderC]
+    xx1_Bracing = list(TPC.db1_DeviationIndirectOut)
     pl1_ConstraintPlane = TPC.pl1_ConstraintPlaneOut
     id_NodePlane = TPC.int1_ConstraintPlaneOut
-    pt1_OriginNode = TPC.pt1_OriginNodeOut
-    str1_Edge = TPC.str1_EdgeOut
+    pt1_OriginNode = list(TPC.pt1_OriginNodeOut)
+    str1_Edge = list(TPC.str1_EdgeOut)
+    
+    # Index Maps, row of every node and constraint planes of every row
+    int1_NodeRow = IndexMap(int1_NodeOrderC, bl1_NodePadding)
+    int2_NodePlane = IndexLists(id_NodePlane) if id_NodePlane else []
+    int2_RowPlane = []
+    for int0_Row in xrange(len(int1_NodeOrderC)):
+        if bl1_NodePadding[int0_Row] or int1_NodeOrderC[int0_Row] >= len(int2_NodePlane):
+            int2_RowPlane.append([])
+        else:
+            int2_RowPlane.append(int2_NodePlane[int1_NodeOrderC[int0_Row]])
     
     # Counters and Tolerance
     int0_Counter = 0
@@ -1010,34 +2422,34 @@ if TPC and hasattr(TPC,"db1_StructuralBehaviourOut"):
     db1_VariableBest = []
 
     if len(xx1_Bracing) == 0: int0_CounterBracing = 1
+    
+    dc2_BracingStart, dc2_BracingEnd = BracingIncidence(xx1_Bracing)
 
     int0_TrailNumber = len(pt1_OriginNode)  # input nodes
-    int0_C = 3+int0_TrailNumber+1
-    int0_R = int(len(db1_StructuralBehaviour)/int0_C)
-    db2_StructuralBehaviour = ListToListList(db1_StructuralBehaviour, int0_R, int0_C)
-    int0_LayerCount = int(len(db2_StructuralBehaviour)/int0_TrailNumber) # amount of layers
+    int0_LayerCount = int(len(str1_NodeOrderC)/int0_TrailNumber) # amount of layers
     
     
     # Variables for Optimization
     
-    # Deviation 1
+    # Deviation 1, as (row, column of the dense matrix) and positions of its two entries
     int2_Deviation1Edge = []
+    int2_Deviation1Position = []
     db1_Deviation1Edge = []
     for g in xrange(int0_LayerCount):
-        k = 3
         for i in xrange(g*int0_TrailNumber,(g+1)*int0_TrailNumber):
-            k += 1
-            for j in xrange(k,int0_TrailNumber+3):
-                if db2_StructuralBehaviour[i][j] != 0:
-                    int2_Deviation1Edge.append((i,j))
-                    db1_Deviation1Edge.append(db2_StructuralBehaviour[i][j])
+            for p in xrange(int1_DevRowPtr[i], int1_DevRowPtr[i+1]):
+                int0_Col = int1_DevCol[p]
+                if int0_Col > i % int0_TrailNumber and db1_DevValue[p] != 0:
+                    int2_Deviation1Edge.append((i,int0_Col + 3))
+                    int2_Deviation1Position.append((p, int1_DevTranspose[p]))
+                    db1_Deviation1Edge.append(db1_DevValue[p])
     # Trail
     int2_TrailEdge = []
     db1_TrailEdge = []
     for g in xrange(int0_LayerCount-1):
         for i in xrange(int0_TrailNumber):
             int2_TrailEdge.append([g*int0_TrailNumber + i,int0_TrailNumber+3]) 
-            db1_TrailEdge.append(db2_StructuralBehaviour[g*int0_TrailNumber + i][int0_TrailNumber+3])
+            db1_TrailEdge.append(db1_RowTrailLength[g*int0_TrailNumber + i])
 
     # Deviation 2
     db1_Deviation2Edge = []
@@ -1050,38 +2462,45 @@ if TPC and hasattr(TPC,"db1_StructuralBehaviourOut"):
     db1_OriginNodeZ = [pt0_OriginNode.Z for pt0_OriginNode in pt1_OriginNode]
 
     int0_CounterOpt = 0
-    print "Iteration report\n\n "
+    print("Iteration report\n\n ")
+    
+    # Topology, targets and variables for the reentrant solves, before the variables change the matrix
+    SC = SolveContext()
+    M.SC = SC
 
     # Calculate gradient
     def Grad(var, grad):
-        if grad:
-            global db0_Dx
-            fX_0 = Main(db1_StructuralBehaviour, str1_NodeOrderC, xx1_Bracing, pl1_ConstraintPlane, id_NodePlane, pt1_OriginNode, str1_Edge, db0_Divergence, db0_Threshold, int0_CounterBracing, int0_TrailNumber, int0_C, int0_R, db2_StructuralBehaviour, int0_LayerCount, var, False)
-            for i in range(len(var)):
-                varDx = var[:]
-                varDx[i] += db0_Dx
-                if db1_BoundUp[i] != db1_BoundLow[i]:
-                    fX_1 = Main(db1_StructuralBehaviour, str1_NodeOrderC, xx1_Bracing, pl1_ConstraintPlane, id_NodePlane, pt1_OriginNode, str1_Edge, db0_Divergence, db0_Threshold, int0_CounterBracing, int0_TrailNumber, int0_C, int0_R, db2_StructuralBehaviour, int0_LayerCount, varDx, False)
-                    dfX_1 = (fX_1 - fX_0) / db0_Dx
-                else: dfX_1 = 0.0 
-                grad[i] = dfX_1
-        out = Main(db1_StructuralBehaviour, str1_NodeOrderC, xx1_Bracing, pl1_ConstraintPlane, id_NodePlane, pt1_OriginNode, str1_Edge, db0_Divergence, db0_Threshold, int0_CounterBracing, int0_TrailNumber, int0_C, int0_R, db2_StructuralBehaviour, int0_LayerCount, var, True)
+        global db0_Dx
+        if not grad:
+            return MainMemo(str1_NodeOrderC, xx1_Bracing, pl1_ConstraintPlane, id_NodePlane, pt1_OriginNode, str1_Edge, db0_Divergence, db0_Threshold, int0_CounterBracing, int0_TrailNumber, int0_LayerCount, var, True)
+        if bl0_AdjointGradient:
+            out = MainMemo(str1_NodeOrderC, xx1_Bracing, pl1_ConstraintPlane, id_NodePlane, pt1_OriginNode, str1_Edge, db0_Divergence, db0_Threshold, int0_CounterBracing, int0_TrailNumber, int0_LayerCount, var, True)
+            db3_NodePrev = [[[pt0_Node.X, pt0_Node.Y, pt0_Node.Z] for pt0_Node in pt2_GlobNodeIteration[g]] for g in xrange(int0_LayerCount+1)]
+            db1_Gradient = AdjointGradient(SC, list(var), db3_NodePrev)
+        else:
+            db1_Gradient = DifferenceGradient(SC, list(var), db1_BoundUp, db1_BoundLow, db0_Dx)
+            out = MainMemo(str1_NodeOrderC, xx1_Bracing, pl1_ConstraintPlane, id_NodePlane, pt1_OriginNode, str1_Edge, db0_Divergence, db0_Threshold, int0_CounterBracing, int0_TrailNumber, int0_LayerCount, var, True)
+        for i in range(len(var)):
+            if db1_BoundUp[i] != db1_BoundLow[i]:
+                grad[i] = db1_Gradient[i]
+            else: grad[i] = 0.0
         return out
 
     # Optimization function
     def Optimization(db1_InitialValues, db1_BoundUp, db1_BoundLow, db0_T, int0_I, nl0_Algo):
+        global bl0_Lean
+        bl0_Lean = bl0_LeanOptimization
         solver = nl.NLoptSolver(nl0_Algo, len(db1_InitialValues), db0_T, int0_I)
         solver.SetLowerBounds(Array[float]( db1_BoundLow ))
         solver.SetUpperBounds(Array[float]( db1_BoundUp ))
         solver.SetMinObjective.Overloads[Func[Array[float], Array[float], float]](Grad)
         initialValue = Array[float](db1_InitialValues)
         out, finalScore = solver.Optimize(initialValue)
+        bl0_Lean = False
         return finalScore
     
-    global str0_GlobSolver
-    str0_GlobSolver = "None"
-    
-    if O and (hasattr(O, "targetNode") and hasattr(O, "targetNodeID") or hasattr(O, "targetVector") and hasattr(O, "targetVectorID")):
+    # Initial values and bounds of the variables from the bounds of the optimization settings
+    def VariableBounds(O):
         int1_T_ID = O.boundsTrailID
         db1_T_Up = O.boundsTrailUp
         db1_T_Low = O.boundsTrailLow
@@ -1097,70 +2516,48 @@ if TPC and hasattr(TPC,"db1_StructuralBehaviourOut"):
         db1_O_LowY = O.boundsOriginNodeLowY
         db1_O_UpZ = O.boundsOriginNodeUpZ
         db1_O_LowZ = O.boundsOriginNodeLowZ
-        
-        global db0_Dx
-        db0_Dx = O.gradientDelta
-        db0_T = O.relativeTolerance
-        int0_I = O.maxIterations
-        str0_A = O.optimAlgorithm
-        str0_GlobSolver = str0_A
-
-        dc1_Algo = {"LD_SLSQP" : nl.NLoptAlgorithm.LD_SLSQP,
-                    "LN_BOBYQA" : nl.NLoptAlgorithm.LN_BOBYQA,
-                    "GD_MLSL" : nl.NLoptAlgorithm.GD_MLSL,
-                    "LD_LBFGS" : nl.NLoptAlgorithm.LD_LBFGS,
-                    "LD_AUGLAG" : nl.NLoptAlgorithm.LD_AUGLAG,
-                    "LN_SBPLX" : nl.NLoptAlgorithm.LN_SBPLX,
-                    "LN_COBYLA" : nl.NLoptAlgorithm.LN_COBYLA,
-                    "LD_TNEWTON" : nl.NLoptAlgorithm.LD_TNEWTON,
-                    "GN_ISRES" : nl.NLoptAlgorithm.GN_ISRES,
-                    "GN_MLSL" : nl.NLoptAlgorithm.GN_MLSL}
-
 
         db1_TrailBoundUp = db1_TrailEdge[:]
-
-        for i in range(len(int1_T_ID)):
-            if str(int1_T_ID[i]) in str1_TrailEdgeID: db1_TrailBoundUp[ str1_TrailEdgeID.index(str(int1_T_ID[i])) ] += db1_T_Up[i]
         db1_TrailBoundLow = db1_TrailEdge[:]
+        int1_TrailIndex = IndexMap(str1_TrailEdgeID)
         for i in range(len(int1_T_ID)):
-            if str(int1_T_ID[i]) in str1_TrailEdgeID: db1_TrailBoundLow[ str1_TrailEdgeID.index(str(int1_T_ID[i])) ] += db1_T_Low[i]
+            int0_Index = IndexOf(int1_TrailIndex, int1_T_ID[i])
+            if int0_Index >= 0:
+                db1_TrailBoundUp[int0_Index] += db1_T_Up[i]
+                db1_TrailBoundLow[int0_Index] += db1_T_Low[i]
 
         db1_Deviation1BoundUp = db1_Deviation1Edge[:]
-        for i in range(len(int1_D_ID)):
-            if str(int1_D_ID[i]) in str1_Dev1EdgeID: db1_Deviation1BoundUp[ str1_Dev1EdgeID.index(str(int1_D_ID[i])) ] += db1_D_Up[i]
         db1_Deviation1BoundLow = db1_Deviation1Edge[:]
-        for i in range(len(int1_D_ID)):
-           if str(int1_D_ID[i]) in str1_Dev1EdgeID: db1_Deviation1BoundLow[ str1_Dev1EdgeID.index(str(int1_D_ID[i])) ] += db1_D_Low[i]
-
         db1_Deviation2BoundUp = db1_Deviation2Edge[:]
-        for i in range(len(int1_D_ID)):
-            if str(int1_D_ID[i]) in str1_Dev2EdgeID: db1_Deviation2BoundUp[ str1_Dev2EdgeID.index(str(int1_D_ID[i])) ] += db1_D_Up[i]
         db1_Deviation2BoundLow = db1_Deviation2Edge[:]
+        int1_Dev1Index = IndexMap(str1_Dev1EdgeID)
+        int1_Dev2Index = IndexMap(str1_Dev2EdgeID)
         for i in range(len(int1_D_ID)):
-            if str(int1_D_ID[i]) in str1_Dev2EdgeID: db1_Deviation2BoundLow[ str1_Dev2EdgeID.index(str(int1_D_ID[i])) ] += db1_D_Low[i]
+            int0_Index = IndexOf(int1_Dev1Index, int1_D_ID[i])
+            if int0_Index >= 0:
+                db1_Deviation1BoundUp[int0_Index] += db1_D_Up[i]
+                db1_Deviation1BoundLow[int0_Index] += db1_D_Low[i]
+            int0_Index = IndexOf(int1_Dev2Index, int1_D_ID[i])
+            if int0_Index >= 0:
+                db1_Deviation2BoundUp[int0_Index] += db1_D_Up[i]
+                db1_Deviation2BoundLow[int0_Index] += db1_D_Low[i]
 
         db1_OriginNodeXBoundUp = db1_OriginNodeX[:]
-        str1_OriginNode = str1_NodeOrderC[:len(pt1_OriginNode)]
-        for i in range(len(str1_OriginNode)):
-            str1_OriginNode[i] = str1_OriginNode[i].replace("L","")
-
-        for i in range(len(int1_O_ID)):
-            if str(int1_O_ID[i]) in str1_OriginNode: db1_OriginNodeXBoundUp[ str1_OriginNode.index(str(int1_O_ID[i])) ] += db1_O_UpX[i]
         db1_OriginNodeXBoundLow = db1_OriginNodeX[:]
-        for i in range(len(int1_O_ID)):
-            if str(int1_O_ID[i]) in str1_OriginNode: db1_OriginNodeXBoundLow[ str1_OriginNode.index(str(int1_O_ID[i])) ] += db1_O_LowX[i]
         db1_OriginNodeYBoundUp = db1_OriginNodeY[:]
-        for i in range(len(int1_O_ID)):
-            if str(int1_O_ID[i]) in str1_OriginNode: db1_OriginNodeYBoundUp[ str1_OriginNode.index(str(int1_O_ID[i])) ] += db1_O_UpY[i]
         db1_OriginNodeYBoundLow = db1_OriginNodeY[:]
-        for i in range(len(int1_O_ID)):
-            if str(int1_O_ID[i]) in str1_OriginNode: db1_OriginNodeYBoundLow[ str1_OriginNode.index(str(int1_O_ID[i])) ] += db1_O_LowY[i]
         db1_OriginNodeZBoundUp = db1_OriginNodeZ[:]
-        for i in range(len(int1_O_ID)):
-            if str(int1_O_ID[i]) in str1_OriginNode: db1_OriginNodeZBoundUp[ str1_OriginNode.index(str(int1_O_ID[i])) ] += db1_O_UpZ[i]
         db1_OriginNodeZBoundLow = db1_OriginNodeZ[:]
+        int1_OriginIndex = IndexMap(int1_NodeOrderC[:len(pt1_OriginNode)])
         for i in range(len(int1_O_ID)):
-            if str(int1_O_ID[i]) in str1_OriginNode: db1_OriginNodeZBoundLow[ str1_OriginNode.index(str(int1_O_ID[i])) ] += db1_O_LowZ[i]
+            int0_Index = IndexOf(int1_OriginIndex, int1_O_ID[i])
+            if int0_Index >= 0:
+                db1_OriginNodeXBoundUp[int0_Index] += db1_O_UpX[i]
+                db1_OriginNodeXBoundLow[int0_Index] += db1_O_LowX[i]
+                db1_OriginNodeYBoundUp[int0_Index] += db1_O_UpY[i]
+                db1_OriginNodeYBoundLow[int0_Index] += db1_O_LowY[i]
+                db1_OriginNodeZBoundUp[int0_Index] += db1_O_UpZ[i]
+                db1_OriginNodeZBoundLow[int0_Index] += db1_O_LowZ[i]
 
         # Define Initial Values for Optimization
         db1_InitialValues = []
@@ -1186,9 +2583,61 @@ if TPC and hasattr(TPC,"db1_StructuralBehaviourOut"):
         db1_BoundLow.extend(db1_OriginNodeXBoundLow[:])
         db1_BoundLow.extend(db1_OriginNodeYBoundLow[:])
         db1_BoundLow.extend(db1_OriginNodeZBoundLow[:])
+        return db1_InitialValues, db1_BoundUp, db1_BoundLow
+    
+    global str0_GlobSolver
+    str0_GlobSolver = "None"
+    str0_GlobDivergence = ""
+    str0_GlobConvergence = ""
+    
+    if O and getattr(O, "optimAlgorithm", None) == "LM" and (hasattr(O, "targetNode") and hasattr(O, "targetNodeID") or hasattr(O, "targetVector") and hasattr(O, "targetVectorID")):
+        
+        # Levenberg-Marquardt on the residuals, also without NLoptNet
+        if targetVectorCoeffMag < 0 or targetVectorCoeffDir < 0:
+            raise ValueError("optimAlgorithm LM needs non-negative targetVectorCoeffMag and targetVectorCoeffDir")
+        str0_GlobSolver = "LM"
+        db1_InitialValues, db1_BoundUp, db1_BoundLow = VariableBounds(O)
+        db1_VariableLM, db0_DistanceLM, int0_SolveLM = LevenbergMarquardt(SC, db1_InitialValues, db1_BoundUp, db1_BoundLow, O.gradientDelta, O.relativeTolerance, O.maxIterations, True)
+        M.int0_SolveCountOut = int0_SolveLM
+        
+        MainMemo(str1_NodeOrderC, xx1_Bracing, pl1_ConstraintPlane, id_NodePlane, pt1_OriginNode, str1_Edge, db0_Divergence, db0_Threshold, int0_CounterBracing, int0_TrailNumber, int0_LayerCount, db1_VariableLM, True)
+    elif nl and O and (hasattr(O, "targetNode") and hasattr(O, "targetNodeID") or hasattr(O, "targetVector") and hasattr(O, "targetVectorID")):
+        
+        global db0_Dx
+        db0_Dx = O.gradientDelta
+        db0_T = O.relativeTolerance
+        int0_I = O.maxIterations
+        str0_A = O.optimAlgorithm
+        str0_GlobSolver = str0_A
+
+        dc1_Algo = {"LD_SLSQP" : nl.NLoptAlgorithm.LD_SLSQP,
+                    "LN_BOBYQA" : nl.NLoptAlgorithm.LN_BOBYQA,
+                    "GD_MLSL" : nl.NLoptAlgorithm.GD_MLSL,
+                    "LD_LBFGS" : nl.NLoptAlgorithm.LD_LBFGS,
+                    "LD_AUGLAG" : nl.NLoptAlgorithm.LD_AUGLAG,
+                    "LN_SBPLX" : nl.NLoptAlgorithm.LN_SBPLX,
+                    "LN_COBYLA" : nl.NLoptAlgorithm.LN_COBYLA,
+                    "LD_TNEWTON" : nl.NLoptAlgorithm.LD_TNEWTON,
+                    "GN_ISRES" : nl.NLoptAlgorithm.GN_ISRES,
+                    "GN_MLSL" : nl.NLoptAlgorithm.GN_MLSL}
+
+
+        db1_InitialValues, db1_BoundUp, db1_BoundLow = VariableBounds(O)
 
         Optimization(db1_InitialValues, db1_BoundUp, db1_BoundLow, db0_T, int0_I, dc1_Algo[str0_A])
         
-        Main(db1_StructuralBehaviour, str1_NodeOrderC, xx1_Bracing, pl1_ConstraintPlane, id_NodePlane, pt1_OriginNode, str1_Edge, db0_Divergence, db0_Threshold, int0_CounterBracing, int0_TrailNumber, int0_C, int0_R, db2_StructuralBehaviour, int0_LayerCount, db1_VariableBest, True)
+        MainMemo(str1_NodeOrderC, xx1_Bracing, pl1_ConstraintPlane, id_NodePlane, pt1_OriginNode, str1_Edge, db0_Divergence, db0_Threshold, int0_CounterBracing, int0_TrailNumber, int0_LayerCount, db1_VariableBest, True)
     else:
-        Main(db1_StructuralBehaviour, str1_NodeOrderC, xx1_Bracing, pl1_ConstraintPlane, id_NodePlane, pt1_OriginNode, str1_Edge, db0_Divergence, db0_Threshold, int0_CounterBracing, int0_TrailNumber, int0_C, int0_R, db2_StructuralBehaviour, int0_LayerCount, [], True)
+        Main(str1_NodeOrderC, xx1_Bracing, pl1_ConstraintPlane, id_NodePlane, pt1_OriginNode, str1_Edge, db0_Divergence, db0_Threshold, int0_CounterBracing, int0_TrailNumber, int0_LayerCount, [], True)
+    
+    # Solver and convergence for the description of the model
+    M.str0_SolverOut = str0_GlobSolver
+    M.str0_DivergenceOut = str0_GlobDivergence
+    M.str0_ConvergenceOut = str0_GlobConvergence
+    
+    # Variables and their bounds, e.g. for sampling the design space
+    M.db1_VariableOut = db1_Deviation1Edge + db1_TrailEdge + [float(db0_Value) for db0_Value in db1_Deviation2Edge] + db1_OriginNodeX + db1_OriginNodeY + db1_OriginNodeZ
+    if O and hasattr(O, "boundsTrailID"):
+        M.db1_VariableOut, M.db1_BoundUpOut, M.db1_BoundLowOut = VariableBounds(O)
+    if len(db1_VariableBest) > 0:
+        M.db1_VariableOut = list(db1_VariableBest)
@@ -0,0 +1,136 @@
+"""
+Enumerate the sign combinations of a structural model
+    Remarks:
+        Flips the signs of the trail lengths and deviation force magnitudes of a structural model
+        (tension/compression of the members) and solves every combination with model.SolveDesigns().
+        Combinations that are mapped onto each other by a symmetry of the topology give congruent
+        forms, only the smallest combination of each group is solved. The combinations are ranked
+        by a metric (load path by default, lower is better) and only the best K are kept.
+"""
+
+__author__    = ['Patrick Ole Ohlbrock','Pierluigi D''Acunto' ]
+__copyright__ = 'Copyright 2019 - Chair of Structural Design, ETH Zurich'
+__license__   = 'MIT License'
+__email__     = 'ohlbrock@arch.ethz.ch'
+__version__   = "1.80"
+
+"""
+If you use the CEM library in a project, please refer to the GitHub repository:
+
+@Misc{cem2019,
+author = {Ohlbrock, Patrick Ole and D'Acunto, Pierluigi},
+title = {{CEM: Combinatorial Equilibrium Modeling}},
+year = {2019},
+note = {Release 1.80},
+url = { http://github.com/OleOhlbrock/CEM },
+}
+
+"""
+
+import heapq
+import itertools
+
+
+class combinations(object):
+    def __repr__(self):
+        return self.ToString()
+
+    def __str__(self):
+        return self.ToString()
+
+    def ToString(self):
+        str0_Description = "Sign Combinations\n\nfree members: " + str(len(self.int1_FreeOut))
+        str0_Description += "\nevaluated: " + str(self.int0_EvaluatedOut) + "\nsymmetric duplicates: " + str(self.int0_PrunedOut)
+        if self.db1_MetricOut:
+            str0_Description += "\nbest: " + str(self.db1_MetricOut[0])
+        return str0_Description
+
+
+### METRICS
+def LoadPath(D, b):
+    return D.db1_LoadPathOut[b]
+
+def Objective(D, b):
+    return D.db1_ObjectiveOut[b]
+
+
+### ENUMERATION
+# Smallest combination of its group, the images that change a fixed sign are not enumerated
+def Canonical(int1_Sign, int2_Symmetry, int1_Fixed):
+    for int1_Perm in int2_Symmetry:
+        int1_Image = [0]*len(int1_Sign)
+        for k in range(len(int1_Sign)):
+            int1_Image[int1_Perm[k]] = int1_Sign[k]
+        if any([int1_Image[k] != int1_Sign[k] for k in int1_Fixed]):
+            continue
+        if int1_Image < int1_Sign:
+            return False
+    return True
+
+def SignCombinations(M, int1_Free = None, bl0_Symmetry = True):
+    db1_Variable = M.db1_VariableOut
+    int0_Sign = M.SignVariableCount()
+    int1_Base = [1 if db1_Variable[k] >= 0 else -1 for k in range(int0_Sign)]
+    if int1_Free is None:
+        int1_Free = range(int0_Sign)
+    # A member without force or length has no sign
+    int1_Free = [k for k in int1_Free if db1_Variable[k] != 0]
+    int1_Fixed = [k for k in range(int0_Sign) if k not in int1_Free]
+    int2_Symmetry = M.SignSymmetry()[1:] if bl0_Symmetry else []
+
+    for int1_Flip in itertools.product([1, -1], repeat=len(int1_Free)):
+        int1_Sign = int1_Base[:]
+        for k in range(len(int1_Free)):
+            int1_Sign[int1_Free[k]] = int1_Flip[k]
+        yield int1_Sign, Canonical(int1_Sign, int2_Symmetry, int1_Fixed)
+
+def EnumerateSigns(M, int0_Best = 10, Metric = LoadPath, int1_Free = None, bl0_Symmetry = True, int0_ChunkSize = 256, int0_Limit = 2**20):
+    db1_Variable = M.db1_VariableOut
+    if int1_Free is None:
+        int1_Free = range(M.SignVariableCount())
+    if 2**len([k for k in int1_Free if db1_Variable[k] != 0]) > int0_Limit:
+        raise ValueError("Too many sign combinations, select the free members with int1_Free or raise int0_Limit")
+
+    C = combinations()
+    C.int1_FreeOut = [k for k in int1_Free if db1_Variable[k] != 0]
+    C.int0_EvaluatedOut = 0
+    C.int0_PrunedOut = 0
+    xx1_Best = []
+
+    def Evaluate(int2_Sign):
+        db2_Design = []
+        for int1_Sign in int2_Sign:
+            db1_Design = list(db1_Variable)
+            for k in range(len(int1_Sign)):
+                db1_Design[k] = int1_Sign[k]*abs(db1_Variable[k])
+            db2_Design.append(db1_Design)
+        D = M.SolveDesigns(db2_Design)
+        for b in range(len(int2_Sign)):
+            db0_Metric = Metric(D, b)
+            if db0_Metric is None:
+                raise ValueError("The metric has no value for this model (the objective needs a model with targets)")
+            # Max-heap of the best K through the negated metric, ties keep the earlier combination
+            xx0_Entry = (-db0_Metric, -C.int0_EvaluatedOut, int2_Sign[b], db2_Design[b])
+            C.int0_EvaluatedOut += 1
+            if len(xx1_Best) < int0_Best:
+                heapq.heappush(xx1_Best, xx0_Entry)
+            else:
+                heapq.heappushpop(xx1_Best, xx0_Entry)
+
+    int2_Sign = []
+    for int1_Sign, bl0_Canonical in SignCombinations(M, int1_Free, bl0_Symmetry):
+        if not bl0_Canonical:
+            C.int0_PrunedOut += 1
+            continue
+        int2_Sign.append(int1_Sign)
+        if len(int2_Sign) == int0_ChunkSize:
+            Evaluate(int2_Sign)
+            int2_Sign = []
+    if int2_Sign:
+        Evaluate(int2_Sign)
+
+    xx1_Best = sorted(xx1_Best, reverse=True)
+    C.db1_MetricOut = [-xx0_Entry[0] for xx0_Entry in xx1_Best]
+    C.int2_SignOut = [xx0_Entry[2] for xx0_Entry in xx1_Best]
+    C.db2_VariableOut = [xx0_Entry[3] for xx0_Entry in xx1_Best]
+    return C
@@ -0,0 +1,215 @@
+"""
+Generate a dataset of equilibrium forms from a structural model
+    Remarks:
+        Samples variable vectors uniformly within the bounds of the optimization settings
+        (Bound_Trail, Bound_Deviation, Bound_Origin_Node), solves them with model.SolveDesigns()
+        (or in the worker processes of WorkerPool() for headless runs) and streams the results
+        chunk by chunk into .npy shards with a JSON index:
+            variables_<k>.npy   (samples x variables)
+            nodes_<k>.npy       (samples x vertices x 3)
+            trail_<k>.npy       (samples x trail members)
+            reactions_<k>.npy   (samples x trails x 3)
+            objective_<k>.npy   (samples), nan without targets
+        Only one chunk per worker is held in memory. The index is rewritten after every shard,
+        a run that was interrupted continues with the first missing shard. The shards can be
+        opened with numpy.load(path, mmap_mode="r").
+"""
+
+__author__    = ['Patrick Ole Ohlbrock','Pierluigi D''Acunto' ]
+__copyright__ = 'Copyright 2019 - Chair of Structural Design, ETH Zurich'
+__license__   = 'MIT License'
+__email__     = 'ohlbrock@arch.ethz.ch'
+__version__   = "1.80"
+
+"""
+If you use the CEM library in a project, please refer to the GitHub repository:
+
+@Misc{cem2019,
+author = {Ohlbrock, Patrick Ole and D'Acunto, Pierluigi},
+title = {{CEM: Combinatorial Equilibrium Modeling}},
+year = {2019},
+note = {Release 1.80},
+url = { http://github.com/OleOhlbrock/CEM },
+}
+
+"""
+
+import array
+import json
+import os
+import random
+import struct
+import sys
+
+try:
+    import multiprocessing
+except ImportError:
+    multiprocessing = None
+
+int0_IndexVersion = 2
+str0_Index = "index.json"
+
+
+### NPY FILES
+# Header of a little endian float64 array in the .npy format (version 1.0)
+def NpyHeader(int1_Shape):
+    str0_Shape = "(" + "".join([str(int0_Size) + ", " for int0_Size in int1_Shape]).rstrip(" ")
+    if len(int1_Shape) > 1:
+        str0_Shape = str0_Shape.rstrip(",")
+    str0_Header = "{'descr': '<f8', 'fortran_order': False, 'shape': " + str0_Shape + "), }"
+    int0_Pad = 64 - (10 + len(str0_Header) + 1) % 64
+    str0_Header += " "*(int0_Pad % 64) + "\n"
+    return b"\x93NUMPY\x01\x00" + struct.pack("<H", len(str0_Header)) + str0_Header.encode("latin1")
+
+def WriteNpy(str0_Path, int1_Shape, db1_Data):
+    db1_Array = array.array("d", db1_Data)
+    if sys.byteorder == "big":
+        db1_Array.byteswap()
+    with open(str0_Path, "wb") as f0_Npy:
+        f0_Npy.write(NpyHeader(int1_Shape))
+        f0_Npy.write(db1_Array.tobytes() if hasattr(db1_Array, "tobytes") else db1_Array.tostring())
+
+def Flatten(xx1_Data):
+    db1_Flat = []
+    for xx0_Data in xx1_Data:
+        if isinstance(xx0_Data, (list, tuple)):
+            db1_Flat.extend(Flatten(xx0_Data))
+        else:
+            db1_Flat.append(float(xx0_Data))
+    return db1_Flat
+
+
+### INDEX
+def ReadIndex(str0_Folder):
+    str0_Path = os.path.join(str0_Folder, str0_Index)
+    if not os.path.exists(str0_Path):
+        return None
+    with open(str0_Path) as f0_Index:
+        return json.load(f0_Index)
+
+def WriteIndex(str0_Folder, dc1_Index):
+    # Write to a temporary file first, an interrupted write keeps the previous index
+    str0_Path = os.path.join(str0_Folder, str0_Index)
+    with open(str0_Path + ".tmp", "w") as f0_Index:
+        json.dump(dc1_Index, f0_Index, indent=1, sort_keys=True)
+    if hasattr(os, "replace"):
+        os.replace(str0_Path + ".tmp", str0_Path)
+    else:
+        if os.path.exists(str0_Path):
+            os.remove(str0_Path)
+        os.rename(str0_Path + ".tmp", str0_Path)
+
+
+### SAMPLING
+# Uniform samples within the bounds, each chunk has its own seed so a chunk can be repeated
+def SampleVariables(db1_BoundUp, db1_BoundLow, int0_Count, int0_Seed):
+    R = random.Random(int0_Seed)
+    db2_Variable = []
+    for b in range(int0_Count):
+        db2_Variable.append([db1_BoundLow[i] + R.random()*(db1_BoundUp[i] - db1_BoundLow[i]) for i in range(len(db1_BoundUp))])
+    return db2_Variable
+
+# Seed of a chunk: the pairing of the seed and the chunk index (Cantor), one to one so that no
+# chunk of one seed repeats a chunk of another seed
+def ChunkSeed(int0_Seed, int0_Chunk):
+    int0_A = 2*int0_Seed if int0_Seed >= 0 else -2*int0_Seed - 1
+    int0_B = int0_Chunk
+    return (int0_A + int0_B)*(int0_A + int0_B + 1)//2 + int0_B
+
+# Variables of a chunk and the solved designs as lists
+def SolveChunk(M, xx1_Task):
+    db1_BoundUp, db1_BoundLow, int0_Count, int0_Seed = xx1_Task
+    db2_Variable = SampleVariables(db1_BoundUp, db1_BoundLow, int0_Count, int0_Seed)
+    D = M.SolveDesigns(db2_Variable)
+    return db2_Variable, D.db3_NodeOut, D.db2_TrailEdgeOut, D.db3_ReactionOut, D.db1_ObjectiveOut
+
+
+### WORKERS
+# ghpythonlib.parallel is only available in Grasshopper. For headless runs each worker process
+# runs Calculate_Structure once with the inputs of the model and then solves the chunks it is
+# given. The inputs are inherited where the processes are forked, otherwise they are pickled.
+M0_Worker = None
+
+def WorkerStart(dc1_Input):
+    global M0_Worker
+    import CEM_180_Headless as rh
+    f0_Stdout = sys.stdout
+    sys.stdout = open(os.devnull, "w")
+    try:
+        M0_Worker = rh.RunComponent("CEM_180_Calculate_Structure.py", **dc1_Input)["M"]
+    finally:
+        sys.stdout.close()
+        sys.stdout = f0_Stdout
+
+def WorkerChunk(xx1_Task):
+    return SolveChunk(M0_Worker, xx1_Task)
+
+# Pool for GenerateDataset(), dc1_Input are the inputs of Calculate_Structure (TP, CPL, N, SW, O)
+def WorkerPool(dc1_Input, int0_Process = None):
+    if multiprocessing is None:
+        raise ValueError("Worker processes need the multiprocessing module, use GenerateDataset() without a pool")
+    if hasattr(multiprocessing, "get_all_start_methods") and "fork" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("fork").Pool(int0_Process, WorkerStart, (dc1_Input,))
+    return multiprocessing.Pool(int0_Process, WorkerStart, (dc1_Input,))
+
+
+### GENERATOR
+def GenerateDataset(M, str0_Folder, int0_Samples, int0_ChunkSize = 4096, int0_Seed = 0, db1_BoundUp = None, db1_BoundLow = None, xx0_Pool = None):
+    if db1_BoundUp is None or db1_BoundLow is None:
+        if not hasattr(M, "db1_BoundUpOut"):
+            raise ValueError("The structural model has no bounds, connect the optimization settings or pass the bounds")
+        db1_BoundUp = M.db1_BoundUpOut
+        db1_BoundLow = M.db1_BoundLowOut
+    db1_BoundUp = [float(db0_Bound) for db0_Bound in db1_BoundUp]
+    db1_BoundLow = [float(db0_Bound) for db0_Bound in db1_BoundLow]
+    if not os.path.isdir(str0_Folder):
+        os.makedirs(str0_Folder)
+
+    dc1_Settings = {"version": int0_IndexVersion,
+                    "samples": int0_Samples,
+                    "chunk": int0_ChunkSize,
+                    "seed": int0_Seed,
+                    "boundUp": db1_BoundUp,
+                    "boundLow": db1_BoundLow,
+                    "nodeOrder": [str(str0_Node) for str0_Node in M.str1_NodeOrderOut],
+                    "trailEdges": [str(str0_Edge) for str0_Edge in M.str1_GlobTrailEdgeOut]}
+
+    # Continue an interrupted run with the same settings
+    dc1_Index = ReadIndex(str0_Folder)
+    if dc1_Index is not None:
+        for key in dc1_Settings:
+            if dc1_Index.get(key) != dc1_Settings[key]:
+                raise ValueError("The dataset in " + str0_Folder + " was generated with a different " + key)
+    else:
+        dc1_Index = dict(dc1_Settings)
+        dc1_Index["shards"] = []
+    int1_Done = set([dc1_Shard["chunk"] for dc1_Shard in dc1_Index["shards"]])
+
+    # Chunks in order, solved here or by the workers of a pool (the results come back in order)
+    int0_ChunkCount = (int0_Samples + int0_ChunkSize - 1) // int0_ChunkSize
+    int1_Chunk = [k for k in range(int0_ChunkCount) if k not in int1_Done]
+    xx1_Task = [(db1_BoundUp, db1_BoundLow, min(int0_ChunkSize, int0_Samples - k*int0_ChunkSize), ChunkSeed(int0_Seed, k)) for k in int1_Chunk]
+    if xx0_Pool is not None:
+        xx1_Result = xx0_Pool.imap(WorkerChunk, xx1_Task)
+    else:
+        xx1_Result = (SolveChunk(M, xx0_Task) for xx0_Task in xx1_Task)
+    for k, xx0_Result in zip(int1_Chunk, xx1_Result):
+        db2_Variable, db3_Node, db2_TrailEdge, db3_Reaction, db1_Objective = xx0_Result
+        int0_Count = len(db2_Variable)
+        int0_Node = len(M.str1_NodeOrderOut)
+        int0_Trail = len(M.str1_GlobTrailEdgeOut)
+        int0_Reaction = len(db3_Reaction[0]) if int0_Count > 0 else 0
+        dc1_File = {"variables": "variables_%05d.npy" % k,
+                    "nodes": "nodes_%05d.npy" % k,
+                    "trail": "trail_%05d.npy" % k,
+                    "reactions": "reactions_%05d.npy" % k,
+                    "objective": "objective_%05d.npy" % k}
+        WriteNpy(os.path.join(str0_Folder, dc1_File["variables"]), (int0_Count, len(db1_BoundUp)), Flatten(db2_Variable))
+        WriteNpy(os.path.join(str0_Folder, dc1_File["nodes"]), (int0_Count, int0_Node, 3), Flatten(db3_Node))
+        WriteNpy(os.path.join(str0_Folder, dc1_File["trail"]), (int0_Count, int0_Trail), Flatten(db2_TrailEdge))
+        WriteNpy(os.path.join(str0_Folder, dc1_File["reactions"]), (int0_Count, int0_Reaction, 3), Flatten(db3_Reaction))
+        WriteNpy(os.path.join(str0_Folder, dc1_File["objective"]), (int0_Count,), [float("nan") if db0_Objective is None else db0_Objective for db0_Objective in db1_Objective])
+
+        dc1_Index["shards"].append({"chunk": k, "samples": int0_Count, "files": dc1_File})
+        WriteIndex(str0_Folder, dc1_Index)
+    return dc1_Index
@@ -25,12 +25,47 @@ Retrieves automatically the data in the structural model
 """
 
 
-if M and hasattr(M, "pt1_GlobNodeOut") and hasattr(M, "str1_NodeOrderOut") and hasattr(M, "ln1_GlobTrailEdgeOut") and hasattr(M, "cl1_GlobTrailEdgeOut") and hasattr(M, "db1_GlobTrailEdgeOut") and hasattr(M, "ln1_GlobDeviation1EdgeOut") and hasattr(M, "cl1_GlobDeviation1EdgeOut") and hasattr(M, "db1_GlobDeviation1EdgeOut") and hasattr(M, "ln1_GlobDeviation2EdgeOut") and hasattr(M, "cl1_GlobDeviation2EdgeOut") and hasattr(M, "db1_GlobDeviation2EdgeOut") and hasattr(M, "ln1_GlobExtFOEdgeOut") and hasattr(M, "cl1_GlobExtFOEdgeOut") and hasattr(M, "db1_GlobExtFOEdgeOut"):
+if M and hasattr(M, "FD"):
+
+    # The model builds the lines, colours and the lists without padding nodes and auxiliary trails when they are read
+    nodes = M.pt1_NodeOut
+    nodesID = M.str1_NodeOut
+    trails = M.ln1_TrailEdgeOut
+    trailsID = M.str1_TrailEdgeOut
+    trailsCol = M.cl1_TrailEdgeOut
+    trailsMag = M.db1_TrailEdgeOut
+    deviationsDirect = M.ln1_GlobDeviation1EdgeOut
+    deviationsDirectID = M.str1_GlobDeviation1EdgeOut
+    deviationsDirectCol = M.cl1_GlobDeviation1EdgeOut
+    deviationsDirectMag = M.db1_GlobDeviation1EdgeOut
+    deviationsIndirect = M.ln1_GlobDeviation2EdgeOut
+    deviationsIndirectID = M.str1_GlobDeviation2EdgeOut
+    deviationsIndirectCol = M.cl1_GlobDeviation2EdgeOut
+    deviationsIndirectMag = M.db1_GlobDeviation2EdgeOut
+    deviations = M.ln1_GlobDeviationEdgeOut
+    deviationsID = M.str1_GlobDeviationEdgeOut
+    deviationsCol = M.cl1_GlobDeviationEdgeOut
+    deviationsMag = M.db1_GlobDeviationEdgeOut
+    externalForces = M.ln1_GlobExtFOEdgeOut
+    externalForcesCol = M.cl1_GlobExtFOEdgeOut
+    externalForcesMag = M.db1_GlobExtFOEdgeOut
+
+elif M and hasattr(M, "pt1_GlobNodeOut") and hasattr(M, "str1_NodeOrderOut") and hasattr(M, "ln1_GlobTrailEdgeOut") and hasattr(M, "cl1_GlobTrailEdgeOut") and hasattr(M, "db1_GlobTrailEdgeOut") and hasattr(M, "ln1_GlobDeviation1EdgeOut") and hasattr(M, "cl1_GlobDeviation1EdgeOut") and hasattr(M, "db1_GlobDeviation1EdgeOut") and hasattr(M, "ln1_GlobDeviation2EdgeOut") and hasattr(M, "cl1_GlobDeviation2EdgeOut") and hasattr(M, "db1_GlobDeviation2EdgeOut") and hasattr(M, "ln1_GlobExtFOEdgeOut") and hasattr(M, "cl1_GlobExtFOEdgeOut") and hasattr(M, "db1_GlobExtFOEdgeOut"):
+
+    # Older models hold the complete lists, padding nodes and auxiliary trails are flagged by the model or only by their labels
+    if hasattr(M, "bl1_NodePaddingOut"):
+        bl1_NodePadding = M.bl1_NodePaddingOut
+    else:
+        bl1_NodePadding = [str0_NodeOrder[0] == "L" for str0_NodeOrder in M.str1_NodeOrderOut]
+    if hasattr(M, "bl1_GlobTrailAuxiliaryOut"):
+        bl1_TrailAuxiliary = M.bl1_GlobTrailAuxiliaryOut
+    else:
+        bl1_TrailAuxiliary = [str0_TrailEdge[0] == "E" for str0_TrailEdge in M.str1_GlobTrailEdgeOut]
 
     nodes_C = []
     nodesID_C = []
     for i in range(len(M.pt1_GlobNodeOut)):
-        if M.str1_NodeOrderOut[i][0] != "L":
+        if not bl1_NodePadding[i]:
             nodes_C.append(M.pt1_GlobNodeOut[i])
             nodesID_C.append(M.str1_NodeOrderOut[i])
         nodes = nodes_C
@@ -41,7 +76,7 @@ if M and hasattr(M, "pt1_GlobNodeOut") and hasattr(M, "str1_NodeOrderOut") and h
     trailsCol_C = []
     trailsMag_C = []
     for i in range(len(M.ln1_GlobTrailEdgeOut)):
-        if M.str1_GlobTrailEdgeOut[i][0] != "E":
+        if not bl1_TrailAuxiliary[i]:
             trails_C.append(M.ln1_GlobTrailEdgeOut[i])
             trailsID_C.append(M.str1_GlobTrailEdgeOut[i])
             trailsCol_C.append(M.cl1_GlobTrailEdgeOut[i])
@@ -0,0 +1,287 @@
+"""
+Headless stand-in for the parts of Rhino.Geometry and System used by the CEM components
+    Remarks:
+        Build_Topology and Calculate_Structure import this module when Rhino cannot be imported,
+        so that the form finding runs in a plain Python interpreter (e.g. on a Linux worker).
+        Only the geometry used by the components is covered: points, vectors, lines, line curves,
+        planes and the line-plane intersection.
+        RunComponent() executes a component script with its inputs given as keyword arguments.
+"""
+
+__author__    = ['Patrick Ole Ohlbrock','Pierluigi D''Acunto' ]
+__copyright__ = 'Copyright 2019 - Chair of Structural Design, ETH Zurich'
+__license__   = 'MIT License'
+__email__     = 'ohlbrock@arch.ethz.ch'
+__version__   = "1.80"
+
+"""
+If you use the CEM library in a project, please refer to the GitHub repository:
+
+@Misc{cem2019,
+author = {Ohlbrock, Patrick Ole and D'Acunto, Pierluigi},
+title = {{CEM: Combinatorial Equilibrium Modeling}},
+year = {2019},
+note = {Release 1.80},
+url = { http://github.com/OleOhlbrock/CEM },
+}
+
+"""
+
+import math
+import os
+import sys
+
+
+### POINTS AND VECTORS
+class Vector3d(object):
+    __slots__ = ("X", "Y", "Z")
+
+    def __init__(self, x=0.0, y=0.0, z=0.0):
+        if isinstance(x, (Vector3d, Point3d)):
+            x, y, z = x.X, x.Y, x.Z
+        self.X = float(x)
+        self.Y = float(y)
+        self.Z = float(z)
+
+    @property
+    def Length(self):
+        return math.sqrt(self.X*self.X + self.Y*self.Y + self.Z*self.Z)
+
+    @property
+    def SquareLength(self):
+        return self.X*self.X + self.Y*self.Y + self.Z*self.Z
+
+    def Unitize(self):
+        db0_Length = self.Length
+        if db0_Length == 0:
+            return False
+        self.X /= db0_Length
+        self.Y /= db0_Length
+        self.Z /= db0_Length
+        return True
+
+    @staticmethod
+    def Multiply(vc0_A, vc0_B):
+        return vc0_A.X*vc0_B.X + vc0_A.Y*vc0_B.Y + vc0_A.Z*vc0_B.Z
+
+    def __add__(self, vc0_Other):
+        return Vector3d(self.X + vc0_Other.X, self.Y + vc0_Other.Y, self.Z + vc0_Other.Z)
+
+    def __sub__(self, vc0_Other):
+        return Vector3d(self.X - vc0_Other.X, self.Y - vc0_Other.Y, self.Z - vc0_Other.Z)
+
+    def __neg__(self):
+        return Vector3d(-self.X, -self.Y, -self.Z)
+
+    def __mul__(self, xx0_Other):
+        # vector * vector is the dot product as in RhinoCommon
+        if isinstance(xx0_Other, Vector3d):
+            return self.X*xx0_Other.X + self.Y*xx0_Other.Y + self.Z*xx0_Other.Z
+        return Vector3d(self.X*xx0_Other, self.Y*xx0_Other, self.Z*xx0_Other)
+
+    __rmul__ = __mul__
+
+    def __truediv__(self, db0_Other):
+        return Vector3d(self.X/db0_Other, self.Y/db0_Other, self.Z/db0_Other)
+
+    __div__ = __truediv__
+
+    def __eq__(self, vc0_Other):
+        return isinstance(vc0_Other, Vector3d) and self.X == vc0_Other.X and self.Y == vc0_Other.Y and self.Z == vc0_Other.Z
+
+    def __ne__(self, vc0_Other):
+        return not self == vc0_Other
+
+    def __hash__(self):
+        return hash((self.X, self.Y, self.Z))
+
+    def __repr__(self):
+        return self.ToString()
+
+    def ToString(self):
+        return str(self.X) + "," + str(self.Y) + "," + str(self.Z)
+
+
+class Point3d(object):
+    __slots__ = ("X", "Y", "Z")
+
+    def __init__(self, x=0.0, y=0.0, z=0.0):
+        if isinstance(x, (Vector3d, Point3d)):
+            x, y, z = x.X, x.Y, x.Z
+        self.X = float(x)
+        self.Y = float(y)
+        self.Z = float(z)
+
+    def DistanceTo(self, pt0_Other):
+        return math.sqrt(self.DistanceToSquared(pt0_Other))
+
+    def DistanceToSquared(self, pt0_Other):
+        db0_X = self.X - pt0_Other.X
+        db0_Y = self.Y - pt0_Other.Y
+        db0_Z = self.Z - pt0_Other.Z
+        return db0_X*db0_X + db0_Y*db0_Y + db0_Z*db0_Z
+
+    def __add__(self, xx0_Other):
+        return Point3d(self.X + xx0_Other.X, self.Y + xx0_Other.Y, self.Z + xx0_Other.Z)
+
+    def __sub__(self, xx0_Other):
+        # point - point is a vector, point - vector is a point
+        if isinstance(xx0_Other, Point3d):
+            return Vector3d(self.X - xx0_Other.X, self.Y - xx0_Other.Y, self.Z - xx0_Other.Z)
+        return Point3d(self.X - xx0_Other.X, self.Y - xx0_Other.Y, self.Z - xx0_Other.Z)
+
+    def __mul__(self, db0_Other):
+        return Point3d(self.X*db0_Other, self.Y*db0_Other, self.Z*db0_Other)
+
+    __rmul__ = __mul__
+
+    def __eq__(self, pt0_Other):
+        return isinstance(pt0_Other, Point3d) and self.X == pt0_Other.X and self.Y == pt0_Other.Y and self.Z == pt0_Other.Z
+
+    def __ne__(self, pt0_Other):
+        return not self == pt0_Other
+
+    def __hash__(self):
+        return hash((self.X, self.Y, self.Z))
+
+    def __repr__(self):
+        return self.ToString()
+
+    def ToString(self):
+        return str(self.X) + "," + str(self.Y) + "," + str(self.Z)
+
+Vector3d.XAxis = Vector3d(1, 0, 0)
+Vector3d.YAxis = Vector3d(0, 1, 0)
+Vector3d.ZAxis = Vector3d(0, 0, 1)
+Point3d.Origin = Point3d(0, 0, 0)
+
+
+### LINES AND PLANES
+class Line(object):
+
+    def __init__(self, pt0_From, xx0_To):
+        # Line(start, end) or Line(start, span vector)
+        self.From = Point3d(pt0_From)
+        if isinstance(xx0_To, Vector3d):
+            self.To = self.From + xx0_To
+        else:
+            self.To = Point3d(xx0_To)
+
+    @property
+    def Length(self):
+        return self.From.DistanceTo(self.To)
+
+    @property
+    def Direction(self):
+        return self.To - self.From
+
+    def PointAt(self, db0_T):
+        return self.From + (self.To - self.From)*db0_T
+
+    def ToNurbsCurve(self):
+        return LineCurve(self.From, self.To)
+
+    def __eq__(self, ln0_Other):
+        return isinstance(ln0_Other, Line) and self.From == ln0_Other.From and self.To == ln0_Other.To
+
+    def __ne__(self, ln0_Other):
+        return not self == ln0_Other
+
+    def __repr__(self):
+        return self.From.ToString() + "," + self.To.ToString()
+
+
+class Plane(object):
+
+    def __init__(self, pt0_Origin, vc0_Normal):
+        self.Origin = Point3d(pt0_Origin)
+        self.Normal = Vector3d(vc0_Normal)
+        self.Normal.Unitize()
+
+    def __repr__(self):
+        return "O(" + self.Origin.ToString() + ") Z(" + self.Normal.ToString() + ")"
+
+
+class Intersection(object):
+
+    @staticmethod
+    def LinePlane(ln0_Line, pl0_Plane):
+        # (success, parameter on the line) as returned by RhinoCommon in IronPython
+        db0_Denom = ln0_Line.Direction*pl0_Plane.Normal
+        if abs(db0_Denom) < 1e-12:
+            return (False, 0.0)
+        return (True, ((pl0_Plane.Origin - ln0_Line.From)*pl0_Plane.Normal)/db0_Denom)
+
+
+class Intersect(object):
+    Intersection = Intersection
+
+
+### CURVES
+class Curve(object):
+
+    def PointAtNormalizedLength(self, db0_T):
+        return self.PointAt(db0_T)
+
+
+class LineCurve(Curve):
+
+    def __init__(self, xx0_Start, pt0_End=None):
+        if isinstance(xx0_Start, Line):
+            xx0_Start, pt0_End = xx0_Start.From, xx0_Start.To
+        self.PointAtStart = Point3d(xx0_Start)
+        self.PointAtEnd = Point3d(pt0_End)
+
+    def PointAt(self, db0_T):
+        return self.PointAtStart + (self.PointAtEnd - self.PointAtStart)*db0_T
+
+    def ClosestPoint(self, pt0_Point):
+        # parameter in [0,1] of the closest point
+        vc0_Span = self.PointAtEnd - self.PointAtStart
+        db0_Span = vc0_Span*vc0_Span
+        if db0_Span == 0:
+            return (True, 0.0)
+        return (True, min(max(((pt0_Point - self.PointAtStart)*vc0_Span)/db0_Span, 0.0), 1.0))
+
+    def ToNurbsCurve(self):
+        return LineCurve(self.PointAtStart, self.PointAtEnd)
+
+
+class Brep(object):
+    pass
+
+
+class BrepFace(object):
+    pass
+
+
+### SYSTEM
+class Color(object):
+    Red = "Red"
+    Blue = "Blue"
+    Black = "Black"
+    DarkGreen = "DarkGreen"
+
+
+class namespace(object):
+    pass
+
+System = namespace()
+System.Drawing = namespace()
+System.Drawing.Color = Color
+
+Rhino = namespace()
+Rhino.Geometry = sys.modules[__name__]
+
+
+### RUN A COMPONENT
+def RunComponent(str0_Component, **xx1_Input):
+    # Execute a component script of this folder with its inputs as globals, return the globals
+    str0_Path = os.path.join(os.path.dirname(os.path.abspath(__file__)), str0_Component)
+    if os.path.dirname(str0_Path) not in sys.path:
+        sys.path.insert(0, os.path.dirname(str0_Path))
+    dc1_Global = {"__name__": "__headless__"}
+    dc1_Global.update(xx1_Input)
+    with open(str0_Path) as f0_Component:
+        exec(compile(f0_Component.read(), str0_Path, "exec"), dc1_Global)
+    return dc1_Global
@@ -8,7 +8,8 @@ Combines the Optimization settings
         gradientDelta: (float) The delta for the determination of the gradient through finite differences
         relativeTolerance: (float) The threshold which describes one stoping criteria
         maxIterations: (Integer) The maximum number of iteration steps
-        optimAlgorithm: (AlgorithmType) The type of solver from the NLOpt library
+        optimAlgorithm: (AlgorithmType) The type of solver from the NLOpt library, or "LM" (Levenberg-Marquardt on the target residuals)
+        newton: (bool) Solves the indirect deviations by Newton's method instead of the sub-iterations
     Outputs:
         O: (optimization set-up) The settings for an optimization that can be performed 
     Remarks:
@@ -111,3 +112,8 @@ if optimAlgorithm is None:
     O.optimAlgorithm = "LN_BOBYQA"
 else:
     O.optimAlgorithm = optimAlgorithm
+
+if newton is None:
+    O.newton = False
+else:
+    O.newton = newton
@@ -0,0 +1,410 @@
+"""
+Regression tests of the CEM components, run headless
+    Remarks:
+        The components are executed with CEM_180_Headless.RunComponent() on small fixtures: four
+        trails of different depth connected by direct deviations, optionally with one indirect
+        deviation. Run with "python -m unittest discover CEM_180/CEM_180_Tests" (or pytest).
+"""
+
+__author__    = ['Patrick Ole Ohlbrock','Pierluigi D''Acunto' ]
+__copyright__ = 'Copyright 2019 - Chair of Structural Design, ETH Zurich'
+__license__   = 'MIT License'
+__email__     = 'ohlbrock@arch.ethz.ch'
+__version__   = "1.80"
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "CEM_180_Source"))
+
+import CEM_180_Headless as rh
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    basestring
+except NameError:
+    basestring = (str, bytes)
+
+
+### FIXTURES
+class inputs(object):
+    pass
+
+def Node(k, z):
+    # Node z of trail k, counted from the support
+    return rh.Point3d(5.0*k + 0.2*(z % 2), 0.1*k*z, z)
+
+def Fixture(bl0_Bracing):
+    # Trails of 4, 4, 3 and 4 members from the supports at z = 0, loads at the ends of the trails
+    int1_Depth = [4, 4, 3, 4]
+    T = []
+    L = []
+    S = []
+    for k in range(len(int1_Depth)):
+        t = inputs()
+        t.geom = [rh.LineCurve(Node(k, z), Node(k, z+1)) if z % 2 == 0 else rh.LineCurve(Node(k, z+1), Node(k, z)) for z in range(int1_Depth[k])]
+        t.len = [-1.0 - 0.1*z for z in range(int1_Depth[k])]
+        T.append(t)
+        s = inputs()
+        s.geom = [Node(k, 0)]
+        S.append(s)
+        l = inputs()
+        l.geom = [Node(k, int1_Depth[k])]
+        l.magn = [(0.5*k, 0.0, -10.0)]
+        L.append(l)
+    d = inputs()
+    d.geom = []
+    d.magn = []
+    for k in range(len(int1_Depth)-1):
+        for z in range(1, min(int1_Depth[k], int1_Depth[k+1]) + 1):
+            d.geom.append(rh.LineCurve(Node(k, z), Node(k+1, z)))
+            d.magn.append(2.0 + 0.3*z*(1 if k % 2 else -1))
+    if bl0_Bracing:
+        d.geom.append(rh.LineCurve(Node(0, 3), Node(1, 2)))
+        d.magn.append(-0.7)
+    return T, L, [d], S
+
+def Targets():
+    O = inputs()
+    O.targetNode = [rh.Point3d(0.3, 0.0, 0.2)]
+    O.targetNodeID = [0]
+    O.targetNodeCoeff = 1.0
+    O.targetVector = [rh.Vector3d(1, 0, 5)]
+    O.targetVectorID = [1]
+    O.targetVectorCoeffMag = 0.1
+    O.targetVectorCoeffDir = 1.0
+    O.boundsTrailID = [0, 1]
+    O.boundsTrailUp = [0.5, 0.5]
+    O.boundsTrailLow = [-0.5, -0.5]
+    O.boundsDevID = [0, 1, 2]
+    O.boundsDevUp = [1.0]*3
+    O.boundsDevLow = [-1.0]*3
+    O.boundsOriginNodeID = [3]
+    O.boundsOriginNodeUpX = [1.0]
+    O.boundsOriginNodeLowX = [-1.0]
+    O.boundsOriginNodeUpY = [1.0]
+    O.boundsOriginNodeLowY = [-1.0]
+    O.boundsOriginNodeUpZ = [0.0]
+    O.boundsOriginNodeLowZ = [0.0]
+    O.gradientDelta = 1e-3
+    O.relativeTolerance = 1e-3
+    O.maxIterations = 5
+    O.optimAlgorithm = "None"
+    return O
+
+def Run(str0_Component, **xx1_Input):
+    # RunComponent() without the reports the components print
+    f0_Stdout = sys.stdout
+    sys.stdout = open(os.devnull, "w")
+    try:
+        return rh.RunComponent(str0_Component, **xx1_Input)
+    finally:
+        sys.stdout.close()
+        sys.stdout = f0_Stdout
+
+def SelfWeight():
+    SW = inputs()
+    SW.yieldStress = 100.0
+    SW.specWeight = 7.0
+    return SW
+
+def ConstraintPlane(TP):
+    # Horizontal plane at z = 2.5 for the trail out of the third node with a plane
+    CPL = inputs()
+    CPL.constraintPlane = [rh.Plane(rh.Point3d(0.0, 0.0, 2.5), rh.Vector3d(0.0, 0.0, 1.0))]
+    CPL.constraintPlaneID = [int(TP.str1_ConstraintPlaneOut[2])]
+    return CPL
+
+def Solve(bl0_Bracing, O = None, SW = None, bl0_Plane = False):
+    T, L, D, S = Fixture(bl0_Bracing)
+    TP = Run("CEM_180_Build_Topology.py", T=T, L=L, D=D, S=S)["TP"]
+    CPL = ConstraintPlane(TP) if bl0_Plane else None
+    dc1_Global = Run("CEM_180_Calculate_Structure.py", TP=TP, CPL=CPL, N=None, SW=SW, O=O)
+    return TP, dc1_Global["M"], dc1_Global
+
+def Coupled(O = None):
+    # A tenth of the loads and an indirect deviation along the first trail couple the
+    # sub-iterations, the plain ones need more than 3
+    T, L, D, S = Fixture(False)
+    for l in L:
+        l.magn = [tuple(0.1*db0_Value for db0_Value in l.magn[0])]
+    D[0].geom.append(rh.LineCurve(Node(0, 4), Node(0, 2)))
+    D[0].magn.append(3.0)
+    TP = Run("CEM_180_Build_Topology.py", T=T, L=L, D=D, S=S)["TP"]
+    dc1_Global = Run("CEM_180_Calculate_Structure.py", TP=TP, CPL=None, N=None, SW=None, O=O)
+    return TP, dc1_Global["M"], dc1_Global
+
+def Plain(xx0_Value):
+    # Geometry as nested tuples and numbers to 9 digits (the normal of a plane is unitized again
+    # when it is read), so that outputs can be compared with ==
+    if isinstance(xx0_Value, float):
+        return round(xx0_Value, 9)
+    if isinstance(xx0_Value, (rh.Point3d, rh.Vector3d)):
+        return (Plain(xx0_Value.X), Plain(xx0_Value.Y), Plain(xx0_Value.Z))
+    if isinstance(xx0_Value, rh.Line):
+        return (Plain(xx0_Value.From), Plain(xx0_Value.To))
+    if isinstance(xx0_Value, rh.LineCurve):
+        return (Plain(xx0_Value.PointAtStart), Plain(xx0_Value.PointAtEnd))
+    if isinstance(xx0_Value, rh.Plane):
+        return (Plain(xx0_Value.Origin), Plain(xx0_Value.Normal))
+    if isinstance(xx0_Value, dict):
+        return dict((k, Plain(xx0_Value[k])) for k in xx0_Value)
+    if isinstance(xx0_Value, (list, tuple)) or hasattr(xx0_Value, "__getitem__") and hasattr(xx0_Value, "__len__") and not isinstance(xx0_Value, basestring):
+        return [Plain(xx0_Value[i]) for i in range(len(xx0_Value))]
+    return xx0_Value
+
+def Outputs(M):
+    return dict((str0_Name, Plain(getattr(M, str0_Name))) for str0_Name in dir(M) if str0_Name.endswith("Out"))
+
+
+### TOPOLOGY AND OUTPUTS
+class TopologyTest(unittest.TestCase):
+
+    def test_node_order(self):
+        # Layers from the origin nodes to the supports, the trails of a layer in the order of the dictionaries
+        TP, M, dc1_Global = Solve(False)
+        self.assertEqual(len(TP.pt1_NodeOut), 19)
+        self.assertEqual([sorted(TP.int1_NodeOrderOut[g:g+4]) for g in range(0, 20, 4)], [[4, 9, 13, 18], [3, 8, 13, 17], [2, 7, 12, 16], [1, 6, 11, 15], [0, 5, 10, 14]])
+        self.assertEqual([TP.int1_NodeOrderOut[i] for i in range(20) if TP.bl1_NodePaddingOut[i]], [13])
+        self.assertEqual(TP.str1_NodeOrderOut, [("L" if bl0_Padding else "") + str(int0_Node) for int0_Node, bl0_Padding in zip(TP.int1_NodeOrderOut, TP.bl1_NodePaddingOut)])
+        self.assertEqual(sorted(TP.str1_OriginNodeOut, key=int), ["4", "9", "13", "18"])
+
+    def test_sparse_matrix(self):
+        # The compiled topology stores the matrix sparse, the dense matrix is built from it on request
+        TP, M, dc1_Global = Solve(True)
+        TPC = TP.compiled
+        int0_Row = len(TPC.str1_NodeOrderOut)
+        int0_Trail = len(TPC.str1_OriginNodeOut)
+        self.assertFalse("db1_StructuralBehaviourOut" in TPC.__slots__)
+        self.assertEqual((len(TPC.db1_LoadOut), len(TPC.db1_TrailLengthOut), len(TPC.int1_DevRowPtrOut)), (3*int0_Row, int0_Row, int0_Row + 1))
+        self.assertEqual(len(TPC.db1_DevValueOut), len(TPC.int1_DevColOut))
+        db1_Dense = TP.db1_StructuralBehaviourOut
+        self.assertEqual(len(db1_Dense), int0_Row*(int0_Trail + 4))
+        for i in range(int0_Row):
+            db1_Row = db1_Dense[i*(int0_Trail + 4):(i+1)*(int0_Trail + 4)]
+            self.assertEqual(db1_Row[0:3], list(TPC.db1_LoadOut[3*i:3*i+3]))
+            self.assertEqual(db1_Row[-1], TPC.db1_TrailLengthOut[i])
+            dc1_Entry = dict(zip(TPC.int1_DevColOut[TPC.int1_DevRowPtrOut[i]:TPC.int1_DevRowPtrOut[i+1]], TPC.db1_DevValueOut[TPC.int1_DevRowPtrOut[i]:TPC.int1_DevRowPtrOut[i+1]]))
+            self.assertEqual(db1_Row[3:-1], [dc1_Entry.get(j, 0.0) for j in range(int0_Trail)])
+
+    def test_trail_lengths(self):
+        # The trail members keep their prescribed lengths, the padding trail has none
+        TP, M, dc1_Global = Solve(True)
+        db1_Length = sorted([round(ln0_Trail.Length, 9) for ln0_Trail, bl0_Auxiliary in zip(M.ln1_GlobTrailEdgeOut, M.bl1_GlobTrailAuxiliaryOut) if not bl0_Auxiliary])
+        self.assertEqual(db1_Length, sorted([1.0]*4 + [1.1]*4 + [1.2]*4 + [1.3]*3))
+
+    def test_outputs(self):
+        for bl0_Bracing, pt1_Node in ((False, [(1.1156622, 0.0859736, -0.4140704), (5.7638620, 0.3812927, -0.4905267), (9.6615263, 0.6192905, -0.2479683), (14.8702820, 1.1063827, -0.5422717)]),
+                                      (True, [(0.9333862, 0.0723624, -0.4653381), (5.8773137, 0.3916142, -0.4518777), (9.6613133, 0.6194103, -0.2479149), (14.8702820, 1.1063827, -0.5422717)])):
+            TP, M, dc1_Global = Solve(bl0_Bracing)
+            for pt0_Node, db1_Node in zip(sorted(M.pt1_GlobNodeOut[-4:], key=lambda pt0_Node: pt0_Node.X), pt1_Node):
+                for db0_Value, db0_Expected in zip(Plain(pt0_Node), db1_Node):
+                    self.assertAlmostEqual(db0_Value, db0_Expected, places=6)
+
+
+### LAYER KERNEL
+class LayerKernelTest(unittest.TestCase):
+
+    @unittest.skipIf(np is None, "NumPy is not available")
+    def test_layer_kernel(self):
+        # The NumPy kernel and the loop over the sparse entries agree on every layer
+        TP, M, dc1_Global = Solve(True)
+        int0_N = dc1_Global["int0_TrailNumber"]
+        db0_Sum = 0.0
+        for g in range(dc1_Global["int0_LayerCount"]):
+            pt1_InputNode = M.pt1_GlobNodeOut[g*int0_N:(g+1)*int0_N]
+            vc1_Array, db1_Array = dc1_Global["LayerDeviationArray"](pt1_InputNode, g)
+            vc1_Sparse, db1_Sparse = dc1_Global["LayerDeviationSparse"](pt1_InputNode, g)
+            for i in range(int0_N):
+                for db0_Array, db0_Sparse in zip(Plain(vc1_Array[i]) + (db1_Array[i],), Plain(vc1_Sparse[i]) + (db1_Sparse[i],)):
+                    self.assertAlmostEqual(db0_Array, db0_Sparse, delta=1e-9)
+                db0_Sum += db1_Sparse[i]
+        self.assertTrue(db0_Sum > 0.0)
+
+
+### FIXED POINT ACCELERATION
+class FixedPointTest(unittest.TestCase):
+
+    def test_anderson(self):
+        # Anderson mixing needs fewer sub-iterations and converges to the same nodes
+        TP, M, dc1_Global = Coupled()
+        self.assertTrue(0.0 < float(M.str0_ConvergenceOut) < 1.0)
+        self.assertTrue("e" in M.str0_ConvergenceOut)
+        C = M.SC
+        int1_Counter = []
+        for bl0_Anderson in (True, False):
+            dc1_Global["bl0_Anderson"] = bl0_Anderson
+            int1_Counter.append(len(dc1_Global["Solve"](C, dc1_Global["SolveState"](C, [])).A.db1_Residual))
+        self.assertTrue(int1_Counter[1] > 3)
+        self.assertTrue(int1_Counter[0] < int1_Counter[1])
+        C.db0_Threshold = 1e-12
+        db2_Node = []
+        for bl0_Anderson in (True, False):
+            dc1_Global["bl0_Anderson"] = bl0_Anderson
+            db2_Node.append(dc1_Global["SolveOutput"](C, dc1_Global["Solve"](C, dc1_Global["SolveState"](C, []))).db2_NodeOut)
+        for db1_Anderson, db1_Plain in zip(db2_Node[0], db2_Node[1]):
+            for db0_Anderson, db0_Plain in zip(db1_Anderson, db1_Plain):
+                self.assertAlmostEqual(db0_Anderson, db0_Plain, delta=1e-8)
+
+
+### NEWTON SOLVER
+class NewtonTest(unittest.TestCase):
+
+    def test_newton(self):
+        # Newton's method, switched on by the optimization set-up, gives the nodes of the
+        # sub-iterations (within the threshold of the divergence) in fewer sweeps
+        O = inputs()
+        O.newton = True
+        xx1_Solve = [Coupled(), Coupled(O)]
+        self.assertEqual([M.SC.bl0_Newton for TP, M, dc1_Global in xx1_Solve], [False, True])
+        for pt0_Plain, pt0_Newton in zip(xx1_Solve[0][1].pt1_GlobNodeOut, xx1_Solve[1][1].pt1_GlobNodeOut):
+            for db0_Plain, db0_Newton in zip(Plain(pt0_Plain), Plain(pt0_Newton)):
+                self.assertAlmostEqual(db0_Plain, db0_Newton, delta=1e-4)
+        int1_Sweep = []
+        db2_Node = []
+        for TP, M, dc1_Global in xx1_Solve:
+            S = dc1_Global["Solve"](M.SC, dc1_Global["SolveState"](M.SC, []))
+            int1_Sweep.append(S.int0_NewtonCount + len(S.A.db1_Residual))
+            M.SC.db0_Threshold = 1e-12
+            db2_Node.append(dc1_Global["SolveOutput"](M.SC, dc1_Global["Solve"](M.SC, dc1_Global["SolveState"](M.SC, []))).db2_NodeOut)
+        self.assertTrue(int1_Sweep[1] < int1_Sweep[0])
+        for db1_Plain, db1_Newton in zip(db2_Node[0], db2_Node[1]):
+            for db0_Plain, db0_Newton in zip(db1_Plain, db1_Newton):
+                self.assertAlmostEqual(db0_Plain, db0_Newton, delta=1e-8)
+
+
+### GRADIENT
+class GradientTest(unittest.TestCase):
+
+    def test_adjoint_gradient(self):
+        # Adjoint gradient of the target objective against central differences of the reentrant solve
+        for bl0_Bracing in (False, True):
+            TP, M, dc1_Global = Solve(bl0_Bracing, Targets())
+            C = M.SC
+            C.db0_Threshold = 1e-13
+            C.int0_CounterBracing = 500 if bl0_Bracing else 1
+            db1_Variable = [db0_Value + 0.037*((k*7) % 5 - 2) for k, db0_Value in enumerate(M.db1_VariableOut)]
+            S = dc1_Global["Solve"](C, dc1_Global["SolveState"](C, db1_Variable))
+            db1_Gradient = dc1_Global["AdjointGradient"](C, db1_Variable, S.db3_NodePrev)
+            db0_Dx = 1e-6
+            for i in range(len(db1_Variable)):
+                db1_Up = db1_Variable[:]
+                db1_Up[i] += db0_Dx
+                db1_Low = db1_Variable[:]
+                db1_Low[i] -= db0_Dx
+                db0_Difference = (dc1_Global["SolveObjective"](C, db1_Up) - dc1_Global["SolveObjective"](C, db1_Low))/(2*db0_Dx)
+                self.assertAlmostEqual(db1_Gradient[i], db0_Difference, delta=1e-5*max(1.0, abs(db0_Difference)))
+
+
+### REENTRANT SOLVE
+class SolveTest(unittest.TestCase):
+
+    def test_main_solve(self):
+        # The sweep of Main() on Rhino geometry and the sweep of Solve() on floats give the same
+        # nodes and trail forces, with self-weight, a constraint plane and an indirect deviation
+        for O in (None, Targets()):
+            TP, M, dc1_Global = Solve(True, O, SelfWeight(), True)
+            C = M.SC
+            S = dc1_Global["SolveOutput"](C, dc1_Global["Solve"](C, dc1_Global["SolveState"](C, M.db1_VariableOut)))
+            self.assertEqual(len(S.db2_NodeOut), len(M.pt1_GlobNodeOut))
+            for db1_Node, pt0_Node in zip(S.db2_NodeOut, M.pt1_GlobNodeOut):
+                for db0_Solve, db0_Main in zip(db1_Node, Plain(pt0_Node)):
+                    self.assertAlmostEqual(db0_Solve, db0_Main, delta=1e-8)
+            self.assertEqual(len(S.db1_TrailEdgeOut), len(M.db1_GlobTrailEdgeOut))
+            for db0_Solve, db0_Main in zip(S.db1_TrailEdgeOut, M.db1_GlobTrailEdgeOut):
+                self.assertAlmostEqual(db0_Solve, db0_Main, delta=1e-8)
+
+    def test_inputs(self):
+        # The self-weight and the constraint plane of the fixture change the nodes
+        TP, M, dc1_Global = Solve(True)
+        pt1_Node = Plain(M.pt1_GlobNodeOut)
+        self.assertNotEqual(Plain(Solve(True, None, SelfWeight())[1].pt1_GlobNodeOut), pt1_Node)
+        self.assertNotEqual(Plain(Solve(True, None, None, True)[1].pt1_GlobNodeOut), pt1_Node)
+
+
+### DATASET
+class DatasetTest(unittest.TestCase):
+
+    def setUp(self):
+        self.str0_Folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.str0_Folder)
+
+    def test_chunk_seed(self):
+        import CEM_180_Dataset as ds
+        int1_Seed = [ds.ChunkSeed(int0_Seed, int0_Chunk) for int0_Seed in range(-20, 20) for int0_Chunk in range(200)]
+        self.assertEqual(len(set(int1_Seed)), len(int1_Seed))
+        self.assertNotEqual(ds.ChunkSeed(0, 1000003), ds.ChunkSeed(1, 0))
+
+    def test_worker_pool(self):
+        # The workers of a pool write the same shards as the solves in this process
+        import CEM_180_Dataset as ds
+        TP, M, dc1_Global = Solve(True, Targets())
+        dc1_File = []
+        for bl0_Pool in (False, True):
+            str0_Folder = os.path.join(self.str0_Folder, str(bl0_Pool))
+            if bl0_Pool:
+                P = ds.WorkerPool({"TP": TP, "CPL": None, "N": None, "SW": None, "O": Targets()}, 2)
+                try:
+                    ds.GenerateDataset(M, str0_Folder, 10, 3, 7, xx0_Pool=P)
+                finally:
+                    P.close()
+                    P.join()
+            else:
+                ds.GenerateDataset(M, str0_Folder, 10, 3, 7)
+            dc1_File.append(dict((str0_Name, open(os.path.join(str0_Folder, str0_Name), "rb").read()) for str0_Name in os.listdir(str0_Folder)))
+        self.assertEqual(len(dc1_File[0]), 4*5 + 1)
+        self.assertEqual(dc1_File[0], dc1_File[1])
+
+
+### SERIALIZATION
+class SerializationTest(unittest.TestCase):
+
+    def setUp(self):
+        self.str0_Folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.str0_Folder)
+
+    def test_bytes(self):
+        TP, M, dc1_Global = Solve(True, Targets())
+        self.assertEqual(Outputs(M.FromBytes(M.ToBytes())), Outputs(M))
+
+    def test_members(self):
+        # Block offsets of the member kinds, stored by the solve and restored from the buffer
+        TP, M, dc1_Global = Solve(True)
+        MB = M.FromBytes(M.ToBytes())
+        for FD in (M.FD, MB.FD):
+            self.assertEqual(list(FD.int1_KindStart), [0, 16, 26, 27])
+            for int0_Kind in range(3):
+                self.assertEqual(list(FD.Members(int0_Kind)), [k for k in range(len(FD.int1_Kind)) if FD.int1_Kind[k] == int0_Kind])
+        self.assertEqual(MB.ToString(), M.ToString())
+
+    def test_archive(self):
+        import CEM_180_Archive as ar
+        TP, M, dc1_Global = Solve(True)
+        str0_Path = os.path.join(self.str0_Folder, "model.cem")
+        ar.WriteArchive(str0_Path, TP, M)
+        for bl0_Map in (True, False):
+            A = ar.ReadArchive(str0_Path, bl0_Map)
+            try:
+                TPA = A.Topology()
+                for str0_Name in TPA.__slots__:
+                    self.assertEqual(Plain(getattr(TPA, str0_Name)), Plain(getattr(TP.compiled, str0_Name)), str0_Name)
+                self.assertEqual(Outputs(dc1_Global["model"].FromBytes(A.ModelBytes())), Outputs(M))
+                MA = Run("CEM_180_Calculate_Structure.py", TP=TPA, CPL=None, N=None, SW=None, O=None)["M"]
+                self.assertEqual(Outputs(MA), Outputs(M))
+            finally:
+                A.Close()
+
+
+if __name__ == "__main__":
+    unittest.main()